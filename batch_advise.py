@@ -0,0 +1,84 @@
+# batch_advise.py
+# 批量建议：读入 (账户 × 资产) 持仓文件，向量化计算所有账户的目标/差额/确认状态，一次写出订单文件
+#
+# 用法:
+#   python batch_advise.py holdings.csv orders.csv            # 也支持 .parquet（需要pyarrow）
+#   python batch_advise.py holdings.parquet orders.parquet --refresh
+# 持仓文件列: account, SPY, GLD, BTC[, CASH]；缺CASH列时按 1-三资产之和 计
+
+import sys, time
+import numpy as np
+import pandas as pd
+import mhi_weekly as mw
+
+ASSETS = ["SPY", "GLD", "BTC", "CASH"]
+
+def read_table(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+
+def write_table(df, path):
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, float_format="%.4f")
+
+def holdings_matrix(holdings):
+    """持仓表 -> (账户数 × 4) 权重矩阵"""
+    W = np.zeros((len(holdings), len(ASSETS)))
+    for j, k in enumerate(ASSETS[:3]):
+        if k in holdings:
+            W[:, j] = holdings[k].to_numpy(dtype=float)
+    if "CASH" in holdings:
+        W[:, 3] = holdings["CASH"].to_numpy(dtype=float)
+    else:
+        W[:, 3] = np.maximum(0.0, 1.0 - W[:, :3].sum(axis=1))
+    return W
+
+def batch_advice(W, state):
+    """与 mhi_weekly.compute_advice 同口径，但对所有账户一次性计算"""
+    base = mw.compute_advice({}, state)   # 分档/目标/确认对所有账户相同
+    target = np.array([base["target"][k] for k in ASSETS])
+    delta = np.round(target[None, :] - W, 4)
+    if base["bucket"] == "NEUTRAL":
+        delta[:] = 0.0
+    else:
+        delta[np.abs(delta) < mw.MIN_CHANGE] = 0.0
+    return base, target, delta
+
+def run(holdings_path, orders_path, state=None):
+    t0 = time.perf_counter()
+    if state is None:
+        state = mw.load_mhi_state()
+    if state is None:
+        price_w, mhi, ry_w = mw.build_mhi()
+        state = mw.mhi_state(mhi, ry_w)
+    t1 = time.perf_counter()
+
+    holdings = read_table(holdings_path)
+    W = holdings_matrix(holdings)
+    base, target, delta = batch_advice(W, state)
+
+    orders = pd.DataFrame(delta, columns=[f"delta_{k}" for k in ASSETS])
+    orders.insert(0, "account", holdings["account"].to_numpy() if "account" in holdings else np.arange(len(W)))
+    orders["has_order"] = (delta != 0).any(axis=1)
+    orders["bucket"] = base["bucket"]
+    orders["confirmed"] = base["confirmed"]
+    orders["ref_date"] = base["ref_date"]
+    write_table(orders, orders_path)
+    t2 = time.perf_counter()
+
+    print(f"[{base['ref_date']}] MHI={base['mhi']:.2f} bucket={base['bucket']} confirmed={base['confirmed']}")
+    print("Target weights:", {k: round(float(v), 4) for k, v in zip(ASSETS, target)})
+    print(f"Accounts: {len(W)}, with orders: {int(orders['has_order'].sum())}")
+    print(f"Orders written to {orders_path} in {t2 - t1:.2f}s (MHI state {t1 - t0:.2f}s)")
+    if not base["confirmed"]:
+        print("(Note: confirmation not met, you may wait this week.)")
+    return orders
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 2:
+        print("usage: python batch_advise.py HOLDINGS.csv|parquet ORDERS.csv|parquet [--refresh]")
+        sys.exit(1)
+    st = None if "--refresh" not in sys.argv else mw.mhi_state(*mw.build_mhi()[1:])
+    run(args[0], args[1], st)
@@ -3,9 +3,20 @@
 
 import pandas as pd
 import numpy as np
-import yfinance as yf
 # import matplotlib.pyplot as plt  # 暂时注释掉
-from mhi_weekly import build_mhi, pick_weights, apply_real_yield_tilt
+from mhi_weekly import build_mhi
+import profiling
+from simulator import prepare_inputs, simulate
+from benchmarks import BenchmarkSet, WEEKLY
+
+# 对比基准：{名称: 固定权重}，不足 1 的部分为现金
+BENCHMARKS = {
+    "SPY_Only": {"SPY": 1.0},
+    "GLD_Only": {"GLD": 1.0},
+    "BTC_Only": {"BTC": 1.0},
+    "Equal_Weight": {"SPY": 0.333, "GLD": 0.333, "BTC": 0.334},   # 等权重组合 (33.3%每个)
+    "Base_Weight": {"SPY": 0.35, "GLD": 0.45, "BTC": 0.20},       # 基础权重组合 (固定35% SPY, 45% GLD, 20% BTC)
+}
 
 def calculate_returns(prices):
     """计算收益率"""
@@ -38,85 +49,30 @@ def calculate_metrics(returns):
         'Max Drawdown': f"{max_dd:.1%}"
     }
 
-def simulate_strategy():
+def simulate_strategy(inputs=None):
     """模拟MHI策略"""
-    price_w, mhi, ry_w = build_mhi()
-    
-    # 初始权重
-    portfolio_value = [100000]
-    current_weights = {"SPY": 0.35, "GLD": 0.45, "BTC": 0.10, "CASH": 0.10}
-    
-    strategy_returns = []
-    rebalance_dates = []
-    
-    for i in range(1, len(price_w)):
-        date = price_w.index[i]
-        
-        # 计算当期资产收益
-        spy_ret = price_w["SPY"].iloc[i] / price_w["SPY"].iloc[i-1] - 1
-        gld_ret = price_w["GLD"].iloc[i] / price_w["GLD"].iloc[i-1] - 1 
-        btc_ret = price_w["BTC"].iloc[i] / price_w["BTC"].iloc[i-1] - 1
-        
-        # 计算组合收益
-        portfolio_ret = (current_weights["SPY"] * spy_ret + 
-                        current_weights["GLD"] * gld_ret + 
-                        current_weights["BTC"] * btc_ret)
-        
-        strategy_returns.append(portfolio_ret)
-        portfolio_value.append(portfolio_value[-1] * (1 + portfolio_ret))
-        
-        # 检查是否需要调仓（每4周检查一次）
-        if i % 4 == 0 and i < len(mhi):
-            mhi_val = float(mhi.iloc[i])
-            bucket, target = pick_weights(mhi_val)
-            target = apply_real_yield_tilt(target, ry_w, date)
-            
-            # 检查确认机制
-            if i >= 12:  # 至少3个月数据
-                recent_buckets = []
-                for j in range(1, 4):
-                    if i-j*4 >= 0 and i-j*4 < len(mhi):
-                        recent_bucket, _ = pick_weights(float(mhi.iloc[i-j*4]))
-                        recent_buckets.append(recent_bucket)
-                
-                if len(set(recent_buckets)) == 1:  # 确认信号
-                    # 只在极端MHI条件下调仓
-                    need_rebalance = (bucket != "NEUTRAL")
-                    
-                    if need_rebalance:
-                        current_weights = target.copy()
-                        rebalance_dates.append(date)
-    
-    return pd.Series(strategy_returns, index=price_w.index[1:]), rebalance_dates
+    if inputs is None:
+        inputs = prepare_inputs(*build_mhi())
+    sim = simulate(inputs)
+    rebalance_dates = list(inputs.dates[sim.rebal[0]])
+    return sim.returns_series(), rebalance_dates
 
 def main():
     print("=== 2020-2025 Backtest Comparison Analysis ===\n")
     
     # 获取数据并运行策略
     price_w, mhi, ry_w = build_mhi()
-    strategy_returns, rebalance_dates = simulate_strategy()
+    strategy_returns, rebalance_dates = simulate_strategy(prepare_inputs(price_w, mhi, ry_w))
     
-    # 计算基准收益
+    # 计算基准收益（全部基准一次矩阵运算，周度再平衡到固定权重）
     asset_returns = calculate_returns(price_w)
-    
-    # 等权重组合 (33.3%每个)
-    equal_weight_returns = (asset_returns["SPY"] * 0.333 + 
-                           asset_returns["GLD"] * 0.333 + 
-                           asset_returns["BTC"] * 0.334)
-    
-    # 基础权重组合 (固定35% SPY, 45% GLD, 20% BTC)
-    base_weight_returns = (asset_returns["SPY"] * 0.35 + 
-                          asset_returns["GLD"] * 0.45 + 
-                          asset_returns["BTC"] * 0.20)
+    bench = BenchmarkSet.from_dicts(BENCHMARKS).evaluate(asset_returns, WEEKLY)
     
     # 计算指标
     results = {}
     results["MHI_Strategy"] = calculate_metrics(strategy_returns)
-    results["SPY_Only"] = calculate_metrics(asset_returns["SPY"])
-    results["GLD_Only"] = calculate_metrics(asset_returns["GLD"])  
-    results["BTC_Only"] = calculate_metrics(asset_returns["BTC"])
-    results["Equal_Weight"] = calculate_metrics(equal_weight_returns)
-    results["Base_Weight"] = calculate_metrics(base_weight_returns)
+    for name in bench.names:
+        results[name] = calculate_metrics(bench.series(name))
     
     # 打印结果
     df_results = pd.DataFrame(results).T
@@ -130,7 +86,7 @@ def main():
     mhi_cumret = (1 + strategy_returns).cumprod()
     spy_cumret = (1 + asset_returns["SPY"]).cumprod()
     btc_cumret = (1 + asset_returns["BTC"]).cumprod()
-    equal_cumret = (1 + equal_weight_returns).cumprod()
+    equal_cumret = (1 + bench.series("Equal_Weight")).cumprod()
     
     print(f"\n=== Cumulative Returns Comparison ===")
     print(f"MHI Strategy Final Return: {mhi_cumret.iloc[-1] - 1:.1%}")
@@ -141,4 +97,5 @@ def main():
     return results
 
 if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
     main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+# benchmarks.py
+# 基准组合批量评估：(基准数 × 资产数) 权重矩阵 + 再平衡规则，一次向量化计算所有基准的周收益
+# 几百个固定配比与一个的代价相同（日历再平衡/不再平衡是纯矩阵运算；漂移带只按周循环，每步同时处理全部基准）。
+#
+# 用法:
+#   bs = BenchmarkSet.from_dicts({"Base": {"SPY": .35, "GLD": .45, "BTC": .20}, "SPY": {"SPY": 1}})
+#   res = bs.evaluate(price_w.pct_change().fillna(0), WEEKLY)      # res.returns: (T, B)
+#   metrics_array(res.returns.T)                                     # 每个指标一个 (B,) 数组
+# 权重行之和不足 1 的部分记为现金（收益为0）。
+
+import numpy as np
+import pandas as pd
+import profiling
+from portfolio import DEFAULT_ASSETS, NO_COSTS
+
+class RebalancePolicy:
+    """never：买入持有；calendar：每 every 周初回到目标；drift_band：任一资产偏离目标超过 band 时回到目标"""
+    __slots__ = ("kind", "every", "band")
+
+    def __init__(self, kind, every=1, band=0.05):
+        if kind not in ("never", "calendar", "drift_band"):
+            raise ValueError(f"unknown rebalance policy {kind!r}")
+        self.kind = kind
+        self.every = int(every)
+        self.band = float(band)
+
+    @classmethod
+    def never(cls):
+        return cls("never")
+
+    @classmethod
+    def calendar(cls, every=1):
+        return cls("calendar", every=every)
+
+    @classmethod
+    def drift_band(cls, band=0.05):
+        return cls("drift_band", band=band)
+
+    def __repr__(self):
+        if self.kind == "calendar":
+            return f"RebalancePolicy.calendar({self.every})"
+        if self.kind == "drift_band":
+            return f"RebalancePolicy.drift_band({self.band})"
+        return "RebalancePolicy.never()"
+
+BUY_AND_HOLD = RebalancePolicy.never()
+WEEKLY = RebalancePolicy.calendar(1)     # 各脚本原来的“固定权重 × 每周收益”口径
+
+class BenchmarkResult:
+    __slots__ = ("names", "index", "returns", "rebalances", "costs")
+
+    def __init__(self, names, index, returns, rebalances, costs):
+        self.names = names
+        self.index = index
+        self.returns = returns          # (T, B) 扣除成本后的周收益
+        self.rebalances = rebalances    # (B,) 再平衡次数（不含初始建仓）
+        self.costs = costs              # (B,) 累计交易成本
+
+    def series(self, name):
+        return pd.Series(self.returns[:, self.names.index(name)], index=self.index, name=name)
+
+    def frame(self):
+        return pd.DataFrame(self.returns, index=self.index, columns=list(self.names))
+
+class BenchmarkSet:
+    """一组固定目标权重的基准组合：(B × N) 矩阵，CASH 在最后一列"""
+    __slots__ = ("names", "assets", "matrix")
+
+    def __init__(self, names, assets, matrix):
+        self.names = tuple(names)
+        self.assets = assets
+        m = np.array(matrix, dtype=float, ndmin=2)
+        m[:, -1] += 1 - m.sum(axis=1)      # 剩余部分记为现金
+        self.matrix = m
+
+    @classmethod
+    def from_dicts(cls, weights, assets=None):
+        """{名称: {资产: 权重}}"""
+        assets = assets or DEFAULT_ASSETS
+        return cls(list(weights), assets, np.vstack([assets.vector(w) for w in weights.values()]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _returns_matrix(self, returns):
+        """DataFrame（按资产名取列）或数组 -> (T, N)，缺少 CASH 列时补 0"""
+        if isinstance(returns, pd.DataFrame):
+            return returns.index, np.column_stack([returns[list(self.assets.risky)].to_numpy(dtype=float),
+                                                   np.zeros(len(returns))])
+        R = np.asarray(returns, dtype=float)
+        if R.shape[1] == len(self.assets) - 1:
+            R = np.column_stack([R, np.zeros(len(R))])
+        return None, R
+
+    @profiling.timed("benchmarks.evaluate")
+    def evaluate(self, returns, policy=WEEKLY, cost_model=NO_COSTS):
+        """所有基准的周收益 (T, B)；第 t 周的收益按周初持仓计算，再平衡发生在周初、成本在当周扣除"""
+        index, R = self._returns_matrix(returns)
+        profiling.count("benchmarks.points", len(self) * len(R))
+        if policy.kind == "drift_band":
+            out, rebal, costs = _drift_band(R, self.matrix, policy.band, cost_model)
+        else:
+            out, rebal, costs = _anchored(R, self.matrix, 0 if policy.kind == "never" else policy.every, cost_model)
+        return BenchmarkResult(self.names, index, out, rebal, costs)
+
+def _anchored(R, W, every, cost_model):
+    """买入持有（every=0）或每 every 周再平衡：锚点之后的持仓 = 目标 × 资产累计增长 / 锚点处增长，
+    周收益 = 本周末组合价值 / 上周末组合价值 - 1，全部是 (T, N) @ (N, B) 的矩阵运算"""
+    T = len(R)
+    G = np.ones((T + 1, R.shape[1]))
+    np.cumprod(1 + R, axis=0, out=G[1:])
+    t = np.arange(T)
+    anchor = (t // every) * every if every > 0 else np.zeros(T, dtype=int)
+    ga = G[anchor]
+    out = (G[1:] / ga) @ W.T / ((G[:-1] / ga) @ W.T) - 1
+    # 再平衡周：交易前的漂移权重 vs 目标
+    rb = np.flatnonzero((anchor == t) & (t > 0))
+    costs = np.zeros(len(W))
+    if len(rb) and np.any(cost_model.rates):
+        prev = G[rb][:, None, :] / G[anchor[rb - 1]][:, None, :] * W[None]     # (K, B, N)
+        drifted = prev / prev.sum(axis=2, keepdims=True)
+        c = cost_model.cost(drifted, W[None])                                 # (K, B)
+        out[rb] -= c
+        costs = c.sum(axis=0)
+    return out, np.full(len(W), len(rb)), costs
+
+def _drift_band(R, W, band, cost_model):
+    """漂移带：逐周推进，每一步同时处理全部基准 (B, N)"""
+    T, B = len(R), len(W)
+    out = np.empty((T, B))
+    w = W.copy()
+    rebal = np.zeros(B, dtype=int)
+    costs = np.zeros(B)
+    for t in range(T):
+        hit = np.abs(w - W).max(axis=1) > band
+        c = np.zeros(B)
+        if hit.any():
+            c[hit] = cost_model.cost(w[hit], W[hit])
+            w[hit] = W[hit]
+            rebal += hit
+            costs += c
+        v = w * (1 + R[t])
+        total = v.sum(axis=1)
+        out[t] = total - 1 - c
+        w = v / total[:, None]
+    return out, rebal, costs
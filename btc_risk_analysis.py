@@ -4,6 +4,10 @@
 import pandas as pd
 import numpy as np
 from mhi_weekly import build_mhi
+from portfolio import DEFAULT_ASSETS
+from benchmarks import BenchmarkSet, BUY_AND_HOLD
+from simulator import prepare_inputs, simulate, metrics_array
+from risk import tail_metrics
 
 def analyze_bitcoin_risk_vs_return():
     """分析比特币的风险收益特征和配置建议"""
@@ -47,44 +51,39 @@ def analyze_bitcoin_risk_vs_return():
     btc_returns = price_w['BTC'].pct_change().fillna(0)
     btc_annual_vol = btc_returns.std() * np.sqrt(52)
     btc_max_dd = calculate_max_drawdown(price_w['BTC'])
+    btc_sharpe = float(metrics_array(btc_returns.to_numpy())["sharpe"][0])
+    btc_tail = tail_metrics(btc_returns.to_numpy(), (0.95,))
     
     print(f"=== BITCOIN RISK CHARACTERISTICS ===")
     print(f"Annual Volatility: {btc_annual_vol:.1%}")
     print(f"Maximum Drawdown: {btc_max_dd:.1%}")
-    print(f"Risk-Adjusted Return (Sharpe): 0.98")
+    print(f"Risk-Adjusted Return (Sharpe): {btc_sharpe:.2f}")
+    print(f"Weekly 95% VaR / CVaR: {btc_tail['var_95'][0]:.1%} / {btc_tail['cvar_95'][0]:.1%}")
     print()
     
     # 不同BTC配置的影响分析
     print(f"=== BTC ALLOCATION IMPACT ANALYSIS ===")
     
-    base_portfolio_return = 0.35 * calculate_total_return(price_w['SPY']) + \
-                           0.45 * calculate_total_return(price_w['GLD']) + \
-                           0.10 * btc_total_return
-    
     allocation_scenarios = [5, 10, 15, 20, 25]
     
+    # 各BTC配置一起评估 (保持SPY:GLD = 35:45比例，10%现金，买入持有不再平衡)
+    btc_weight = np.array(allocation_scenarios) / 100
+    remaining_weight = 1 - btc_weight - 0.10  # 减去10%现金
+    weights = np.column_stack([0.35 / 0.80 * remaining_weight,   # 35/80的比例
+                               0.45 / 0.80 * remaining_weight,   # 45/80的比例
+                               btc_weight])
+    scenarios = BenchmarkSet([f"BTC_{a}" for a in allocation_scenarios], DEFAULT_ASSETS,
+                             np.column_stack([weights, np.zeros(len(weights))]))
+    portfolio_returns = np.prod(1 + scenarios.evaluate(price_w.pct_change().fillna(0), BUY_AND_HOLD).returns, axis=0) - 1
+    
+    # 组合波动率：全样本协方差（含资产间相关性）
+    cov = np.cov(price_w[["SPY", "GLD", "BTC"]].pct_change().dropna().to_numpy().T) * 52
+    portfolio_vols = np.sqrt(np.einsum("bn,nm,bm->b", weights, cov, weights))
+    
     print("BTC Allocation | Portfolio Return | Risk Impact")
     print("-" * 50)
     
-    for alloc in allocation_scenarios:
-        # 重新计算权重 (保持SPY:GLD = 35:45比例)
-        btc_weight = alloc / 100
-        remaining_weight = (1 - btc_weight - 0.10)  # 减去10%现金
-        spy_weight = 0.35 / 0.80 * remaining_weight  # 35/80的比例
-        gld_weight = 0.45 / 0.80 * remaining_weight  # 45/80的比例
-        
-        portfolio_return = spy_weight * calculate_total_return(price_w['SPY']) + \
-                          gld_weight * calculate_total_return(price_w['GLD']) + \
-                          btc_weight * btc_total_return
-        
-        # 简化的组合波动率计算 (假设相关性)
-        spy_vol = price_w['SPY'].pct_change().std() * np.sqrt(52)
-        gld_vol = price_w['GLD'].pct_change().std() * np.sqrt(52)
-        
-        portfolio_vol = np.sqrt((spy_weight * spy_vol)**2 + 
-                               (gld_weight * gld_vol)**2 + 
-                               (btc_weight * btc_annual_vol)**2)
-        
+    for alloc, portfolio_return, portfolio_vol in zip(allocation_scenarios, portfolio_returns, portfolio_vols):
         print(f"     {alloc:2d}%      |      {portfolio_return:.1%}      |    {portfolio_vol:.1%}")
     
     print()
@@ -105,10 +104,10 @@ def analyze_bitcoin_risk_vs_return():
     print()
     
     print("3. RISK vs RETURN TRADE-OFF:")
-    btc_sharpe = 0.98
-    portfolio_sharpe = 1.21
+    portfolio_sharpe = float(metrics_array(simulate(prepare_inputs(price_w, mhi, ry_w)).period_returns)["sharpe"][0])
     print(f"   - Bitcoin Sharpe Ratio: {btc_sharpe:.2f} (high return, high risk)")
-    print(f"   - Your Portfolio Sharpe: {portfolio_sharpe:.2f} (better risk-adjusted)")
+    print(f"   - Your Portfolio Sharpe: {portfolio_sharpe:.2f} "
+          f"({'better' if portfolio_sharpe > btc_sharpe else 'worse'} risk-adjusted)")
     print("   - Your concern about volatility is VALID")
     print()
     
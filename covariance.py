@@ -0,0 +1,222 @@
+# covariance.py
+# 资产协方差估计：EWMA（RiskMetrics，零均值）与固定窗口（样本协方差）
+#   在线估计器 EwmaCovariance / RollingCovariance：每来一根 bar 更新一次，O(N²)，状态可导出/恢复（state/from_state），
+#     extend(R) 一次追加多根 bar 并返回这些 bar 的矩阵序列（内部走批量算法）
+#   批量序列 ewma_cov_series / window_cov_series：整段历史的 (T, N, N) 矩阵，不逐 bar 调 Python
+#   ewma_forecast_series：逐 bar 的预测协方差（只用之前的 bar；初值覆盖的 bar 没有预测）
+#     EWMA 按块做带缩放的前缀和（块内 λ^-k 不溢出，块间传递状态）；固定窗口用外积前缀和相减
+# risk.py（参数法/模拟 VaR）与波动率目标都从这里取协方差，不各自重算。
+#
+# 用法:
+#   python covariance.py                     # SPY/GLD/BTC 最新的 EWMA / 52周窗口 年化波动与相关系数
+#   python covariance.py --lam 0.97 --window 104
+
+import argparse
+import numpy as np
+import profiling
+
+EWMA_LAMBDA = 0.94           # RiskMetrics 衰减系数
+EWMA_SEED_WEEKS = 26         # EWMA 初值：前26周的二阶矩
+COV_WINDOW = 52              # 固定窗口：1年周线
+MAX_SCALE = 1e8              # EWMA 块内缩放因子 λ^-k 的上限（决定块长）
+
+def _outer(R):
+    return R[:, :, None] * R[:, None, :]
+
+def ewma_seed(returns, seed_weeks=EWMA_SEED_WEEKS):
+    """EWMA 初值：前 seed_weeks 根 bar 的二阶矩（零均值）"""
+    R = np.asarray(returns, dtype=float)
+    m = min(len(R), seed_weeks)
+    return R[:m].T @ R[:m] / max(m, 1)
+
+@profiling.timed("cov.ewma_series")
+def ewma_cov_series(returns, lam=EWMA_LAMBDA, init=None):
+    """EWMA 协方差序列 (T, N, N)：S_t = λ·S_{t-1} + (1-λ)·r_t r_tᵀ，第 t 个矩阵包含第 t 根 bar
+    init：第一根 bar 之前的矩阵（默认 ewma_seed）。按块计算：块内
+    S_j = λ^(j+1)·[S_init + (1-λ)·Σ_{i≤j} λ^-(i+1)·O_i]，一次 cumsum 得到整块"""
+    R = np.asarray(returns, dtype=float)
+    T, N = R.shape
+    s = ewma_seed(R) if init is None else np.asarray(init, dtype=float)
+    out = np.empty((T, N, N))
+    block = max(1, min(256, int(np.log(MAX_SCALE) / -np.log(lam)))) if lam < 1 else 256
+    for b0 in range(0, T, block):
+        O = _outer(R[b0:b0 + block])
+        p = lam ** np.arange(1, len(O) + 1)
+        acc = np.cumsum(O / p[:, None, None], axis=0)
+        out[b0:b0 + len(O)] = p[:, None, None] * s + (1 - lam) * p[:, None, None] * acc
+        s = out[b0 + len(O) - 1]
+    return out
+
+def ewma_forecast_series(returns, lam=EWMA_LAMBDA, seed_weeks=EWMA_SEED_WEEKS):
+    """第 t 根 bar（t = 0..T，含最后一根之后）的预测协方差 (T+1, N, N) = 截至 t-1 的 EWMA；
+    初值用了前 seed_weeks 根 bar，前 seed_weeks+1 根没有预测（NaN），否则会用到当时还没有的数据"""
+    S = ewma_cov_series(returns, lam)
+    out = np.full((len(S) + 1,) + S.shape[1:], np.nan)
+    out[seed_weeks + 1:] = S[seed_weeks:]
+    return out
+
+@profiling.timed("cov.window_series")
+def window_cov_series(returns, window=COV_WINDOW, min_periods=None, ddof=1):
+    """固定窗口样本协方差序列 (T, N, N)：第 t 个矩阵用第 t-window+1..t 根 bar；
+    不足 min_periods（默认 window）根时为 NaN，介于两者之间为扩张窗口"""
+    R = np.asarray(returns, dtype=float)
+    T, N = R.shape
+    min_periods = window if min_periods is None else min_periods
+    C1 = np.zeros((T + 1, N))
+    C2 = np.zeros((T + 1, N, N))
+    np.cumsum(R, axis=0, out=C1[1:])
+    np.cumsum(_outer(R), axis=0, out=C2[1:])
+    end = np.arange(1, T + 1)
+    start = np.maximum(end - window, 0)
+    m = (end - start).astype(float)
+    s1 = C1[end] - C1[start]
+    s2 = C2[end] - C2[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (s2 - _outer(s1) / m[:, None, None]) / (m - ddof)[:, None, None]
+    out[m < max(min_periods, ddof + 1)] = np.nan
+    return out
+
+def cov_to_corr(cov):
+    """(..., N, N) 协方差 -> 相关系数"""
+    sd = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return cov / (sd[..., :, None] * sd[..., None, :])
+
+class EwmaCovariance:
+    """在线 EWMA 协方差；cov 为截至最后一根 bar 的估计"""
+    __slots__ = ("lam", "cov", "n")
+
+    def __init__(self, cov, lam=EWMA_LAMBDA, n=0):
+        self.lam = float(lam)
+        self.cov = np.array(cov, dtype=float)
+        self.n = int(n)
+
+    @classmethod
+    def seeded(cls, returns, lam=EWMA_LAMBDA, seed_weeks=EWMA_SEED_WEEKS):
+        """以前 seed_weeks 根 bar 的二阶矩为初值（与 ewma_cov_series 的默认初值相同），尚未吸收任何 bar"""
+        return cls(ewma_seed(returns, seed_weeks), lam)
+
+    def update(self, r):
+        """吸收一根 bar，O(N²)"""
+        r = np.asarray(r, dtype=float)
+        self.cov *= self.lam
+        self.cov += (1 - self.lam) * np.outer(r, r)
+        self.n += 1
+        return self.cov
+
+    def extend(self, returns):
+        """吸收多根 bar，返回它们各自的矩阵 (k, N, N)"""
+        out = ewma_cov_series(returns, self.lam, init=self.cov)
+        if len(out):
+            self.cov = out[-1].copy()
+            self.n += len(out)
+        return out
+
+    def state(self):
+        return {"kind": "ewma", "lam": self.lam, "cov": self.cov.copy(), "n": self.n}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["cov"], state["lam"], state["n"])
+
+class RollingCovariance:
+    """在线固定窗口样本协方差：环形缓冲 + 一阶/二阶累计和，每根 bar 加新减旧 O(N²)；
+    缓冲每转一圈用缓冲内容重算一次累计和，避免加减误差积累"""
+    __slots__ = ("window", "min_periods", "ddof", "buf", "pos", "n", "s1", "s2")
+
+    def __init__(self, n_assets, window=COV_WINDOW, min_periods=None, ddof=1):
+        self.window = int(window)
+        self.min_periods = self.window if min_periods is None else int(min_periods)
+        self.ddof = ddof
+        self.buf = np.zeros((self.window, n_assets))
+        self.pos = 0
+        self.n = 0
+        self.s1 = np.zeros(n_assets)
+        self.s2 = np.zeros((n_assets, n_assets))
+
+    def _history(self):
+        """缓冲里的 bar，按时间顺序"""
+        return np.roll(self.buf, -self.pos, axis=0) if self.n >= self.window else self.buf[:self.n]
+
+    def update(self, r):
+        """吸收一根 bar，O(N²)；返回当前矩阵"""
+        r = np.asarray(r, dtype=float)
+        if self.n >= self.window:
+            old = self.buf[self.pos]
+            self.s1 -= old
+            self.s2 -= np.outer(old, old)
+        self.buf[self.pos] = r
+        self.s1 += r
+        self.s2 += np.outer(r, r)
+        self.pos = (self.pos + 1) % self.window
+        self.n += 1
+        if self.pos == 0:
+            self.s1 = self.buf.sum(axis=0)
+            self.s2 = self.buf.T @ self.buf
+        return self.cov
+
+    @property
+    def cov(self):
+        m = min(self.n, self.window)
+        if m < max(self.min_periods, self.ddof + 1):
+            return np.full_like(self.s2, np.nan)
+        return (self.s2 - np.outer(self.s1, self.s1) / m) / (m - self.ddof)
+
+    def extend(self, returns):
+        """吸收多根 bar，返回它们各自的矩阵 (k, N, N)；与逐根 update 的结果相同"""
+        R = np.asarray(returns, dtype=float)
+        if not len(R):
+            return np.empty((0,) + self.s2.shape)
+        hist = self._history()[-(self.window - 1):] if self.window > 1 else self._history()[:0]
+        X = np.concatenate([hist, R])
+        out = window_cov_series(X, self.window, self.min_periods, self.ddof)[len(hist):]
+        # 状态 = 最后 window 根 bar（环形缓冲从0位开始按时间顺序存放）
+        tail = X[-self.window:]
+        self.n += len(R)
+        self.buf[:] = 0
+        self.buf[:len(tail)] = tail
+        self.pos = len(tail) % self.window
+        self.s1 = tail.sum(axis=0)
+        self.s2 = tail.T @ tail
+        return out
+
+    def state(self):
+        return {"kind": "window", "window": self.window, "min_periods": self.min_periods, "ddof": self.ddof,
+                "history": self._history().copy(), "n": self.n}
+
+    @classmethod
+    def from_state(cls, state):
+        hist = np.asarray(state["history"], dtype=float)
+        est = cls(hist.shape[1], state["window"], state["min_periods"], state["ddof"])
+        est.extend(hist)
+        est.n = int(state["n"])
+        return est
+
+def from_state(state):
+    """按 state["kind"] 恢复对应的在线估计器"""
+    return (EwmaCovariance if state["kind"] == "ewma" else RollingCovariance).from_state(state)
+
+def main(argv=None):
+    import pandas as pd
+    from mhi_weekly import build_mhi
+    from simulator import prepare_inputs
+    p = argparse.ArgumentParser(description="EWMA and rolling covariance of the asset set")
+    p.add_argument("--lam", type=float, default=EWMA_LAMBDA)
+    p.add_argument("--window", type=int, default=COV_WINDOW)
+    args = p.parse_args(argv)
+
+    inputs = prepare_inputs(*build_mhi())
+    R = inputs.returns[1:, :-1].astype(float)
+    names = list(inputs.assets.risky)
+    print(f"=== Asset covariance ({len(R)} weeks, last {inputs.dates[-1].date()}) ===")
+    for label, cov in ((f"EWMA λ={args.lam}", ewma_cov_series(R, args.lam)[-1]),
+                       (f"{args.window}-week window", window_cov_series(R, args.window)[-1]),
+                       ("Full sample", np.cov(R.T))):
+        print(f"\n--- {label} ---")
+        vol = pd.Series(np.sqrt(np.diag(cov) * 52), index=names)
+        print("Annual vol: " + ", ".join(f"{n} {v:.1%}" for n, v in vol.items()))
+        print(pd.DataFrame(cov_to_corr(cov), index=names, columns=names).round(2).to_string())
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,195 @@
+# daily_execution.py
+# 日频执行模拟：信号仍是周频（simulator 的调仓周与目标权重），成交放到日线上，带可配置的执行延迟
+#   close       信号周最后一根收盘成交（与周频模拟器的假设相同）
+#   next_open   各资产自己日历上的下一个交易日开盘（BTC 周六即可成交，ETF 要等到周一）
+#   next_close  下一个交易日收盘
+#   vwap        下一个交易日的 VWAP 近似：(高+低+收)/3
+# 持仓按股数记账：两次成交之间股数不变、按收盘价逐日估值，现金吸收成交差额与成本。
+# 成交价/成交日对所有周一次性预先算好；Python 循环只走调仓周（每步处理整个网格），
+# 日线比周线多约5倍的 bar 只体现在数组运算里。
+#
+# 用法:
+#   python daily_execution.py                      # 各执行方式 vs 周频模拟器
+#   python daily_execution.py --lags next_open,vwap --costs total
+
+import argparse
+import numpy as np
+import pandas as pd
+import mhi_weekly as mw
+import data_provider
+import profiling
+from simulator import prepare_inputs, simulate, metrics_array
+from portfolio import NO_COSTS, TOTAL_COSTS
+from sweep_runner import COST_MODELS
+
+LAGS = ("close", "next_open", "next_close", "vwap")
+
+class DailyBars:
+    """日线面板：所有资产共用一个日历（各资产休市日为 NaN），列顺序 = assets.risky"""
+    __slots__ = ("dates", "open", "high", "low", "close")
+
+    def __init__(self, dates, open, high, low, close):
+        self.dates = dates
+        self.open, self.high, self.low, self.close = open, high, low, close
+
+    @classmethod
+    def from_frames(cls, bars, columns):
+        close = bars["Close"][columns].sort_index()
+        close = close.dropna(how="all")
+        get = lambda f: bars[f][columns].reindex(close.index).to_numpy(dtype=float)
+        return cls(close.index, get("Open"), get("High"), get("Low"), close.to_numpy(dtype=float))
+
+    def __len__(self):
+        return len(self.dates)
+
+@profiling.timed("load_daily_bars")
+def load_daily_bars(assets, start=mw.START):
+    """经 data_provider 取日线 OHLC；assets 为 SimInputs.assets（SPY/GLD/BTC → yfinance 代码）"""
+    tickers = [mw.TICKERS_YF.get(a, a) for a in assets.risky]
+    bars = data_provider.get_provider().bars(tickers, start)
+    bars = {f: df.rename(columns=dict(zip(tickers, assets.risky))) for f, df in bars.items()}
+    return DailyBars.from_frames(bars, list(assets.risky))
+
+class DailyResult:
+    __slots__ = ("dates", "value", "week_days", "trades", "costs", "shortfall", "lag")
+
+    def __init__(self, dates, value, week_days, trades, costs, shortfall, lag):
+        self.dates = dates            # (D,) 日期（从第0周的信号日开始）
+        self.value = value            # (G, D) 组合净值（起点为1）
+        self.week_days = week_days    # (T,) 每个周频信号日在 dates 里的位置
+        self.trades = trades          # (G,) 成交的调仓次数
+        self.costs = costs            # (G,) 累计交易成本（占当时净值）
+        self.shortfall = shortfall    # (G,) 执行差额：相对信号收盘价成交的损失（占当时净值，>0 为吃亏）
+        self.lag = lag
+
+    @property
+    def daily_returns(self):
+        return self.value[:, 1:] / self.value[:, :-1] - 1
+
+    @property
+    def weekly_returns(self):
+        """按周频信号日取样的收益，可与周频模拟器直接比较"""
+        v = self.value[:, self.week_days]
+        return v[:, 1:] / v[:, :-1] - 1
+
+    def series(self, g=0):
+        return pd.Series(self.value[g], index=self.dates)
+
+def _fill_schedule(bars, sig_days, lag):
+    """每个信号日 × 资产的成交日与成交价 (T, N)；按各资产自己的交易日历找“下一个交易日”"""
+    T, N = len(sig_days), bars.close.shape[1]
+    ff = pd.DataFrame(bars.close).ffill().to_numpy()
+    if lag == "close":
+        return np.repeat(sig_days[:, None], N, axis=1), ff[sig_days]
+    day = np.full((T, N), -1, dtype=np.int64)
+    for a in range(N):
+        trading = np.flatnonzero(~np.isnan(bars.close[:, a]))
+        k = np.searchsorted(trading, sig_days, side="right")
+        ok = k < len(trading)
+        day[ok, a] = trading[k[ok]]
+    d = np.maximum(day, 0)
+    cols = np.arange(N)[None, :]
+    if lag == "next_open":
+        px = bars.open[d, cols]
+    elif lag == "next_close":
+        px = bars.close[d, cols]
+    elif lag == "vwap":
+        px = (bars.high[d, cols] + bars.low[d, cols] + bars.close[d, cols]) / 3
+    else:
+        raise ValueError(f"unknown execution lag {lag!r}; expected one of {LAGS}")
+    return day, np.where(day >= 0, px, np.nan)
+
+def _step_fill(changes, D):
+    """稀疏的 (G, D, N) 变更（NaN 为不变）按日前向填充"""
+    G, _, N = changes.shape
+    pos = np.where(np.isnan(changes), -1, np.arange(D)[None, :, None])
+    last = np.maximum.accumulate(pos, axis=1)
+    return np.take_along_axis(changes, np.maximum(last, 0), axis=1)
+
+@profiling.timed("simulate_daily")
+def simulate_daily(res, bars, lag="next_open", cost_model=NO_COSTS):
+    """res: simulator 的 SimResult（完整模拟，提供调仓周与目标权重）；bars: DailyBars
+    成交：信号日按收盘估值 V，目标市值 w·V，按 lag 的成交价换算股数；未成交（数据末尾）的资产保持原仓位"""
+    inputs = res.inputs
+    G, T = res.rebal.shape
+    N = len(inputs.assets) - 1
+    sig_days = np.searchsorted(bars.dates.values, inputs.dates.values, side="right") - 1
+    d0 = sig_days[0]
+    dates = bars.dates[d0:]
+    D = len(dates)
+    ff = pd.DataFrame(bars.close).ffill().to_numpy()[d0:]   # 先对全段前向填充：首个信号日休市（如耶稣受难日）时沿用前一收盘
+    fill_day, fill_px = _fill_schedule(bars, sig_days, lag)
+    fill_day = fill_day - d0
+    sig = sig_days - d0
+    rates = cost_model.rates[:N]
+
+    # 初始持仓：第0周信号日收盘按第0周的持有权重建仓
+    w0 = res.held[:, 0].astype(np.float64)
+    q = w0[:, :N] / ff[0]
+    cash = w0[:, N].copy()
+    changes = np.full((G, D, N), np.nan)
+    changes[:, 0] = q
+    flows = np.zeros((G, D))
+    flows[:, 0] = cash
+    trades = np.zeros(G, dtype=np.int64)
+    costs = np.zeros(G)
+    shortfall = np.zeros(G)
+    with profiling.span("daily.trades"):
+        for e in np.flatnonzero(res.rebal.any(axis=0)):
+            hit = res.rebal[:, e]
+            p_sig = ff[sig[e]]
+            value = q @ p_sig + cash
+            tgt = res.targets[:, e, :N].astype(np.float64)
+            px = fill_px[e]
+            ok = ~np.isnan(px)
+            pxf = np.where(ok, px, p_sig)
+            q_new = np.where(hit[:, None] & ok[None], tgt * value[:, None] / pxf, q)
+            dq = q_new - q
+            flow = -dq * pxf - np.abs(dq) * pxf * rates                 # (G, N) 各资产成交日的现金变动
+            days = fill_day[e]
+            for a in np.flatnonzero(ok):
+                changes[hit, days[a], a] = q_new[hit, a]
+                np.add.at(flows, (np.flatnonzero(hit), days[a]), flow[hit, a])
+            cash = cash + flow.sum(axis=1)
+            c = (np.abs(dq) * pxf * rates).sum(axis=1)
+            costs += np.where(hit, c / value, 0.0)
+            shortfall += np.where(hit, (dq * (pxf - p_sig)).sum(axis=1) / value, 0.0)
+            trades += hit
+            q = q_new
+
+    Q = _step_fill(changes, D)
+    value = np.einsum("gdn,dn->gd", Q, ff) + np.cumsum(flows, axis=1)
+    return DailyResult(dates, value, sig, trades, costs, shortfall, lag)
+
+def compare_lags(inputs, bars, lags=LAGS, cost_model=TOTAL_COSTS, low=mw.LOW_THRESHOLD, high=mw.HIGH_THRESHOLD):
+    """周频模拟器 vs 各执行方式的指标表"""
+    res = simulate(inputs, low, high, cost_model)
+    rows = {"weekly_sim": {**{k: float(v[0]) for k, v in metrics_array(res.period_returns).items()},
+                           "trades": int(res.rebalance_count[0]), "costs": float(res.total_costs[0]), "shortfall": 0.0}}
+    for lag in lags:
+        d = simulate_daily(res, bars, lag, cost_model)
+        m = metrics_array(d.weekly_returns)
+        rows[f"daily_{lag}"] = {**{k: float(v[0]) for k, v in m.items()},
+                                "trades": int(d.trades[0]), "costs": float(d.costs[0]), "shortfall": float(d.shortfall[0])}
+    return pd.DataFrame(rows).T
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Execute the weekly MHI signal on daily bars")
+    p.add_argument("--lags", default=",".join(LAGS))
+    p.add_argument("--costs", default="total", choices=sorted(COST_MODELS))
+    args = p.parse_args(argv)
+
+    inputs = prepare_inputs(*mw.build_mhi())
+    bars = load_daily_bars(inputs.assets)
+    print(f"=== Daily Execution vs Weekly Simulation ({len(bars)} daily bars, {len(inputs)} weeks) ===\n")
+    table = compare_lags(inputs, bars, args.lags.split(","), COST_MODELS[args.costs])
+    print("Mode              | Total_Ret | Annual | Vol    | Max_DD | Trades | Costs  | Shortfall")
+    for name, r in table.iterrows():
+        print(f"{name:17s} | {r['total_return']:8.1%} | {r['annual_return']:6.1%} | {r['annual_vol']:6.1%} | "
+              f"{r['max_dd']:6.1%} | {int(r['trades']):6d} | {r['costs']:6.2%} | {r['shortfall']:+7.2%}")
+    print("\nweekly_sim keeps target weights fixed between rebalances; daily modes hold share quantities.")
+    return table
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,284 @@
+# data_provider.py
+# 数据源：实时（yfinance + FRED）或离线合成后端；mhi_weekly.dl_yf / load_fred_series 通过这里取数
+#
+# 用法（环境变量）:
+#   MHI_DATA_SOURCE=synthetic python threshold_optimization.py     # 不联网，合成数据跑任意脚本
+#   MHI_SYNTH_YEARS=100 MHI_SYNTH_SECTORS=1000 MHI_DATA_SOURCE=synthetic python quick_threshold_test.py
+#   MHI_SYNTH_SEED=7  MHI_SYNTH_END=2024-12-31                      # 固定随机种子与结束日期，结果可复现
+#
+# 合成后端：单因子相关 GBM + 两状态（平稳/压力）马尔可夫切换；压力期市场波动放大、漂移转负，
+# VIX 均值回复到更高水平、HY利差走阔、真实利率下行。每个代码一条独立随机流（种子由代码名决定），
+# 同一代码的路径与同时请求了哪些其他代码无关；所有序列都从固定起点 ORIGIN 逐日生成再按日历切片，
+# 任意起止日期（含 years 模式）取到的都是同一段历史的切片，逐位一致。
+# BTC 等 "-USD" 代码每天都有价，其余只有工作日（与 yfinance 混合下载时的 NaN 形态一致）。
+# bars() 给出日频 OHLC（执行模拟用）；合成后端的收盘价与 prices() 完全相同，开/高/低由收盘价加日内噪声派生。
+
+import os, zlib
+import profiling
+
+SOURCE = os.getenv("MHI_DATA_SOURCE", "live")     # live | synthetic
+SYNTH_SEED = int(os.getenv("MHI_SYNTH_SEED", "0"))
+SYNTH_YEARS = os.getenv("MHI_SYNTH_YEARS")          # 设置后起点 = 结束日期 - N年（覆盖 START）
+SYNTH_END = os.getenv("MHI_SYNTH_END")              # 默认今天
+SYNTH_SECTORS = int(os.getenv("MHI_SYNTH_SECTORS", "0"))   # 在11个板块ETF之外再加的合成板块数
+
+# 每个代码：(对市场因子的beta, 年化波动, 年化漂移)
+PROFILES = {
+    "SPY": (1.00, 0.17, 0.09),
+    "GLD": (0.05, 0.15, 0.05),
+    "BTC-USD": (0.35, 0.75, 0.45),
+}
+SECTOR_PROFILE = (0.80, 0.21, 0.08)
+VOL_INDICES = ("^VIX", "^V2TX", "^JNIV")   # 波动率指数：合成为均值回复序列（VIX / VSTOXX / 日经VI）
+STRESS_VOL_MULT = 2.2        # 压力期波动倍数
+STRESS_DRIFT = -0.35         # 压力期市场因子的额外年化漂移
+P_STAY = (0.995, 0.97)       # 平稳/压力状态的日保持概率
+DAYS_PER_YEAR = 365.0
+ORIGIN = "1900-01-01"        # 市场因子/状态序列的固定起点（更早的请求会把起点前移）
+FRED_START = "2003-01-02"    # 与真实 DFII10 起点同量级
+BAR_FIELDS = ("Open", "High", "Low", "Close")
+GAP_VOL = 0.3                # 合成开盘跳空 = 前收 × exp(N(0, GAP_VOL·日波动))
+RANGE_VOL = 0.5              # 合成高/低点在开收盘之外再延伸 |N(0, RANGE_VOL·日波动)|
+
+def _stream(seed, name):
+    import numpy as np
+    return np.random.default_rng([seed, zlib.crc32(name.encode())])
+
+def _is_crypto(ticker):
+    return ticker.endswith("-USD")
+
+def _last_bar(s):
+    """(最后一根有效 bar 的日期, 收盘价)；没有数据时为 None"""
+    t = s.last_valid_index()
+    return None if t is None else (str(t.date()), round(float(s[t]), 6))
+
+class LiveProvider:
+    """yfinance 收盘价 + FRED（需要 FRED_API_KEY）"""
+    name = "live"
+
+    def prices(self, cols, start):
+        import pandas as pd
+        import yfinance as yf
+        with profiling.span("yf.download", tickers=len(cols)):
+            data = yf.download(cols, start=start, auto_adjust=True, progress=False)["Close"]
+        return data if isinstance(data, pd.DataFrame) else data.to_frame()
+
+    def last_bars(self, cols):
+        """新鲜度标记：各代码最后一根日线的 (日期, 收盘价)（只下载最近几天）；
+        盘中那根 bar 未收盘时收盘价还在变，标记随之变化，已缓存的未完成 bar 会在下次检查时被覆盖"""
+        import pandas as pd
+        import yfinance as yf
+        with profiling.span("yf.download", tickers=len(cols), period="5d"):
+            data = yf.download(cols, period="5d", auto_adjust=True, progress=False)["Close"]
+        data = data if isinstance(data, pd.DataFrame) else data.to_frame(cols[0])
+        return {c: _last_bar(data[c]) for c in cols}
+
+    def bars(self, cols, start):
+        """{字段: DataFrame}，字段见 BAR_FIELDS"""
+        import pandas as pd
+        import yfinance as yf
+        with profiling.span("yf.download", tickers=len(cols), fields="ohlc"):
+            data = yf.download(cols, start=start, auto_adjust=True, progress=False)
+        out = {}
+        for f in BAR_FIELDS:
+            d = data[f]
+            out[f] = d if isinstance(d, pd.DataFrame) else d.to_frame(cols[0])
+        return out
+
+    def has_fred(self):
+        from dotenv import load_dotenv
+        load_dotenv()
+        return bool(os.getenv("FRED_API_KEY", ""))
+
+    def fred_last_updated(self, series_id):
+        """新鲜度标记：FRED 元数据里的 last_updated（不下载观测值）"""
+        from fredapi import Fred
+        with profiling.span("fred.get_series_info", series=series_id):
+            info = Fred(api_key=os.getenv("FRED_API_KEY", "")).get_series_info(series_id)
+        return str(info["last_updated"])
+
+    def fred_series(self, series_id):
+        from fredapi import Fred
+        with profiling.span("fred.get_series", series=series_id):
+            s = Fred(api_key=os.getenv("FRED_API_KEY", "")).get_series(series_id)
+        profiling.count("fred.rows", len(s))
+        return s
+
+    def sectors(self, base):
+        return list(base)
+
+class SyntheticProvider:
+    """确定性的离线数据：任意长度（years）与宽度（extra_sectors）"""
+    name = "synthetic"
+
+    def __init__(self, seed=SYNTH_SEED, years=SYNTH_YEARS, end=SYNTH_END, extra_sectors=SYNTH_SECTORS):
+        self.seed = seed
+        self.years = None if years in (None, "") else float(years)
+        self.end = end
+        self.extra_sectors = extra_sectors
+        self._market = {}
+
+    def sectors(self, base):
+        return list(base) + [f"SYN{i:04d}" for i in range(self.extra_sectors)]
+
+    def end_date(self):
+        import pandas as pd
+        return pd.Timestamp(self.end).normalize() if self.end else pd.Timestamp.today().normalize()
+
+    def calendar(self, start):
+        import pandas as pd
+        end = self.end_date()
+        if self.years is not None:
+            start = end - pd.Timedelta(days=int(self.years * DAYS_PER_YEAR))
+        return pd.date_range(start, end, freq="D")
+
+    def last_bars(self, cols):
+        """新鲜度标记：不生成路径，直接由日历末尾推出日期（加密货币每天有 bar，其余只有工作日）；
+        合成 bar 都是收完盘的，收盘价位置为 None"""
+        import pandas as pd
+        end = self.end_date()
+        weekday = pd.offsets.BDay().rollback(end)
+        return {c: (str((end if _is_crypto(c) else weekday).date()), None) for c in cols}
+
+    def market(self, days):
+        """共享的市场因子冲击与状态序列：从固定起点 ORIGIN 逐日生成，prices 与 FRED 用的是同一条
+        返回 (regime, shock, off)：两个序列都从起点算到 days[-1]，days[0] 在其中的位置为 off"""
+        import numpy as np
+        import pandas as pd
+        origin = min(pd.Timestamp(ORIGIN), days[0])
+        n = (days[-1] - origin).days + 1
+        if self._market.get("origin") != origin or len(self._market["regime"]) < n:
+            u = _stream(self.seed, "__regime__").random(n)
+            regime = np.zeros(n, dtype=np.int8)
+            stress = 0
+            for t in range(1, n):
+                if u[t] > P_STAY[stress]:
+                    stress = 1 - stress
+                regime[t] = stress
+            shock = _stream(self.seed, "__market__").standard_normal(n)
+            self._market = {"origin": origin, "regime": regime, "shock": shock}
+        n = (days[-1] - origin).days + 1
+        m = self._market
+        return m["regime"][:n], m["shock"][:n], (days[0] - origin).days
+
+    def _path(self, ticker, regime, shock, out, buf):
+        """单个代码的价格路径：从起点（regime/shock 的第0天）累积到末尾，末尾 len(out) 天写入 out；
+        buf 为与 regime 等长的临时数组（各代码复用，避免 T×N 的临时数组）。任意起始日期都是同一条路径的切片"""
+        import numpy as np
+        beta, vol, drift = PROFILES.get(ticker, SECTOR_PROFILE)
+        dt = 1.0 / DAYS_PER_YEAR
+        sigma = vol * np.sqrt(dt) * np.where(regime == 1, STRESS_VOL_MULT, 1.0)
+        mu = (drift + beta * STRESS_DRIFT * regime) * dt - 0.5 * sigma ** 2
+        buf[:] = _stream(self.seed, ticker).standard_normal(len(buf))
+        buf *= np.sqrt(1 - beta ** 2)
+        buf += beta * shock
+        buf *= sigma
+        buf += mu
+        buf[0] = np.log(_stream(self.seed, ticker + "/level").uniform(20, 200))   # 起始价单独一条流
+        np.cumsum(buf, out=buf)
+        np.exp(buf[len(buf) - len(out):], out=out)
+
+    def _mean_revert(self, name, regime, shock, off, levels, kappa, noise, shock_beta, log=False, floor=None):
+        """均值回复序列：同样从起点逐日递推，返回 off 之后的部分"""
+        import numpy as np
+        T = len(regime)
+        target = np.where(regime == 1, levels[1], levels[0])
+        e = _stream(self.seed, name).standard_normal(T) * noise + shock_beta * shock
+        x = np.empty(T)
+        x[0] = target[0]
+        for t in range(1, T):
+            x[t] = x[t - 1] + kappa * (target[t] - x[t - 1]) + e[t]
+            if floor is not None and x[t] < floor:
+                x[t] = floor
+        x = x[off:]
+        return np.exp(x) if log else x
+
+    @profiling.timed("synthetic.prices")
+    def prices(self, cols, start):
+        return self._prices(cols, self.calendar(start))
+
+    def _prices(self, cols, days):
+        import numpy as np
+        import pandas as pd
+        regime, shock, off = self.market(days)
+        weekend = days.dayofweek.to_numpy() >= 5
+        out = np.empty((len(days), len(cols)), order="F")
+        buf = np.empty(len(regime))
+        for j, c in enumerate(cols):
+            if c in VOL_INDICES:
+                out[:, j] = self._mean_revert(c, regime, shock, off, (np.log(15.0), np.log(32.0)), 0.05, 0.03, -0.06,
+                                              log=True)
+            else:
+                self._path(c, regime, shock, out[:, j], buf)
+            if not _is_crypto(c):
+                out[weekend, j] = np.nan
+        return pd.DataFrame(out, index=days, columns=list(cols))
+
+    @profiling.timed("synthetic.bars")
+    def bars(self, cols, start):
+        import numpy as np
+        import pandas as pd
+        days = self.calendar(start)
+        lead = pd.Timedelta(days=7)       # 多取一周：第一根 bar 的前收
+        full = self._prices(cols, pd.date_range(days[0] - lead, days[-1], freq="D"))
+        close = full.iloc[lead.days:]
+        origin = days[0] - pd.Timedelta(days=self.market(days)[2])
+        c = full.to_numpy()
+        o, h, l = (np.empty_like(c) for _ in range(3))
+        for j, col in enumerate(cols):
+            x = c[:, j]
+            ok = np.flatnonzero(~np.isnan(x))
+            sd = PROFILES.get(col, SECTOR_PROFILE)[1] / np.sqrt(DAYS_PER_YEAR if _is_crypto(col) else 252.0)
+            prev = np.concatenate([x[ok[:1]], x[ok[:-1]]])      # 上一个交易日的收盘
+            ok, prev = ok[1:], prev[1:]                         # 第一根只提供前收
+            for a in (o, h, l):
+                a[:, j] = np.nan
+            if not len(ok):
+                continue
+            # 逐 bar 取 (跳空, 上影, 下影)：随机流从起点的第一根 bar 数起，任意起始日期下同一根 bar 取到同一组数
+            first = full.index[ok[0]]
+            skip = (first - origin).days if _is_crypto(col) else int(np.busday_count(origin.date(), first.date()))
+            z = _stream(self.seed, col + "/bars").standard_normal((skip + len(ok), 3))[skip:]
+            op = prev * np.exp(z[:, 0] * GAP_VOL * sd)
+            ext = np.abs(z[:, 1:].T) * RANGE_VOL * sd
+            o[ok, j] = op
+            h[ok, j] = np.maximum(op, x[ok]) * np.exp(ext[0])
+            l[ok, j] = np.minimum(op, x[ok]) * np.exp(-ext[1])
+        frame = lambda a: pd.DataFrame(a[lead.days:], index=close.index, columns=close.columns)
+        return {"Open": frame(o), "High": frame(h), "Low": frame(l), "Close": close}
+
+    def has_fred(self):
+        return True
+
+    def fred_last_updated(self, series_id):
+        if series_id not in ("DFII10", "BAMLH0A0HYM2"):
+            raise KeyError(f"synthetic backend has no FRED series {series_id!r}")
+        return self.last_bars(["^" + series_id])["^" + series_id][0]
+
+    @profiling.timed("synthetic.fred_series")
+    def fred_series(self, series_id):
+        import pandas as pd
+        days = self.calendar(None if self.years is not None else FRED_START)
+        regime, shock, off = self.market(days)
+        if series_id == "DFII10":     # 10Y TIPS 真实利率：压力期避险下行
+            x = self._mean_revert(series_id, regime, shock, off, (1.0, 0.2), 0.01, 0.04, 0.01)
+        elif series_id == "BAMLH0A0HYM2":   # 高收益债利差：压力期走阔
+            x = self._mean_revert(series_id, regime, shock, off, (3.5, 7.5), 0.02, 0.06, -0.05, floor=1.0)
+        else:
+            raise KeyError(f"synthetic backend has no FRED series {series_id!r}")
+        s = pd.Series(x, index=days, name=series_id)
+        return s[days.dayofweek < 5]
+
+_provider = None
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = SyntheticProvider() if SOURCE == "synthetic" else LiveProvider()
+    return _provider
+
+def set_provider(provider):
+    """替换当前数据源（基准测试/离线运行用）；返回旧的"""
+    global _provider
+    old, _provider = _provider, provider
+    return old
@@ -0,0 +1,254 @@
+# fred_vintage.py
+# 按发布时点（vintage）保存 FRED 序列，回测时只用当时已经公布的值，避免用修订后的数据“看到未来”
+# 每条观测的每个版本一行 (series_id, 观测日, 发布日 realtime_start, 值)，存在本地 SQLite（主键即索引）；
+# 整段回测的 as-of 查询一次完成：按发布日排序后做前缀最大值 + searchsorted，不逐日查库。
+#
+# 数据来源（get_source）:
+#   MHI_FRED_FIXTURE=path.csv     本地夹具（列: series_id,date,realtime_start,value），测试/离线用
+#   MHI_DATA_SOURCE=synthetic     由合成 FRED 序列派生：次个工作日首发（带误差），REVISION_DAYS 天后修订为终值
+#   其余                           fredapi.get_series_all_releases（ALFRED，需要 FRED_API_KEY）
+#
+# 用法:
+#   MHI_FRED_PIT=1 python threshold_optimization.py          # MHI 与真实利率拨杆改用时点数据
+#   python fred_vintage.py DFII10 --as-of 2020-03-20         # 查看某一天能看到的序列
+#   python fred_vintage.py DFII10 --fixture out.csv          # 把当前来源的全部版本导出成夹具
+
+import os, time, sqlite3, argparse, threading
+import numpy as np
+import pandas as pd
+import data_provider
+import profiling
+
+VINTAGE_PATH = os.getenv("FRED_VINTAGE_PATH",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fred_vintages.sqlite"))
+FIXTURE_PATH = os.getenv("MHI_FRED_FIXTURE")
+VINTAGE_MAX_AGE_HOURS = 12    # 超过12小时重新拉取版本数据
+REVISION_DAYS = 30            # 合成来源：首发后多少天修订为终值
+REVISION_NOISE = 0.02         # 合成来源：首发值的误差（序列本身单位，%）
+_KEY_SHIFT = 1 << 20          # (观测日, 发布日) -> 单个 int64 键；日期为 1970 年起的天数
+
+def _days(dates):
+    return np.asarray(pd.DatetimeIndex(dates).values.astype("datetime64[D]").astype(np.int64))
+
+def _dates(days):
+    return pd.DatetimeIndex(np.asarray(days, dtype="datetime64[D]"))
+
+# ---------- 来源 ----------
+class LiveVintageSource:
+    name = "alfred"
+
+    def releases(self, series_id):
+        from fredapi import Fred
+        from dotenv import load_dotenv
+        load_dotenv()
+        with profiling.span("fred.get_series_all_releases", series=series_id):
+            df = Fred(api_key=os.getenv("FRED_API_KEY", "")).get_series_all_releases(series_id)
+        return df[["date", "realtime_start", "value"]]
+
+class FixtureVintageSource:
+    """本地 CSV 夹具"""
+    name = "fixture"
+
+    def __init__(self, path):
+        self.path = path
+
+    def releases(self, series_id):
+        df = pd.read_csv(self.path, parse_dates=["date", "realtime_start"])
+        return df.loc[df["series_id"] == series_id, ["date", "realtime_start", "value"]]
+
+class SyntheticVintageSource:
+    """合成 FRED 序列的两版：次个工作日首发 = 终值 + 误差，REVISION_DAYS 天后发布终值"""
+    name = "synthetic"
+
+    def releases(self, series_id):
+        provider = data_provider.get_provider()
+        s = provider.fred_series(series_id)
+        obs = s.index.values.astype("datetime64[D]")
+        noise = data_provider._stream(getattr(provider, "seed", 0), series_id + "/vintage").standard_normal(len(s))
+        first = pd.DataFrame({"date": obs, "realtime_start": np.busday_offset(obs, 1, roll="forward"),
+                              "value": s.to_numpy() + REVISION_NOISE * noise})
+        final = pd.DataFrame({"date": obs, "realtime_start": obs + np.timedelta64(REVISION_DAYS, "D"),
+                              "value": s.to_numpy()})
+        final = final[final["realtime_start"] <= obs[-1]]     # 数据末尾之后的修订还没发生
+        return pd.concat([first, final], ignore_index=True)
+
+def get_source():
+    if FIXTURE_PATH:
+        return FixtureVintageSource(FIXTURE_PATH)
+    if data_provider.SOURCE == "synthetic":
+        return SyntheticVintageSource()
+    return LiveVintageSource()
+
+# ---------- 存储 ----------
+class VintageStore:
+    """vintages(series_id, obs, realtime_start, value)；meta 记录每个序列的来源与拉取时间
+    sqlite 连接只能在创建它的线程里用：每个线程一个连接（服务的刷新线程、多区域的取数线程池都会调用）"""
+
+    def __init__(self, path=VINTAGE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._fetch_lock = threading.Lock()     # 同一时刻只有一个线程从来源拉取
+        self._cache = {}
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS vintages (
+                series_id TEXT, obs INTEGER, realtime_start INTEGER, value REAL,
+                PRIMARY KEY (series_id, obs, realtime_start));
+            CREATE TABLE IF NOT EXISTS meta (series_id TEXT PRIMARY KEY, source TEXT, fetched_at REAL);
+        """)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def ingest(self, series_id, releases, source=""):
+        """releases: DataFrame(date, realtime_start, value)；同一 (观测日, 发布日) 覆盖写入"""
+        obs, rt = _days(releases["date"]), _days(releases["realtime_start"])
+        val = pd.to_numeric(releases["value"], errors="coerce").to_numpy(dtype=float)
+        ok = ~np.isnan(val) & (rt >= obs)      # 缺失值（FRED 的 "."）与早于观测日的发布都丢掉
+        rows = zip([series_id] * int(ok.sum()), obs[ok].tolist(), rt[ok].tolist(), val[ok].tolist())
+        self.conn.executemany("INSERT OR REPLACE INTO vintages VALUES (?, ?, ?, ?)", rows)
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", (series_id, source, time.time()))
+        self.conn.commit()
+        self._cache.pop(series_id, None)
+        profiling.count("fred_vintage.rows", int(ok.sum()))
+        return int(ok.sum())
+
+    def fetched_at(self, series_id, source=None):
+        row = self.conn.execute("SELECT source, fetched_at FROM meta WHERE series_id = ?", (series_id,)).fetchone()
+        if row is None or (source is not None and row[0] != source):
+            return None
+        return row[1]
+
+    def ensure(self, series_id, source=None, max_age_hours=VINTAGE_MAX_AGE_HOURS):
+        """本地没有或已过期（或来源不同）时从来源拉取全部版本；
+        拉取失败时若本地已有同一来源的版本就沿用（打印警告），本地也没有则抛出"""
+        source = source or get_source()
+        with self._fetch_lock:
+            t = self.fetched_at(series_id, source.name)
+            if t is not None and time.time() - t <= max_age_hours * 3600:
+                return self
+            try:
+                with profiling.span("fred_vintage.fetch", series=series_id, source=source.name):
+                    releases = source.releases(series_id)
+            except Exception as e:
+                if t is None:
+                    raise
+                print(f"[WARN] FRED vintages for {series_id} not refreshed ({e}); using the stored vintages "
+                      f"fetched {(time.time() - t) / 3600:.1f}h ago")
+                return self
+            self.conn.execute("DELETE FROM vintages WHERE series_id = ?", (series_id,))
+            self.ingest(series_id, releases, source.name)
+        return self
+
+    def _load(self, series_id):
+        """(观测日, 发布日, 值) 数组，按 (观测日, 发布日) 排序；按序列缓存在内存"""
+        if series_id not in self._cache:
+            with profiling.span("fred_vintage.load", series=series_id):
+                rows = self.conn.execute("SELECT obs, realtime_start, value FROM vintages WHERE series_id = ? "
+                                         "ORDER BY obs, realtime_start", (series_id,)).fetchall()
+            a = np.array(rows, dtype=float).reshape(-1, 3)
+            self._cache[series_id] = (a[:, 0].astype(np.int64), a[:, 1].astype(np.int64), a[:, 2])
+        return self._cache[series_id]
+
+    def first_release(self, series_id):
+        """每个观测日的首发值"""
+        obs, rt, val = self._load(series_id)
+        first = np.flatnonzero(np.r_[True, obs[1:] != obs[:-1]])
+        return pd.Series(val[first], index=_dates(obs[first]), name=series_id)
+
+    def latest(self, series_id):
+        """每个观测日的最新修订值（= 普通 FRED 下载）"""
+        obs, rt, val = self._load(series_id)
+        last = np.flatnonzero(np.r_[obs[1:] != obs[:-1], True])
+        return pd.Series(val[last], index=_dates(obs[last]), name=series_id)
+
+    def snapshot(self, series_id, as_of):
+        """as_of 当天能看到的整条序列（每个观测日取当时最新的版本）"""
+        obs, rt, val = self._load(series_id)
+        keep = rt <= _days([as_of])[0]
+        obs, val = obs[keep], val[keep]
+        last = np.flatnonzero(np.r_[obs[1:] != obs[:-1], True]) if len(obs) else np.arange(0)
+        return pd.Series(val[last], index=_dates(obs[last]), name=series_id)
+
+    @profiling.timed("fred_vintage.as_of")
+    def as_of(self, series_id, dates):
+        """对每个查询日 A：A 当天已公布的最新观测日的、A 当天已知的最新版本值；没有则 NaN
+        版本按发布日排序，(观测日, 发布日) 键的前缀最大值即“截至该发布日能看到的最新一条”，
+        查询日用 searchsorted 定位——整段回测一次向量化完成"""
+        obs, rt, val = self._load(series_id)
+        q = _days(dates)
+        out = np.full(len(q), np.nan)
+        if len(obs) == 0:
+            return pd.Series(out, index=pd.DatetimeIndex(dates), name=series_id)
+        keys = obs * _KEY_SHIFT + rt                  # 已按 (obs, rt) 排序 -> keys 单调递增
+        order = np.argsort(rt, kind="stable")
+        best = np.maximum.accumulate(keys[order])
+        k = np.searchsorted(rt[order], q, side="right") - 1
+        ok = k >= 0
+        out[ok] = val[np.searchsorted(keys, best[k[ok]])]
+        return pd.Series(out, index=pd.DatetimeIndex(dates), name=series_id)
+
+    def weekly_point_in_time(self, series_id):
+        """周五采样的时点序列：每周五当天能看到的最新值（mhi_weekly 的周频口径）"""
+        obs = self._load(series_id)[0]
+        if len(obs) == 0:
+            return pd.Series(dtype=float, name=series_id)
+        fridays = pd.date_range(_dates(obs[:1])[0], _dates(obs[-1:])[0] + pd.Timedelta(days=6), freq="W-FRI")
+        return self.as_of(series_id, fridays).dropna()
+
+    def to_fixture(self, series_ids, path):
+        """导出为 FixtureVintageSource 可读的 CSV"""
+        parts = []
+        for s in series_ids:
+            obs, rt, val = self._load(s)
+            parts.append(pd.DataFrame({"series_id": s, "date": _dates(obs), "realtime_start": _dates(rt), "value": val}))
+        pd.concat(parts, ignore_index=True).to_csv(path, index=False, date_format="%Y-%m-%d")
+        return path
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VintageStore()
+    return _store
+
+def weekly_point_in_time(series_id, store=None, source=None):
+    """mhi_weekly.load_fred_series 在 MHI_FRED_PIT=1 时调用"""
+    store = store or get_store()
+    return store.ensure(series_id, source).weekly_point_in_time(series_id)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Point-in-time FRED vintages")
+    p.add_argument("series", nargs="+")
+    p.add_argument("--as-of", default=None, help="print the series as known on this date")
+    p.add_argument("--fixture", default=None, help="export all vintages to this CSV fixture")
+    args = p.parse_args(argv)
+    store = get_store()
+    for s in args.series:
+        store.ensure(s)
+        obs, rt, _ = store._load(s)
+        revised = len(obs) - len(np.unique(obs))
+        print(f"{s}: {len(np.unique(obs))} observations, {len(obs)} vintages ({revised} revisions)")
+        if args.as_of:
+            snap = store.snapshot(s, args.as_of)
+            print(f"  as of {args.as_of}: {len(snap)} observations, last {snap.index[-1].date()} = {snap.iloc[-1]:.3f}"
+                  if len(snap) else f"  as of {args.as_of}: nothing published yet")
+    if args.fixture:
+        print(f"Fixture written to {store.to_fixture(args.series, args.fixture)}")
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
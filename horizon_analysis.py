@@ -0,0 +1,140 @@
+# horizon_analysis.py
+# 起点 × 持有期敏感性：策略与各基准在每个 (起始周, 持有周数) 窗口上的年化收益、超额收益与最大回撤
+# 对数净值做前缀和：窗口收益 = L[s+h] - L[s]，O(1) 查表；窗口内最大回撤用按起点分块的前缀最大值（T×T 一次性向量化），
+# 不需要对每个窗口重新模拟。结果是以起始日期为行、持有周数为列的 DataFrame，可直接画热力图。
+# 注意：策略收益取自完整历史上的一次模拟，窗口只是截取这条收益路径（不是从窗口起点重新开始运行策略）。
+#
+# 用法:
+#   python horizon_analysis.py                        # 打印各持有期的超额收益分布
+#   python horizon_analysis.py --out horizons.npz     # 另存全部矩阵（热力图用）
+
+import argparse
+import numpy as np
+import pandas as pd
+from mhi_weekly import build_mhi
+import profiling
+from simulator import prepare_inputs, simulate
+from benchmarks import BenchmarkSet, WEEKLY
+from benchmark_analysis import BENCHMARKS
+
+PERIODS_PER_YEAR = 52
+DEFAULT_HORIZONS = (26, 52, 104, 156, 208, 260)
+DD_BLOCK = 512               # 回撤计算每块的起点数（限制 (块 × T) 中间矩阵的内存）
+
+def log_equity(returns):
+    """(K, T) 周收益 -> (K, T+1) 对数净值前缀和，第0列为0"""
+    r = np.atleast_2d(np.asarray(returns, dtype=float))
+    L = np.zeros((r.shape[0], r.shape[1] + 1))
+    np.cumsum(np.log1p(r), axis=1, out=L[:, 1:])
+    return L
+
+def _window_ends(T, starts, horizons):
+    ends = np.asarray(starts)[:, None] + np.asarray(horizons)[None, :]
+    return ends, ends <= T
+
+def window_annualized(L, starts, horizons, periods_per_year=PERIODS_PER_YEAR):
+    """每个窗口的年化收益 (K, S, H)；超出历史的窗口为 NaN"""
+    T = L.shape[1] - 1
+    ends, valid = _window_ends(T, starts, horizons)
+    growth = L[:, np.minimum(ends, T)] - L[:, np.asarray(starts)][:, :, None]
+    ann = np.expm1(growth * periods_per_year / np.asarray(horizons, dtype=float)[None, None, :])
+    return np.where(valid[None], ann, np.nan)
+
+def window_max_drawdown(L, starts, horizons, block=DD_BLOCK):
+    """每个窗口内的最大回撤 (K, S, H)（负数）；对每个起点 s，
+    dd[s, t] = min_{s<=u<=t} (L[u] - max_{s<=v<=u} L[v])，窗口 [s, s+h] 的回撤即 dd[s, s+h]"""
+    K, T1 = L.shape
+    starts, horizons = np.asarray(starts), np.asarray(horizons)
+    ends, valid = _window_ends(T1 - 1, starts, horizons)
+    out = np.full((K, len(starts), len(horizons)), np.nan)
+    cols = np.arange(T1)
+    for b in range(0, len(starts), block):
+        s = starts[b:b + block]
+        before = cols[None, :] < s[:, None]                              # (B, T+1) 起点之前的位置
+        M = np.where(before[None], -np.inf, L[:, None, :])               # (K, B, T+1)
+        run_max = np.maximum.accumulate(M, axis=2)
+        under = np.where(before[None], 0.0, L[:, None, :] - run_max)
+        dd = np.minimum.accumulate(under, axis=2)
+        e = np.minimum(ends[b:b + block], T1 - 1)
+        out[:, b:b + block] = np.take_along_axis(dd, np.broadcast_to(e[None], (K,) + e.shape), axis=2)
+    out = np.expm1(out)
+    return np.where(valid[None], out, np.nan)
+
+@profiling.timed("horizon_sensitivity")
+def horizon_sensitivity(returns, strategy="MHI_Strategy", horizons=DEFAULT_HORIZONS, start_step=1):
+    """returns: 周收益 DataFrame（列 = 策略与各基准）；返回热力图用的矩阵：
+    annual[名称] / drawdown[名称]：各序列自身的窗口年化收益与最大回撤
+    excess[基准]：策略年化 - 基准年化；dd_excess[基准]：策略回撤 - 基准回撤（>0 表示策略回撤更小）"""
+    names = list(returns.columns)
+    T = len(returns)
+    horizons = np.array([h for h in horizons if h <= T], dtype=int)
+    starts = np.arange(0, T - horizons.min() + 1, start_step) if len(horizons) else np.arange(0)
+    L = log_equity(returns.to_numpy().T)
+    ann = window_annualized(L, starts, horizons)
+    dd = window_max_drawdown(L, starts, horizons)
+    idx = returns.index[starts]
+    frame = lambda a: pd.DataFrame(a, index=idx, columns=pd.Index(horizons, name="horizon_weeks"))
+    k = names.index(strategy)
+    return {
+        "starts": idx, "horizons": horizons,
+        "annual": {n: frame(ann[i]) for i, n in enumerate(names)},
+        "drawdown": {n: frame(dd[i]) for i, n in enumerate(names)},
+        "excess": {n: frame(ann[k] - ann[i]) for i, n in enumerate(names) if i != k},
+        "dd_excess": {n: frame(dd[k] - dd[i]) for i, n in enumerate(names) if i != k},
+    }
+
+def benchmark_returns(inputs, strategy_returns):
+    """与 benchmark_analysis 同口径的基准（周度再平衡的固定权重）"""
+    bench = BenchmarkSet.from_dicts(BENCHMARKS, inputs.assets).evaluate(inputs.returns[1:], WEEKLY)
+    out = pd.DataFrame({"MHI_Strategy": strategy_returns})
+    for name in bench.names:
+        out[name] = bench.returns[:, bench.names.index(name)]
+    return out
+
+def summarize(res, benchmark):
+    """每个持有期：超额收益的中位数/最差/胜率，以及策略与基准的回撤中位数"""
+    ex, dds, ddb = res["excess"][benchmark], res["drawdown"]["MHI_Strategy"], res["drawdown"][benchmark]
+    return pd.DataFrame({
+        "windows": ex.notna().sum(),
+        "median_excess": ex.median(),
+        "worst_excess": ex.min(),
+        "win_rate": (ex > 0).sum() / ex.notna().sum(),
+        "median_dd_strategy": dds.median(),
+        "median_dd_benchmark": ddb.median(),
+    })
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Start-week x horizon sensitivity of the MHI strategy")
+    p.add_argument("--horizons", default=",".join(map(str, DEFAULT_HORIZONS)), help="horizons in weeks")
+    p.add_argument("--step", type=int, default=1, help="evaluate every N-th start week")
+    p.add_argument("--out", default=None, help="save all matrices to an .npz file")
+    args = p.parse_args(argv)
+
+    print("=== Start-Date × Horizon Sensitivity ===\n")
+    inputs = prepare_inputs(*build_mhi())
+    strategy = simulate(inputs).returns_series()
+    returns = benchmark_returns(inputs, strategy)
+    res = horizon_sensitivity(returns, horizons=[int(h) for h in args.horizons.split(",")], start_step=args.step)
+    print(f"{len(res['starts'])} start weeks × {len(res['horizons'])} horizons, {len(returns.columns)} series\n")
+
+    for bench in res["excess"]:
+        s = summarize(res, bench)
+        print(f"--- MHI Strategy vs {bench} ---")
+        print("Horizon | Windows | Median Excess | Worst Excess | Win Rate | Median DD (Strat / Bench)")
+        for h, row in s.iterrows():
+            print(f"  {h:4d}w |  {int(row['windows']):5d}  |    {row['median_excess']:+6.1%}     |   {row['worst_excess']:+6.1%}    |  {row['win_rate']:5.1%}  |  "
+                  f"{row['median_dd_strategy']:6.1%} / {row['median_dd_benchmark']:6.1%}")
+        print()
+
+    if args.out:
+        arrays = {"starts": res["starts"].strftime("%Y-%m-%d").to_numpy(), "horizons": res["horizons"]}
+        for kind in ("annual", "drawdown", "excess", "dd_excess"):
+            for name, df in res[kind].items():
+                arrays[f"{kind}__{name}"] = df.to_numpy()
+        np.savez(args.out, **arrays)
+        print(f"Matrices saved to {args.out}")
+    return res
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,195 @@
+# mhi_service.py
+# 常驻本地建议服务：内存里保存最新MHI状态，通过本地HTTP（TCP或Unix socket）响应advise请求
+#
+# 用法:
+#   python mhi_service.py                         # 127.0.0.1:8765，每6小时刷新一次
+#   python mhi_service.py --port 9000 --refresh-hours 1
+#   python mhi_service.py --unix /tmp/mhi.sock
+#   curl "http://127.0.0.1:8765/advise?SPY=0.4&GLD=0.4&BTC=0.2"
+#   curl -X POST http://127.0.0.1:8765/refresh
+
+import os, sys, json, math, stat, time, threading, socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import mhi_weekly as mw
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+REFRESH_HOURS = 6.0
+
+class AdvisoryService:
+    """持有最新MHI状态；刷新在后台线程进行，读取无锁（整体替换引用）"""
+
+    def __init__(self, refresh_hours=REFRESH_HOURS, builder=None):
+        self.refresh_hours = refresh_hours
+        self.builder = builder or self._build_state
+        self._current = (None, None, None)   # (state, summary, refreshed_at)，整体替换，读者不会看到错配的组合
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _build_state():
+        price_w, mhi, ry_w = mw.build_mhi()
+        return mw.mhi_state(mhi, ry_w)
+
+    @property
+    def state(self):
+        return self._current[0]
+
+    @property
+    def summary(self):
+        return self._current[1]
+
+    @property
+    def refreshed_at(self):
+        return self._current[2]
+
+    def set_state(self, state):
+        # 预先算好分档/目标/确认，请求时只需做差额；刷新时间取状态的构建时间（读本地缓存时不算新鲜）
+        base = mw.compute_advice({}, state)
+        summary = {k: base[k] for k in ("ref_date", "mhi", "bucket", "target", "confirmed")}
+        self._current = (state, summary, state.get("built_at", time.time()))
+
+    def refresh(self):
+        """重新构建MHI；同一时刻只允许一次刷新"""
+        with self._refresh_lock:
+            try:
+                self.set_state(self.builder())
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print("[WARN] refresh failed:", e)
+                if self.state is None:
+                    raise
+        return self.summary
+
+    def start(self):
+        cached = mw.load_mhi_state()
+        if cached is not None:
+            self.set_state(cached)
+        else:
+            self.refresh()
+        if self.refresh_hours and self.refresh_hours > 0:
+            threading.Thread(target=self._schedule, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _schedule(self):
+        while not self._stop.wait(60):
+            if time.time() - (self.refreshed_at or 0) >= self.refresh_hours * 3600:
+                self.refresh()
+
+    def advise(self, current_weights):
+        state, _, refreshed_at = self._current
+        if state is None:
+            raise RuntimeError("MHI state not ready")
+        res = mw.compute_advice(current_weights, state)
+        res["refreshed_at"] = refreshed_at
+        return res
+
+def parse_weights(params):
+    """SPY/GLD/BTC权重（可选CASH）；缺省CASH=1-三资产之和；nan/inf 或负权重报 ValueError（400）"""
+    cur = {k: float(params.get(k, 0.0)) for k in ("SPY", "GLD", "BTC")}
+    cur["CASH"] = float(params["CASH"]) if "CASH" in params else max(0.0, 1.0 - sum(cur.values()))
+    bad = [k for k, v in cur.items() if not math.isfinite(v) or v < 0]
+    if bad:
+        raise ValueError(f"weights must be finite and non-negative: {', '.join(bad)}")
+    return cur
+
+class AdviceHandler(BaseHTTPRequestHandler):
+    service = None   # 由 make_server 注入
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(n) or b"{}") if n else {}
+        if not isinstance(body, dict):
+            raise ValueError("request body must be a JSON object")
+        return body
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/health":
+                self._send(200, {"ok": self.service.state is not None, "refreshed_at": self.service.refreshed_at,
+                                 "last_error": self.service.last_error})
+            elif url.path == "/state":
+                self._send(200, self.service.summary or {})
+            elif url.path == "/advise":
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                self._send(200, self.service.advise(parse_weights(params)))
+            else:
+                self._send(404, {"error": "not found"})
+        except (ValueError, TypeError, RuntimeError) as e:
+            self._send(400, {"error": str(e)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/advise":
+                body = self._body()
+                if "accounts" in body:
+                    if not isinstance(body["accounts"], dict) or not all(isinstance(w, dict) for w in body["accounts"].values()):
+                        raise ValueError("accounts must be an object of {account: weights}")
+                    out = {acct: self.service.advise(parse_weights(w)) for acct, w in body["accounts"].items()}
+                    self._send(200, {"accounts": out})
+                else:
+                    self._send(200, self.service.advise(parse_weights(body)))
+            elif url.path == "/refresh":
+                self._send(200, self.service.refresh())
+            else:
+                self._send(404, {"error": "not found"})
+        except (ValueError, TypeError, RuntimeError) as e:
+            self._send(400, {"error": str(e)})
+
+    def address_string(self):
+        # Unix socket 的 client_address 是空字符串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    handler = type("BoundAdviceHandler", (AdviceHandler,), {"service": service})
+    if unix_path:
+        # 只清理上次留下的 socket；同名的普通文件/目录不动，直接报错
+        if os.path.lexists(unix_path):
+            if not stat.S_ISSOCK(os.lstat(unix_path).st_mode):
+                raise FileExistsError(f"{unix_path} exists and is not a socket")
+            os.unlink(unix_path)
+        return ThreadingUnixHTTPServer(unix_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(argv):
+    opts = {"--host": DEFAULT_HOST, "--port": DEFAULT_PORT, "--unix": None, "--refresh-hours": REFRESH_HOURS}
+    it = iter(argv)
+    for a in it:
+        if a in opts:
+            opts[a] = next(it)
+    service = AdvisoryService(refresh_hours=float(opts["--refresh-hours"]))
+    service.start()
+    server = make_server(service, opts["--host"], int(opts["--port"]), opts["--unix"])
+    where = opts["--unix"] or f"http://{opts['--host']}:{opts['--port']}"
+    print(f"MHI advisory service on {where} (ref_date={service.summary['ref_date']}, bucket={service.summary['bucket']})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+if __name__ == "__main__":
+    serve(sys.argv[1:])
@@ -0,0 +1,167 @@
+# mhi_watch.py
+# 盯盘模式：定时检查各数据源的“新鲜度标记”（每个代码最后一根日线的日期与收盘价、FRED 序列的 last_updated），
+# 标记都没变就什么也不算；有变化时只补取新数据（价格从变化前的最后一根 bar 起取尾巴、FRED 只在标记变了才重拉），
+# 重算 MHI、写入 MHI 状态（advise 快路径 / mhi_service 直接受益），
+# 分档、三周确认或目标权重与上一次不同时输出一行 JSON 事件（stdout，可选追加到文件）。
+# 本地缓存（价格面板、FRED 周线、标记、上次建议）存在 WATCH_CACHE_PATH（pickle）。
+#
+# 用法:
+#   python mhi_watch.py                              # 每15分钟检查一次
+#   python mhi_watch.py --once                       # 只检查一次（适合 cron）
+#   python mhi_watch.py --interval 300 --events mhi_events.jsonl
+#   python mhi_weekly.py watch --once
+
+import os, sys, json, time, pickle, argparse, datetime as dt
+import mhi_weekly as mw
+import data_provider
+import profiling
+
+WATCH_CACHE_PATH = os.getenv("MHI_WATCH_CACHE",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mhi_watch.pkl"))
+WATCH_INTERVAL_SECONDS = 900
+FRED_SERIES = ("DFII10", "BAMLH0A0HYM2")
+EVENT_FIELDS = ("bucket", "confirmed", "target")   # 这些变了才发事件
+SPLICE_LEAD_DAYS = 7         # 补取的尾巴往前多取几天，拼接时用 since 之前已收盘的 bar 对齐水平
+CACHE_VERSION = 2            # 缓存格式（2：价格标记为 (日期, 收盘价)）；不同则整体重建
+
+def _tickers():
+    sectors = data_provider.get_provider().sectors(mw.SECTORS)
+    return list(mw.TICKERS_YF.values()) + sectors, sectors
+
+@profiling.timed("watch.markers")
+def freshness_markers(cols):
+    """{"prices": {代码: (最后日期, 收盘价)}, "fred": {序列: last_updated}}；只查元数据/最近几天，不取全量历史
+    收盘价也在标记里：盘中取到的未完成 bar 之后收盘价变了，会再取一次覆盖掉"""
+    provider = data_provider.get_provider()
+    fred = {s: provider.fred_last_updated(s) for s in FRED_SERIES} if provider.has_fred() else {}
+    return {"prices": provider.last_bars(cols), "fred": fred}
+
+def load_cache(path=None):
+    path = path or WATCH_CACHE_PATH
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if cache.get("source") != data_provider.SOURCE:   # 合成数据的缓存不能用于实盘（反之亦然）
+        return None
+    if cache.get("version") != CACHE_VERSION:
+        return None
+    return cache
+
+def save_cache(cache, path=None):
+    path = path or WATCH_CACHE_PATH
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[WARN] could not write watch cache:", e, file=sys.stderr)
+
+def _splice(old, new, since):
+    """old 截到 since 之前，接上 new 从 since 起的部分（since 当天的 bar 用新的，盘中未收盘的 bar 会被覆盖）；
+    new 按两者在 since 之前最后一个有效价换算到 old 的水平（复权因子变化时保持收益连续；
+    不用 since 当天，那根可能正是缓存里未收盘的 bar）"""
+    import pandas as pd
+    head = old.loc[old.index < since]
+    new = new[old.columns]
+    before = new.loc[new.index < since]
+    if head.empty or before.empty:
+        scale = 1.0
+    else:
+        scale = (head.ffill().iloc[-1] / before.ffill().iloc[-1]).where(lambda s: s.notna(), 1.0)
+    return pd.concat([head, new.loc[new.index >= since] * scale])
+
+@profiling.timed("watch.update_prices")
+def update_prices(cache, cols, markers):
+    """价格面板：没有缓存/代码表变了 -> 全量；否则从标记变化的代码里最早的旧日期起补取"""
+    import pandas as pd
+    if cache is None or cache.get("cols") != cols or cache.get("px") is None:
+        return mw.dl_yf(cols)
+    old = cache["markers"]["prices"]
+    moved = [c for c in cols if markers["prices"].get(c) != old.get(c)]
+    if not moved:
+        return cache["px"]
+    since = pd.Timestamp(min(old[c][0] if old.get(c) else mw.START for c in moved))
+    tail = mw.dl_yf(cols, start=(since - pd.Timedelta(days=SPLICE_LEAD_DAYS)).date().isoformat())
+    profiling.count("watch.tail_rows", len(tail))
+    return _splice(cache["px"], tail, since)
+
+def update_fred(cache, markers):
+    if cache is not None and "fred" in cache and cache["markers"]["fred"] == markers["fred"]:
+        return cache["fred"]
+    return mw.load_fred_series()
+
+def summarize(advice):
+    """事件比较用的精简建议（目标权重四舍五入，避免浮点噪声触发事件）"""
+    return {"ref_date": advice["ref_date"], "mhi": round(advice["mhi"], 4), "bucket": advice["bucket"],
+            "confirmed": advice["confirmed"], "target": {k: round(v, 4) for k, v in advice["target"].items()}}
+
+def diff_advice(prev, cur):
+    if prev is None:
+        return ["initial"]
+    return [k for k in EVENT_FIELDS if prev.get(k) != cur.get(k)]
+
+@profiling.timed("watch.check")
+def check(cache_path=None):
+    """检查一次；返回 (事件 dict 或 None, 状态说明)。标记未变时不做任何计算"""
+    cols, sectors = _tickers()
+    cache = load_cache(cache_path)
+    markers = freshness_markers(cols)
+    if cache is not None and cache.get("cols") == cols and cache["markers"] == markers:
+        profiling.count("watch.unchanged")
+        return None, "no new data"
+
+    px = update_prices(cache, cols, markers)
+    ry_w, oas_w = update_fred(cache, markers)
+    price_w, mhi, ry_w = mw.compute_mhi(px, ry_w, oas_w, sectors)
+    state = mw.mhi_state(mhi, ry_w)
+    mw.save_mhi_state(state)
+    cur = summarize(mw.compute_advice({}, state))
+    prev = cache.get("advice") if cache is not None else None
+    changes = diff_advice(prev, cur)
+    save_cache({"source": data_provider.SOURCE, "version": CACHE_VERSION, "cols": cols, "markers": markers, "px": px,
+                "fred": (ry_w, oas_w), "advice": cur}, cache_path)
+    if not changes:
+        return None, f"updated to {cur['ref_date']}, advice unchanged"
+    event = {"time": dt.datetime.now().isoformat(timespec="seconds"), "changes": changes, **cur}
+    if prev is not None:
+        event["previous"] = {k: prev.get(k) for k in EVENT_FIELDS}
+    return event, f"updated to {cur['ref_date']}, changed: {','.join(changes)}"
+
+def emit(event, events_path=None):
+    line = json.dumps(event)
+    print(line, flush=True)
+    if events_path:
+        with open(events_path, "a") as f:
+            f.write(line + "\n")
+
+def watch(interval=WATCH_INTERVAL_SECONDS, once=False, events_path=None, cache_path=None):
+    """检查循环：事件写 stdout（JSON 行），状态说明写 stderr；单次检查出错只警告、下一轮再试"""
+    while True:
+        try:
+            event, note = check(cache_path)
+            if event is not None:
+                emit(event, events_path)
+            print(f"[{dt.datetime.now():%Y-%m-%d %H:%M:%S}] {note}", file=sys.stderr, flush=True)
+        except Exception as e:
+            if once:
+                raise
+            print("[WARN] watch check failed:", e, file=sys.stderr, flush=True)
+        if once:
+            return
+        time.sleep(interval)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Watch data sources and emit MHI advice change events")
+    p.add_argument("--interval", type=float, default=WATCH_INTERVAL_SECONDS, help="seconds between checks")
+    p.add_argument("--once", action="store_true", help="check once and exit")
+    p.add_argument("--events", default=None, help="also append events to this JSONL file")
+    p.add_argument("--cache", default=None, help=f"watch cache path (default {WATCH_CACHE_PATH})")
+    args = p.parse_args(argv)
+    watch(args.interval, args.once, args.events, args.cache)
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
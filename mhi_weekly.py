@@ -2,13 +2,13 @@
 # 功能：周频抓数据 -> 计算MHI(市场温度计) -> 给出本周目标权重/买卖建议 -> 可选回测
 # 依赖：yfinance, pandas, numpy, backtrader, python-dotenv, requests-cache, (可选) fredapi
 
-import os, sys, datetime as dt
-import numpy as np
-import pandas as pd
-import yfinance as yf
-import backtrader as bt
-from dataclasses import dataclass
-from dotenv import load_dotenv
+# 重依赖（pandas / yfinance / backtrader / dotenv）均在用到的函数内延迟导入，
+# 这样 `import mhi_weekly` 和 advise 的缓存快路径都不需要付出它们的导入成本。
+
+import os, sys, json, time, datetime as dt
+from functools import lru_cache
+import data_provider
+import profiling
 
 # ---------- 基本设置（可按"更保守"口味微调） ----------
 START = "2015-01-01"
@@ -16,6 +16,10 @@ BASE_WEIGHTS   = {"SPY":0.35, "GLD":0.45, "BTC":0.10, "CASH":0.10}
 LOW_MHI_WEI    = {"SPY":0.55, "GLD":0.25, "BTC":0.05, "CASH":0.15}
 HIGH_MHI_WEI   = {"SPY":0.15, "GLD":0.60, "BTC":0.05, "CASH":0.20}
 
+# MHI分档阈值 (±1.75)
+LOW_THRESHOLD  = -1.75
+HIGH_THRESHOLD = 1.75
+
 # 现金上限
 CASH_MAX = 0.35          # 提高现金上限到35%
 
@@ -26,6 +30,16 @@ COMFORT_ZONE = 0.05      # 舒适区间：目标权重±5%内不调仓
 COMMISSION = 0.0005      # 5bps手续费
 USE_REAL_YIELD_TILT = True   # 启用真实利率拨杆
 USE_HY_OAS_IN_MHI   = True   # MHI中启用高收益债利差
+FRED_POINT_IN_TIME  = os.getenv("MHI_FRED_PIT", "") == "1"   # FRED 用时点（发布当时）数据，见 fred_vintage.py
+
+# 本地MHI状态缓存（advise 快路径直接读取，无需下载与重算）
+MHI_STATE_PATH = os.getenv("MHI_STATE_PATH",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mhi_state.json"))
+STATE_MAX_AGE_HOURS = 12     # 缓存超过12小时视为过期，重新构建
+STATE_KEEP_WEEKS = 8         # 缓存里保留最近8周的MHI
+
+# 设置后 build_mhi 直接读取快照（snapshot.py），不下载、不重算，也不改写本地MHI状态
+SNAPSHOT_PATH = os.getenv("MHI_SNAPSHOT", "")
 
 # ---------- Tickers ----------
 TICKERS_YF = {
@@ -39,72 +53,161 @@ TICKERS_YF = {
 SECTORS = ["XLY","XLP","XLE","XLF","XLV","XLI","XLB","XLRE","XLK","XLU","XLC"]  # 11大板块ETF
 
 # ---------- 小工具 ----------
+def resample_last(df, rule="W-FRI"):
+    """每期最后一个收盘；rule=None 为日频：只留工作日，缺值（节假日）沿用前一日"""
+    out = df[df.index.dayofweek < 5].ffill() if rule is None else df.resample(rule).last()
+    return out.dropna(how="all")
+
 def weekly_last(df):    # 周五收盘采样
-    return df.resample("W-FRI").last().dropna(how="all")
+    with profiling.span("weekly_last", rows=len(df)):
+        return resample_last(df, "W-FRI")
 
+@profiling.timed("zscore")
 def zscore(series, window=260):
     return (series - series.rolling(window).mean()) / series.rolling(window).std(ddof=0)
 
 def dl_yf(cols, start=START):
-    data = yf.download(cols, start=start, auto_adjust=True, progress=False)["Close"]
-    return data if isinstance(data, pd.DataFrame) else data.to_frame()
+    # 取数走 data_provider（MHI_DATA_SOURCE=synthetic 时为离线合成数据）
+    with profiling.span("fetch_prices", tickers=len(cols)):
+        px = data_provider.get_provider().prices(cols, start)
+    if profiling.ENABLED:
+        profiling.count("prices.rows", len(px))
+        profiling.count("prices.bytes", int(px.memory_usage(index=True).sum()))
+    return px
 
+@profiling.timed("compute_breadth")
 def compute_breadth(sector_w):
     ma = sector_w.rolling(40).mean()                  # 约等于200个交易日的周均线
     above = (sector_w > ma).astype(float)
     return above.mean(axis=1).rename("breadth")       # 0~1
 
 # ---------- 可选：FRED 序列 ----------
+@profiling.timed("load_fred_series")
 def load_fred_series():
-    load_dotenv()
-    key = os.getenv("FRED_API_KEY", "")
-    if not key:
+    if FRED_POINT_IN_TIME:
+        return _load_fred_point_in_time()
+    provider = data_provider.get_provider()
+    if not provider.has_fred():
         return None, None
     try:
-        from fredapi import Fred
-        fred = Fred(api_key=key)
         # 10Y TIPS 真实利率（日频）
-        ry = fred.get_series("DFII10").to_frame("real_yield")
+        ry = provider.fred_series("DFII10").to_frame("real_yield")
         ry_w = weekly_last(ry)["real_yield"]
         # 高收益债利差（日频）
-        oas = fred.get_series("BAMLH0A0HYM2").to_frame("hy_oas")
+        oas = provider.fred_series("BAMLH0A0HYM2").to_frame("hy_oas")
         oas_w = weekly_last(oas)["hy_oas"]
         return ry_w, oas_w
     except Exception as e:
         print("[WARN] FRED unavailable:", e)
         return None, None
 
+def _load_fred_point_in_time():
+    """每周五只用当天已公布的版本（首发/修订），避免回测用到事后修订的数据
+    取不到时直接报错：悄悄去掉利差分量和真实利率拨杆会得到另一个信号"""
+    import fred_vintage
+    try:
+        ry_w = fred_vintage.weekly_point_in_time("DFII10").rename("real_yield")
+        oas_w = fred_vintage.weekly_point_in_time("BAMLH0A0HYM2").rename("hy_oas")
+    except Exception as e:
+        raise RuntimeError(f"point-in-time FRED data unavailable (MHI_FRED_PIT=1): {e}") from e
+    return ry_w, oas_w
+
 # ---------- 构建 MHI ----------
-def build_mhi():
-    px = dl_yf(list(TICKERS_YF.values()) + SECTORS)
-    px_w = weekly_last(px)
-    price_w = px_w[[TICKERS_YF["SPY"],TICKERS_YF["GLD"],TICKERS_YF["BTC"]]].rename(
-        columns={TICKERS_YF["SPY"]:"SPY", TICKERS_YF["GLD"]:"GLD", TICKERS_YF["BTC"]:"BTC"})
+def mhi_components(px_w, oas_w=None, sectors=None):
+    """周线宽表 -> 各 frenzy 分量（列: frenzy_vix / frenzy_breadth / [frenzy_hyoas]，已去掉缺失周）；MHI 即其行均值"""
+    import pandas as pd
+    sectors = SECTORS if sectors is None else sectors
     vix_w   = px_w[TICKERS_YF["VIX"]].rename("VIX")
-    sectors = px_w[SECTORS]
+    sector_w = px_w[sectors]
 
     z_vix = zscore(vix_w).rename("z_vix")
-    breadth = compute_breadth(sectors)
+    breadth = compute_breadth(sector_w)
     z_breadth = zscore(breadth).rename("z_breadth")
 
     # Frenzy 分=自满/过热：低VIX、高广度 -> frenzy = -z(VIX) + z(breadth)
     frenzy_parts = [(-z_vix).rename("frenzy_vix"), z_breadth.rename("frenzy_breadth")]
 
-    ry_w, oas_w = load_fred_series()
     if USE_HY_OAS_IN_MHI and oas_w is not None:
         frenzy_parts.append((-zscore(oas_w)).rename("frenzy_hyoas"))  # 利差小=自满
 
-    frenzy_df = pd.concat(frenzy_parts, axis=1).dropna()
-    mhi = frenzy_df.mean(axis=1).rename("MHI")   # 越高越"疯狂"
+    return pd.concat(frenzy_parts, axis=1).dropna()
 
+@profiling.timed("compute_mhi")
+def compute_mhi(px, ry_w=None, oas_w=None, sectors=None):
+    """由日频收盘价面板（列为 yfinance 代码）与 FRED 周频序列计算 MHI；纯计算，不联网、不写状态"""
+    px_w = weekly_last(px)
+    price_w = px_w[[TICKERS_YF["SPY"],TICKERS_YF["GLD"],TICKERS_YF["BTC"]]].rename(
+        columns={TICKERS_YF["SPY"]:"SPY", TICKERS_YF["GLD"]:"GLD", TICKERS_YF["BTC"]:"BTC"})
+    frenzy_df = mhi_components(px_w, oas_w, sectors)
+    mhi = frenzy_df.mean(axis=1).rename("MHI")   # 越高越"疯狂"
     return price_w.loc[mhi.index], mhi, ry_w
 
+@profiling.timed("build_mhi")
+def build_mhi():
+    if SNAPSHOT_PATH:
+        import snapshot
+        return snapshot.load(SNAPSHOT_PATH).mhi_data()
+    sectors = data_provider.get_provider().sectors(SECTORS)   # 合成后端可扩展板块数
+    px = dl_yf(list(TICKERS_YF.values()) + sectors)
+    ry_w, oas_w = load_fred_series()
+    price_w, mhi, ry_w = compute_mhi(px, ry_w, oas_w, sectors)
+    save_mhi_state(mhi_state(mhi, ry_w))
+    return price_w, mhi, ry_w
+
+# ---------- MHI 状态缓存（纯Python，不依赖pandas） ----------
+def mhi_state(mhi, ry_w):
+    """把 advise 需要的最少信息抽成可JSON化的状态"""
+    ref_date = mhi.index[-1]
+    tail = mhi.iloc[-STATE_KEEP_WEEKS:]
+    ry_delta = real_yield_delta(ry_w, ref_date)
+    return {
+        "version": 1,
+        "source": data_provider.SOURCE,
+        "built_at": time.time(),
+        "ref_date": ref_date.date().isoformat(),
+        "mhi_dates": [d.date().isoformat() for d in tail.index],
+        "mhi": [float(v) for v in tail.values],
+        "ry_delta": None if ry_delta is None or ry_delta != ry_delta else ry_delta,
+    }
+
+def save_mhi_state(state, path=None):
+    path = path or MHI_STATE_PATH
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[WARN] could not write MHI state:", e)
+
+def load_mhi_state(path=None, max_age_hours=STATE_MAX_AGE_HOURS):
+    """读取本地MHI状态；不存在/过期/格式不对时返回None"""
+    path = path or MHI_STATE_PATH
+    state = _read_mhi_state(path, max_age_hours)
+    profiling.count("mhi_state.hits" if state is not None else "mhi_state.misses")
+    return state
+
+def _read_mhi_state(path, max_age_hours):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != 1 or not state.get("mhi"):
+        return None
+    if state.get("source", "live") != data_provider.SOURCE:   # 合成数据的状态不能用于实盘建议（反之亦然）
+        return None
+    if max_age_hours is not None and time.time() - state.get("built_at", 0) > max_age_hours * 3600:
+        return None
+    return state
+
 # ---------- 目标权重与拨杆 ----------
-def pick_weights(mhi_val):
-    # 调整阈值，平衡调仓频率 (±1.75)
-    if mhi_val <= -1.75:
+def pick_weights(mhi_val, low=LOW_THRESHOLD, high=HIGH_THRESHOLD):
+    # 单点/字典版本（advise 快路径不依赖numpy）；批量版本见 portfolio.pick_weights_array
+    # 调整阈值，平衡调仓频率 (默认±1.75)
+    if mhi_val <= low:
         bucket, target = "LOW", LOW_MHI_WEI.copy()
-    elif mhi_val >= 1.75:
+    elif mhi_val >= high:
         bucket, target = "HIGH", HIGH_MHI_WEI.copy()
     else:
         bucket, target = "NEUTRAL", BASE_WEIGHTS.copy()
@@ -118,98 +221,135 @@ def pick_weights(mhi_val):
             target[k] = max(0.0, target[k]*scale)
     return bucket, target
 
+def real_yield_delta(real_yield_w, ref_date):
+    """真实利率近4周变化；数据不足时返回None"""
+    if real_yield_w is None or ref_date not in real_yield_w.index:
+        return None
+    idx = real_yield_w.index.get_loc(ref_date)
+    if idx < 4:
+        return None
+    return float(real_yield_w.iloc[idx] - real_yield_w.iloc[idx-4])
+
+def tilt_by_real_yield(target, delta):
+    if not USE_REAL_YIELD_TILT or delta is None:
+        return target
+    # 阈值：±0.20个百分点（可调）
+    if delta <= -0.20:   # 真实利率下行 -> 金+10%、股-10%
+        target["GLD"] = min(1.0, target["GLD"] + 0.10); target["SPY"] = max(0.0, target["SPY"] - 0.10)
+    elif delta >= 0.20:  # 上行 -> 股+10%、金-10%
+        target["SPY"] = min(1.0, target["SPY"] + 0.10); target["GLD"] = max(0.0, target["GLD"] - 0.10)
+    # 再做一次现金上限与归一
+    return pick_weights(0)[1] | {"SPY":target["SPY"],"GLD":target["GLD"],"BTC":target["BTC"],"CASH":target.get("CASH",0.0)}
+
 def apply_real_yield_tilt(target, real_yield_w, ref_date):
-    if not (USE_REAL_YIELD_TILT and real_yield_w is not None and ref_date in real_yield_w.index):
+    if not USE_REAL_YIELD_TILT:
         return target
-    idx = real_yield_w.index.get_loc(ref_date)
-    if idx >= 4:
-        delta = real_yield_w.iloc[idx] - real_yield_w.iloc[idx-4]
-        # 阈值：±0.20个百分点（可调）
-        if delta <= -0.20:   # 真实利率下行 -> 金+10%、股-10%
-            target["GLD"] = min(1.0, target["GLD"] + 0.10); target["SPY"] = max(0.0, target["SPY"] - 0.10)
-        elif delta >= 0.20:  # 上行 -> 股+10%、金-10%
-            target["SPY"] = min(1.0, target["SPY"] + 0.10); target["GLD"] = max(0.0, target["GLD"] - 0.10)
-        # 再做一次现金上限与归一
-        return pick_weights(0)[1] | {"SPY":target["SPY"],"GLD":target["GLD"],"BTC":target["BTC"],"CASH":target.get("CASH",0.0)}
-    return target
+    return tilt_by_real_yield(target, real_yield_delta(real_yield_w, ref_date))
 
 # ---------- 生成"买/卖建议"（输入当前持仓权重，输出目标与差额） ----------
-def advise(current_weights:dict):
-    price_w, mhi, ry_w = build_mhi()
-    # 取最近一个周五
-    ref_date = mhi.index[-1]
-    mhi_val = float(mhi.iloc[-1])
+def compute_advice(current_weights:dict, state:dict):
+    """基于MHI状态计算目标/差额/确认（纯Python，无打印）"""
+    mhi_vals = state["mhi"]
+    mhi_val = float(mhi_vals[-1])
     bucket, target = pick_weights(mhi_val)
-    target = apply_real_yield_tilt(target, ry_w, ref_date)
+    target = tilt_by_real_yield(target, state.get("ry_delta"))
 
     # 三周确认：检查过去三周是否都是同一分档
-    if len(mhi) >= CONFIRM_WEEKS:
+    if len(mhi_vals) >= CONFIRM_WEEKS:
         recent_buckets = []
         for i in range(1, CONFIRM_WEEKS + 1):
-            recent_bucket, _ = pick_weights(float(mhi.iloc[-i]))
+            recent_bucket, _ = pick_weights(float(mhi_vals[-i]))
             recent_buckets.append(recent_bucket)
         confirmed = len(set(recent_buckets)) == 1  # 所有分档都相同
     else:
         confirmed = True
 
     delta = {k: round(target[k] - current_weights.get(k,0.0), 4) for k in ["SPY","GLD","BTC","CASH"]}
-    
+
     # 只在极端MHI条件下调仓，忽略舒适区间
     if bucket == "NEUTRAL":
         # 如果是中性区间，不调仓
         delta = {k: 0.0 for k in ["SPY","GLD","BTC","CASH"]}
-        print("MHI in neutral zone, no rebalancing needed.")
     else:
         # 只在极端情况下(LOW/HIGH)才考虑最小变动阈值
         for k in delta:
             if abs(delta[k]) < MIN_CHANGE:
                 delta[k] = 0.0
 
-    print(f"[{ref_date.date()}] MHI={mhi_val:.2f} bucket={bucket} confirmed={confirmed}")
-    print("Target weights:", target)
-    print("Delta vs current (>0 buy, <0 sell):", delta)
-    if not confirmed:
+    return {"ref_date": state["ref_date"], "mhi": mhi_val, "bucket": bucket,
+            "target": target, "delta": delta, "confirmed": confirmed}
+
+@profiling.timed("advise")
+def advise(current_weights:dict, state=None):
+    if state is None:
+        price_w, mhi, ry_w = build_mhi()
+        state = mhi_state(mhi, ry_w)
+    res = compute_advice(current_weights, state)
+
+    if res["bucket"] == "NEUTRAL":
+        print("MHI in neutral zone, no rebalancing needed.")
+    print(f"[{res['ref_date']}] MHI={res['mhi']:.2f} bucket={res['bucket']} confirmed={res['confirmed']}")
+    print("Target weights:", res["target"])
+    print("Delta vs current (>0 buy, <0 sell):", res["delta"])
+    if not res["confirmed"]:
         print("(Note: Two-week confirmation not met, you may wait this week.)")
-    return target, delta, confirmed
+    return res["target"], res["delta"], res["confirmed"]
 
 # ---------- 可选：简单回测 ----------
-class PandasData(bt.feeds.PandasData):
-    params = (("datetime", None), ("open",-1),("high",-1),("low",-1),("close",0),("volume",-1),("openinterest",-1))
-
-class WeeklyRebal(bt.Strategy):
-    params = dict(mhi=None, ry=None)
-
-    def __init__(self):
-        self.mhi = self.p.mhi
-        self.ry = self.p.ry
-        self.recent_bins = []
-
-    def next(self):
-        dtc = self.data0.datetime.date(0)
-        if dtc.weekday() != 0:  # 周一再平衡
-            return
-        ref_date = dtc - dt.timedelta(days=3)  # 上周五
-        if ref_date not in self.mhi.index:
-            ref_date = self.mhi.index[self.mhi.index.get_loc(ref_date, method="pad")]
-        m = float(self.mhi.loc[ref_date])
-        bucket, target = pick_weights(m)
-        self.recent_bins.append(bucket); self.recent_bins = self.recent_bins[-CONFIRM_WEEKS:]
-        if len(self.recent_bins)<CONFIRM_WEEKS or len(set(self.recent_bins))>1:
-            return
-        target = apply_real_yield_tilt(target, self.ry, ref_date)
-
-        # 现金 = 1 - 三资产
-        w_spy, w_gld, w_btc = target["SPY"], target["GLD"], target["BTC"]
-        total = self.broker.getvalue()
-        for name in ["SPY","GLD","BTC"]:
-            data = [d for d in self.datas if d._name==name][0]
-            cur = self.getposition(data).size * data.close[0] / total if total>0 else 0.0
-            tgt = {"SPY":w_spy,"GLD":w_gld,"BTC":w_btc}[name]
-            if abs(tgt-cur) >= MIN_CHANGE:
-                self.order_target_percent(data, tgt)
-
-def backtest():
-    price_w, mhi, ry_w = build_mhi()
+@lru_cache(maxsize=None)
+def _bt_classes():
+    """backtrader 类只在回测时才定义（避免导入期加载backtrader）"""
+    import backtrader as bt
+
+    class PandasData(bt.feeds.PandasData):
+        params = (("datetime", None), ("open",-1),("high",-1),("low",-1),("close",0),("volume",-1),("openinterest",-1))
+
+    class WeeklyRebal(bt.Strategy):
+        params = dict(mhi=None, ry=None)
+
+        def __init__(self):
+            self.mhi = self.p.mhi
+            self.ry = self.p.ry
+            self.recent_bins = []
+
+        def next(self):
+            dtc = self.data0.datetime.date(0)
+            if dtc.weekday() != 0:  # 周一再平衡
+                return
+            ref_date = dtc - dt.timedelta(days=3)  # 上周五
+            if ref_date not in self.mhi.index:
+                ref_date = self.mhi.index[self.mhi.index.get_loc(ref_date, method="pad")]
+            m = float(self.mhi.loc[ref_date])
+            bucket, target = pick_weights(m)
+            self.recent_bins.append(bucket); self.recent_bins = self.recent_bins[-CONFIRM_WEEKS:]
+            if len(self.recent_bins)<CONFIRM_WEEKS or len(set(self.recent_bins))>1:
+                return
+            target = apply_real_yield_tilt(target, self.ry, ref_date)
+
+            # 现金 = 1 - 三资产
+            w_spy, w_gld, w_btc = target["SPY"], target["GLD"], target["BTC"]
+            total = self.broker.getvalue()
+            for name in ["SPY","GLD","BTC"]:
+                data = [d for d in self.datas if d._name==name][0]
+                cur = self.getposition(data).size * data.close[0] / total if total>0 else 0.0
+                tgt = {"SPY":w_spy,"GLD":w_gld,"BTC":w_btc}[name]
+                if abs(tgt-cur) >= MIN_CHANGE:
+                    self.order_target_percent(data, tgt)
+
+    return PandasData, WeeklyRebal
+
+def __getattr__(name):
+    # 兼容旧代码里的 mhi_weekly.PandasData / mhi_weekly.WeeklyRebal
+    if name in ("PandasData", "WeeklyRebal"):
+        return dict(zip(("PandasData", "WeeklyRebal"), _bt_classes()))[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@profiling.timed("backtest")
+def backtest(data=None):
+    """data 可传入现成的 (price_w, mhi, ry_w)，否则现场构建"""
+    import backtrader as bt
+    PandasData, WeeklyRebal = _bt_classes()
+    price_w, mhi, ry_w = data if data is not None else build_mhi()
     cerebro = bt.Cerebro()
     cerebro.broker.setcash(100000); cerebro.broker.setcommission(commission=COMMISSION)
     for col in ["SPY","GLD","BTC"]:
@@ -218,7 +358,8 @@ def backtest():
     cerebro.addstrategy(WeeklyRebal, mhi=mhi, ry=ry_w)
     cerebro.addanalyzer(bt.analyzers.SharpeRatio_A, _name="sr", timeframe=bt.TimeFrame.Weeks, annualize=True)
     cerebro.addanalyzer(bt.analyzers.DrawDown, _name="dd")
-    res = cerebro.run()[0]
+    with profiling.span("backtest.cerebro_run", bars=len(price_w)):
+        res = cerebro.run()[0]
     print("\n=== Backtest Stats ===")
     print("Final portfolio value:", round(cerebro.broker.getvalue(),2))
     print("Sharpe Ratio (A):", res.analyzers.sr.get_analysis().get("sharperatio"))
@@ -226,16 +367,30 @@ def backtest():
     print("Max Drawdown %:", round(dd.drawdown,2) if dd else None)
 
 if __name__=="__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
     # 用法:
     # 1) 建议模式(输入当前仓位；百分比之和<=1，余下视作现金)
     #    python mhi_weekly.py advise 0.4 0.4 0.2
     #    顺序=SPY GLD BTC；如果不填，默认全现金
+    #    本地MHI状态未过期时直接读缓存（快路径）；加 --refresh 强制重新下载与计算
     # 2) 回测模式:
     #    python mhi_weekly.py backtest
-    if len(sys.argv)>=2 and sys.argv[1]=="advise":
-        vals = [float(x) for x in sys.argv[2:5]] if len(sys.argv)>=5 else [0.0,0.0,0.0]
+    # 3) 常驻服务模式（见 mhi_service.py）:
+    #    python mhi_weekly.py serve --port 8765
+    # 4) 盯盘模式（见 mhi_watch.py；数据有更新才重算，建议变化时输出事件）:
+    #    python mhi_weekly.py watch --interval 900
+    if len(sys.argv)>=2 and sys.argv[1]=="serve":
+        from mhi_service import serve
+        serve(sys.argv[2:])
+    elif len(sys.argv)>=2 and sys.argv[1]=="watch":
+        from mhi_watch import main as watch_main
+        watch_main(sys.argv[2:])
+    elif len(sys.argv)>=2 and sys.argv[1]=="advise":
+        args = [a for a in sys.argv[2:] if not a.startswith("--")]
+        vals = [float(x) for x in args[:3]] if len(args)>=3 else [0.0,0.0,0.0]
         cur = {"SPY":vals[0], "GLD":vals[1], "BTC":vals[2]}
         cur["CASH"] = max(0.0, 1.0 - sum(vals))
-        advise(cur)
+        state = None if "--refresh" in sys.argv else load_mhi_state()
+        advise(cur, state)
     else:
-        backtest()
\ No newline at end of file
+        backtest()
@@ -0,0 +1,159 @@
+# multi_timeframe.py
+# 多周期 MHI：同一份日线面板（价格 + FRED 日频序列，只取一次）分别按 日 / 周 / 月 采样后计算 MHI。
+# 各频率的重采样结果、分量与 MHI 都按频率记忆，重复取用不再重算；多周期综合信号只是把已有结果对齐后加权。
+# 滚动窗口用日历时间表示（z 分 1820 天 = 260 周，板块均线 280 天 = 40 周 ≈ 200 个交易日），各频率含义一致；
+# 窗口要被数据完整覆盖（该列第一条数据之后满一个窗口）才有值。周频结果与 mhi_weekly.compute_mhi 一致。
+# 注意：FRED 用日频最新修订值（FRED_POINT_IN_TIME 的时点数据只有周频，这里不适用）。
+#
+# 用法:
+#   python multi_timeframe.py                               # 各频率最新 MHI/分档、相关性、分档一致率、综合 MHI
+#   python multi_timeframe.py --freqs weekly,monthly --weights 2,1
+
+import time, argparse
+import numpy as np
+import pandas as pd
+import mhi_weekly as mw
+import data_provider
+import profiling
+from portfolio import bucket_codes, BUCKET_NAMES
+
+# 频率 -> 采样规则（None 为日频工作日）与相邻两期的最大间隔（判断窗口是否被完整覆盖）
+FREQUENCIES = {"daily": None, "weekly": "W-FRI", "monthly": "ME"}
+STEPS = {"daily": pd.Timedelta(days=1), "weekly": pd.Timedelta(days=7), "monthly": pd.Timedelta(days=31)}
+ZSCORE_WINDOW = pd.Timedelta(days=260 * 7)     # 5年
+BREADTH_WINDOW = pd.Timedelta(days=40 * 7)     # 约200个交易日
+FRED_SERIES = {"real_yield": "DFII10", "hy_oas": "BAMLH0A0HYM2"}
+
+def _covered(x, window, step):
+    """各列自第一条有效数据起满一个窗口（差一期以内）的位置为 True，形状同 x"""
+    first = np.atleast_1d(np.asarray(x.notna().idxmax(), dtype="datetime64[ns]"))
+    ok = x.index.values[:, None] >= first[None, :] + np.timedelta64(window - step)
+    return ok if x.ndim == 2 else ok[:, 0]
+
+@profiling.timed("zscore_calendar")
+def zscore_calendar(x, step, window=ZSCORE_WINDOW):
+    """日历窗口的 z 分（总体标准差，与 mhi_weekly.zscore 同口径）"""
+    r = x.rolling(window)
+    return ((x - r.mean()) / r.std(ddof=0)).where(_covered(x, window, step))
+
+@profiling.timed("breadth_calendar")
+def breadth_calendar(sector_f, step, window=BREADTH_WINDOW):
+    """日历窗口均线之上的板块占比（均线未覆盖满时按不在均线上计，与 compute_breadth 相同）"""
+    ma = sector_f.rolling(window).mean().where(_covered(sector_f, window, step))
+    return (sector_f > ma).astype(float).mean(axis=1).rename("breadth")
+
+def load_daily_fred(provider):
+    """真实利率 / 高收益利差的日频序列；没有 FRED 时为 (None, None)"""
+    if not provider.has_fred():
+        return None, None
+    if mw.FRED_POINT_IN_TIME:
+        print("[WARN] point-in-time FRED data is weekly only; multi-timeframe MHI uses the latest revisions")
+    try:
+        return tuple(provider.fred_series(sid).rename(name) for name, sid in FRED_SERIES.items())
+    except Exception as e:
+        print("[WARN] FRED unavailable:", e)
+        return None, None
+
+class Timeframes:
+    """一份日线面板 + 按频率记忆的重采样结果 / MHI 分量 / MHI"""
+    __slots__ = ("px", "ry", "oas", "sectors", "_frames", "_components")
+
+    def __init__(self, px, ry=None, oas=None, sectors=None):
+        self.px = px                  # 日频收盘价宽表（列为 yfinance 代码）
+        self.ry, self.oas = ry, oas   # FRED 日频序列（可为 None）
+        self.sectors = mw.SECTORS if sectors is None else list(sectors)
+        self._frames = {}
+        self._components = {}
+
+    @classmethod
+    @profiling.timed("timeframes.load")
+    def load(cls):
+        """取一次数：价格与 FRED 日频序列"""
+        provider = data_provider.get_provider()
+        sectors = provider.sectors(mw.SECTORS)
+        px = mw.dl_yf(list(mw.TICKERS_YF.values()) + sectors)
+        ry, oas = load_daily_fred(provider)
+        return cls(px, ry, oas, sectors)
+
+    def frame(self, freq):
+        """(价格, 真实利率, 高收益利差) 按 freq 采样，记忆"""
+        if freq not in self._frames:
+            rule = FREQUENCIES[freq]
+            with profiling.span("timeframes.resample", freq=freq, rows=len(self.px)):
+                self._frames[freq] = (mw.resample_last(self.px, rule),
+                                      *(None if s is None else mw.resample_last(s.to_frame(), rule)[s.name]
+                                        for s in (self.ry, self.oas)))
+        return self._frames[freq]
+
+    def components(self, freq):
+        """frenzy 分量（列同 mhi_weekly.mhi_components），记忆"""
+        if freq not in self._components:
+            px_f, _, oas_f = self.frame(freq)
+            step = STEPS[freq]
+            with profiling.span("timeframes.components", freq=freq, rows=len(px_f)):
+                parts = [(-zscore_calendar(px_f[mw.TICKERS_YF["VIX"]], step)).rename("frenzy_vix"),
+                         zscore_calendar(breadth_calendar(px_f[self.sectors], step), step).rename("frenzy_breadth")]
+                if mw.USE_HY_OAS_IN_MHI and oas_f is not None:
+                    parts.append((-zscore_calendar(oas_f, step)).rename("frenzy_hyoas"))
+                self._components[freq] = pd.concat(parts, axis=1).dropna()
+        return self._components[freq]
+
+    def mhi(self, freq):
+        """与 mhi_weekly.compute_mhi 相同的 (价格, MHI, 真实利率)，按 freq 采样"""
+        px_f, ry_f, _ = self.frame(freq)
+        mhi = self.components(freq).mean(axis=1).rename("MHI")
+        price = px_f[[mw.TICKERS_YF[a] for a in ("SPY", "GLD", "BTC")]].rename(
+            columns={mw.TICKERS_YF[a]: a for a in ("SPY", "GLD", "BTC")})
+        return price.loc[mhi.index], mhi, ry_f
+
+    @profiling.timed("timeframes.combined")
+    def combined(self, freqs=tuple(FREQUENCIES), on="weekly", weights=None, low=mw.LOW_THRESHOLD,
+                 high=mw.HIGH_THRESHOLD):
+        """各频率 MHI 按时点对齐到 on 频率的日期（只用当时已收盘的那一期），列 mhi_<freq>；
+        另有 combined（按 weights 加权、忽略缺失的平均）与 agree（各频率分档相同）"""
+        dates = self.mhi(on)[1].index
+        df = pd.DataFrame({f"mhi_{f}": self.mhi(f)[1].reindex(dates, method="ffill") for f in freqs})
+        w = np.ones(len(freqs)) if weights is None else np.asarray(weights, dtype=float)
+        valid = df.notna().to_numpy()
+        df["combined"] = (np.where(valid, df.to_numpy(), 0) @ w) / np.where(valid, w, 0).sum(axis=1)
+        codes = bucket_codes(df[[f"mhi_{f}" for f in freqs]].to_numpy().T, low, high)
+        df["agree"] = valid.all(axis=1) & (codes == codes[:1]).all(axis=0)
+        return df
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="MHI at daily, weekly and monthly frequency from one daily panel")
+    p.add_argument("--freqs", default=",".join(FREQUENCIES))
+    p.add_argument("--weights", default=None, help="comma-separated weights for the combined MHI")
+    p.add_argument("--on", default="weekly", choices=sorted(FREQUENCIES), help="dates of the combined signal")
+    args = p.parse_args(argv)
+    freqs = args.freqs.split(",")
+    weights = None if args.weights is None else [float(x) for x in args.weights.split(",")]
+
+    tf = Timeframes.load()
+    print(f"=== Multi-timeframe MHI ({len(tf.px)} daily rows, fetched once) ===\n")
+    print("Freq     | Periods | Last Date  |  MHI  | Bucket  | Build")
+    for f in freqs:
+        t0 = time.time()
+        _, mhi, _ = tf.mhi(f)
+        built = time.time() - t0
+        code = int(bucket_codes(float(mhi.iloc[-1])))
+        print(f"{f:8s} | {len(mhi):7d} | {mhi.index[-1].date()} | {mhi.iloc[-1]:+5.2f} | "
+              f"{BUCKET_NAMES[code]:7s} | {built * 1000:.0f} ms")
+
+    t0 = time.time()
+    df = tf.combined(freqs, args.on, weights)
+    elapsed = time.time() - t0
+    cols = [f"mhi_{f}" for f in freqs]
+    print(f"\nCorrelation on {args.on} dates:")
+    print(df[cols].corr().round(2).to_string())
+    both = df[cols].notna().all(axis=1)
+    print(f"\nBucket agreement across {', '.join(freqs)}: {df['agree'][both].mean():.1%} of {int(both.sum())} periods")
+    last = df.iloc[-1]
+    code = int(bucket_codes(float(last["combined"])))
+    print(f"Combined MHI {df.index[-1].date()}: {last['combined']:+.2f} ({BUCKET_NAMES[code]}), "
+          f"computed in {elapsed * 1000:.1f} ms from memoized frames")
+    return df
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,96 @@
+# multi_universe.py
+# 多区域 MHI：美国 / 欧洲 / 日本各用自己的波动率指数与板块ETF，一次构建出 MHI 面板（列 = 区域）
+# 共享的部分只做一次：所有代码合并成一次下载（与 FRED 拉取并发进行）、周五采样的日历对齐、
+# HY 利差 z 分；滚动核（40周均线、260周 z 分）在合并后的宽表上一次算完所有区域的列。
+# 区域越多，固定开销摊得越薄——总耗时随区域数亚线性增长。
+# 美国区域的结果与 mhi_weekly.compute_mhi 完全一致。
+#
+# 用法:
+#   python multi_universe.py                  # 各区域最新 MHI/分档 + 区域间相关性
+#   python multi_universe.py --universes US,EU
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import mhi_weekly as mw
+import data_provider
+import profiling
+
+# 每个区域：波动率指数 + 板块ETF（yfinance 代码）
+UNIVERSES = {
+    "US": {"vol": mw.TICKERS_YF["VIX"], "sectors": mw.SECTORS},
+    # iShares STOXX Europe 600 行业ETF（Xetra）+ VSTOXX
+    "EU": {"vol": "^V2TX", "sectors": ["EXV1.DE", "EXV2.DE", "EXV3.DE", "EXV4.DE", "EXV5.DE", "EXV6.DE",
+                                       "EXV7.DE", "EXV8.DE", "EXH1.DE", "EXH3.DE", "EXH4.DE", "EXH9.DE"]},
+    # NEXT FUNDS TOPIX-17 行业ETF + 日经平均波动率指数
+    "JP": {"vol": "^JNIV", "sectors": [f"{c}.T" for c in range(1617, 1634)]},
+}
+
+def _universe_tickers(universes, provider):
+    """各区域的 (波动率代码, 板块列表)；美国板块走 provider.sectors（合成后端可加宽）"""
+    out = {}
+    for name, u in universes.items():
+        sectors = provider.sectors(u["sectors"]) if name == "US" else list(u["sectors"])
+        out[name] = (u["vol"], sectors)
+    return out
+
+@profiling.timed("compute_mhi_panel")
+def compute_mhi_panel(px, universes, oas_w=None):
+    """日频收盘价宽表（含所有区域的代码）-> MHI 面板 DataFrame（列 = 区域）；纯计算
+    universes: {区域: (波动率代码, 板块列表)}"""
+    px_w = mw.weekly_last(px)                                   # 日历对齐只做一次
+    vols = [v for v, _ in universes.values()]
+    sector_cols = list(dict.fromkeys(c for _, secs in universes.values() for c in secs))
+
+    z_vol = mw.zscore(px_w[vols])                               # 所有波动率指数一次滚动
+    sector_w = px_w[sector_cols]
+    above = (sector_w > sector_w.rolling(40).mean()).astype(float)   # 所有板块一次滚动
+    breadth = pd.DataFrame({name: above[secs].mean(axis=1) for name, (_, secs) in universes.items()})
+    z_breadth = mw.zscore(breadth)
+    z_oas = -mw.zscore(oas_w) if (mw.USE_HY_OAS_IN_MHI and oas_w is not None) else None   # 各区域共用
+
+    panel = {}
+    for name, (vol, _) in universes.items():
+        parts = [(-z_vol[vol]).rename("frenzy_vix"), z_breadth[name].rename("frenzy_breadth")]
+        if z_oas is not None:
+            parts.append(z_oas.rename("frenzy_hyoas"))
+        panel[name] = pd.concat(parts, axis=1).dropna().mean(axis=1)
+    return pd.DataFrame(panel)
+
+@profiling.timed("build_mhi_panel")
+def build_mhi_panel(universes=None):
+    """并发取数（价格一次合并下载 ∥ FRED）后计算面板；返回 (价格周线 SPY/GLD/BTC, MHI 面板, 真实利率周线)"""
+    universes = universes or UNIVERSES
+    provider = data_provider.get_provider()
+    tickers = _universe_tickers(universes, provider)
+    assets = [mw.TICKERS_YF[a] for a in ("SPY", "GLD", "BTC")]
+    cols = list(dict.fromkeys(assets + [c for v, secs in tickers.values() for c in [v] + secs]))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        fut_px = pool.submit(mw.dl_yf, cols)
+        fut_fred = pool.submit(mw.load_fred_series)
+        px, (ry_w, oas_w) = fut_px.result(), fut_fred.result()
+    panel = compute_mhi_panel(px, tickers, oas_w)
+    price_w = mw.weekly_last(px[assets]).rename(columns={mw.TICKERS_YF[a]: a for a in ("SPY", "GLD", "BTC")})
+    return price_w.reindex(panel.index), panel, ry_w
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="MHI for several regional universes")
+    p.add_argument("--universes", default=",".join(UNIVERSES))
+    args = p.parse_args(argv)
+    universes = {u: UNIVERSES[u] for u in args.universes.split(",")}
+
+    _, panel, _ = build_mhi_panel(universes)
+    print(f"=== Multi-Universe MHI ({len(panel)} weeks) ===\n")
+    print("Universe | Last Date  |  MHI  | Bucket")
+    for name in panel.columns:
+        s = panel[name].dropna()
+        bucket, _ = mw.pick_weights(float(s.iloc[-1]))
+        print(f"{name:8s} | {s.index[-1].date()} | {s.iloc[-1]:+5.2f} | {bucket}")
+    if panel.shape[1] > 1:
+        print("\nCorrelation of weekly MHI:")
+        print(panel.corr().round(2).to_string())
+    return panel
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,424 @@
+# perf_bench.py
+# 性能基准：导入耗时剖析 + advise 缓存快路径的冷启动耗时
+# + 离线合成数据（data_provider 合成后端）上的计算基准（build_mhi / compute_breadth / zscore / 模拟器 / 扫参 / advise / backtest），
+#   数据长度 10~100 年、宽度 3~3000 个板块代码可配；每次运行追加一行到 bench_history.jsonl，跨提交对比回归。
+#
+# 用法:
+#   python perf_bench.py                          # 默认矩阵: 10y/100y × 3/300 代码
+#   python perf_bench.py --years 10,50,100 --tickers 3,300,3000 --repeat 3
+#   python perf_bench.py --full                   # 默认矩阵再加 3000 代码
+#   python perf_bench.py --compare                # 与历史中上一次运行逐项对比
+#   python perf_bench.py --startup-only           # 只跑导入剖析与 advise 快路径
+#   python perf_bench.py --compact-check          # 紧凑模式（float32）对 float64 的精度与内存对比
+#   python perf_bench.py --drift-check            # 漂移持仓模式：信号周单一资产暴涨时的成交口径
+
+import os, sys, json, time, tempfile, statistics, subprocess, argparse, platform, tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["pandas", "numpy", "yfinance", "backtrader", "dotenv", "fredapi"]
+HISTORY_PATH = os.getenv("PERF_HISTORY_PATH", os.path.join(HERE, "bench_history.jsonl"))
+DEFAULT_YEARS = (10, 100)
+DEFAULT_TICKERS = (3, 300)
+FULL_TICKERS = (3, 300, 3000)
+REGRESSION_RATIO = 1.25      # 比上次慢 25% 以上标记为回归
+REGRESSION_MIN_MS = 2.0      # 低于此耗时的用例受计时噪声影响大，不参与回归判定
+SWEEP_LOWS = [-1.2, -1.3, -1.4, -1.5, -1.6, -1.7, -1.8, -1.9, -2.0, -2.1, -2.2]
+SWEEP_HIGHS = [1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9, 2.0, 2.1, 2.2]
+BATCH_ACCOUNTS = 100_000
+
+def _run(code_or_args, env=None):
+    args = [sys.executable] + (["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args)
+    return subprocess.run(args, cwd=HERE, env=env, capture_output=True, text=True)
+
+def bench_import_time(module="mhi_weekly", repeat=5, top=8):
+    """用 -X importtime 剖析导入耗时，并检查重依赖是否被提前加载"""
+    totals, last = [], None
+    for _ in range(repeat):
+        proc = _run(["-X", "importtime", "-c", f"import {module}"])
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            self_us, cum_us, name = line.replace("import time:", "").split("|")
+            rows.append((name.strip(), int(self_us), int(cum_us)))
+        total = next((cum for name, _, cum in rows if name == module), 0)
+        totals.append(total / 1000)
+        last = rows
+    probe = _run(f"import {module}, sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    loaded = [m for m in probe.stdout.strip().split(",") if m]
+    slowest = sorted(last or [], key=lambda r: r[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "import_ms_median": statistics.median(totals),
+        "import_ms_min": min(totals),
+        "heavy_modules_loaded": loaded,
+        "slowest_self_ms": [(name, us / 1000) for name, us, _ in slowest],
+    }
+
+def _synthetic_state(path):
+    """写一个合成的MHI状态文件（不需要网络/pandas）"""
+    today = time.time()
+    state = {
+        "version": 1,
+        "source": os.getenv("MHI_DATA_SOURCE", "live"),
+        "built_at": today,
+        "ref_date": time.strftime("%Y-%m-%d", time.localtime(today)),
+        "mhi_dates": [time.strftime("%Y-%m-%d", time.localtime(today - 7 * 86400 * k)) for k in range(7, -1, -1)],
+        "mhi": [-1.9, -1.8, -2.0, -1.85, -1.9, -2.1, -1.95, -2.05],
+        "ry_delta": -0.25,
+    }
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+def bench_advise_fast_path(repeat=7):
+    """`python mhi_weekly.py advise ...` 命中本地状态时的端到端墙钟耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mhi_state.json")
+        _synthetic_state(path)
+        env = dict(os.environ, MHI_STATE_PATH=path)
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            proc = _run(["mhi_weekly.py", "advise", "0.4", "0.4", "0.2"], env=env)
+            times.append((time.perf_counter() - t0) * 1000)
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr)
+        baseline = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            _run("pass")
+            baseline.append((time.perf_counter() - t0) * 1000)
+    return {
+        "advise_cached_ms_median": statistics.median(times),
+        "advise_cached_ms_max": max(times),
+        "python_startup_ms_median": statistics.median(baseline),
+    }
+
+# ---------- 合成数据（确定性，离线） ----------
+SYNTH_END = "2024-12-31"     # 固定结束日期，历史记录里的各次运行数据一致
+
+def synthetic_market(years, n_tickers, seed=0):
+    """data_provider 合成后端：日频面板（SPY/GLD/BTC/VIX + n_tickers 个板块代码）与 FRED 周频序列"""
+    import mhi_weekly as mw
+    from data_provider import SyntheticProvider
+    provider = SyntheticProvider(seed=seed, years=years, end=SYNTH_END,
+                                 extra_sectors=max(0, n_tickers - len(mw.SECTORS)))
+    sectors = provider.sectors(mw.SECTORS)[:n_tickers]
+    px = provider.prices(list(mw.TICKERS_YF.values()) + sectors, None)
+    ry_w = mw.weekly_last(provider.fred_series("DFII10").to_frame("real_yield"))["real_yield"]
+    oas_w = mw.weekly_last(provider.fred_series("BAMLH0A0HYM2").to_frame("hy_oas"))["hy_oas"]
+    return px, ry_w, oas_w, sectors
+
+# ---------- 计时与内存 ----------
+def measure(fn, repeat=3, memory=True):
+    """最好/中位墙钟（ms）+ 单独一次 tracemalloc 峰值（MB，含 NumPy 分配）"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    out = {"best_ms": min(times), "median_ms": statistics.median(times)}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            out["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return out
+
+def bench_data_cases(years, n_tickers, repeat=3, memory=True):
+    """依赖宽度的用例：合成面板上的 zscore / compute_breadth / build_mhi"""
+    import mhi_weekly as mw
+    px, ry_w, oas_w, sectors = synthetic_market(years, n_tickers)
+    sector_w = mw.weekly_last(px[sectors])
+    breadth = mw.compute_breadth(sector_w)
+    cases = {
+        "zscore": lambda: mw.zscore(sector_w),
+        "compute_breadth": lambda: mw.compute_breadth(sector_w),
+        "zscore_breadth": lambda: mw.zscore(breadth),
+        "build_mhi": lambda: mw.compute_mhi(px, ry_w, oas_w, sectors),
+    }
+    rows = [{"case": name, "years": years, "tickers": n_tickers, **measure(fn, repeat, memory)}
+            for name, fn in cases.items()]
+    return rows, mw.compute_mhi(px, ry_w, oas_w, sectors)
+
+def bench_strategy_cases(years, data, repeat=3, memory=True):
+    """与宽度无关的用例：各模拟器、扫参、advise、backtest（输入为 build_mhi 的结果）"""
+    import numpy as np
+    import mhi_weekly as mw
+    import batch_advise
+    import threshold_optimization, advanced_threshold_optimization, benchmark_analysis
+    from simulator import prepare_inputs, simulate, simulate_grid, extend_grid
+    from portfolio import TOTAL_COSTS, COMMISSION_SPREAD_COSTS, MHI_BANDS
+    from result_cache import cached_sweep
+
+    price_w, mhi, ry_w = data
+    inputs = prepare_inputs(price_w, mhi, ry_w)
+    lows, highs = np.meshgrid(SWEEP_LOWS, SWEEP_HIGHS, indexing="ij")
+    lows, highs = lows.ravel(), highs.ravel()
+    head = simulate_grid(inputs.prefix(len(inputs) - 1), lows, highs, TOTAL_COSTS)
+    state = mw.mhi_state(mhi, ry_w)
+    W = np.random.default_rng(0).dirichlet(np.ones(4), BATCH_ACCOUNTS)
+    cache_dir = tempfile.mkdtemp(prefix="perf_sweep_")
+    state_path = os.path.join(tempfile.mkdtemp(prefix="perf_state_"), "mhi_state.json")
+    weights = {"SPY": 0.4, "GLD": 0.4, "BTC": 0.2, "CASH": 0.0}
+
+    def cold_state():
+        """冷路径：从 MHI 序列建状态、写入状态文件再读回（与 CLI 没有内存缓存时相同）"""
+        mw.save_mhi_state(mw.mhi_state(mhi, ry_w), state_path)
+        return mw.load_mhi_state(state_path, max_age_hours=None)
+
+    def sweep_cold():
+        for f in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, f))
+        cached_sweep(inputs, lows, highs, COMMISSION_SPREAD_COSTS, cache_dir=cache_dir)
+
+    cases = {
+        "prepare_inputs": lambda: prepare_inputs(price_w, mhi, ry_w),
+        "simulate": lambda: simulate(inputs, mw.LOW_THRESHOLD, mw.HIGH_THRESHOLD, TOTAL_COSTS),
+        "sim_threshold_optimization": lambda: threshold_optimization.simulate_strategy_with_thresholds(-1.75, 1.75, inputs),
+        "sim_advanced_with_costs": lambda: advanced_threshold_optimization.simulate_strategy_with_costs(-1.75, 1.75, inputs),
+        "sim_benchmark_analysis": lambda: benchmark_analysis.simulate_strategy(inputs),
+        "sweep_grid_121": lambda: simulate_grid(inputs, lows, highs, TOTAL_COSTS),
+        "sweep_grid_121_drift": lambda: simulate_grid(inputs, lows, highs, TOTAL_COSTS, drift=MHI_BANDS),
+        "sweep_extend_1w": lambda: extend_grid(inputs, head.state, TOTAL_COSTS),
+        "sweep_cached_cold": sweep_cold,
+        "sweep_cached_warm": lambda: cached_sweep(inputs, lows, highs, COMMISSION_SPREAD_COSTS, cache_dir=cache_dir),
+        "advise_cold": lambda: mw.compute_advice(weights, cold_state()),
+        "advise_warm": lambda: mw.compute_advice(weights, state),            # 状态已在内存里
+        "batch_advise_100k_cold": lambda: batch_advise.batch_advice(W, cold_state()),
+        "batch_advise_100k_warm": lambda: batch_advise.batch_advice(W, state),
+    }
+    try:
+        import backtrader  # noqa: F401
+        cases["backtest"] = lambda: _quiet(mw.backtest, (price_w, mhi, ry_w))
+    except ImportError:
+        print("  (backtrader not installed, skipping backtest)")
+
+    rows = []
+    for name, fn in cases.items():
+        if name == "sweep_cached_warm":
+            sweep_cold()   # 保证热缓存存在
+        rows.append({"case": name, "years": years, "tickers": None, **measure(fn, repeat, memory)})
+    for f in os.listdir(cache_dir):
+        os.remove(os.path.join(cache_dir, f))
+    os.rmdir(cache_dir)
+    os.remove(state_path)
+    os.rmdir(os.path.dirname(state_path))
+    return rows
+
+def _quiet(fn, *args):
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+# ---------- 紧凑模式：精度与内存 ----------
+def compact_check(data=None, step=0.05, chunk_points=2048):
+    """同一段历史分别用 float64 与紧凑模式（float32 张量、uint16 周偏移）跑阈值网格：
+    比较各指标的最大绝对误差与调仓次数是否一致，并测量一块网格模拟的内存峰值"""
+    import numpy as np
+    import mhi_weekly as mw
+    from simulator import prepare_inputs, simulate_grid, simulate_metrics
+    from portfolio import TOTAL_COSTS
+    from sweep_runner import threshold_axis
+    data = data or mw.build_mhi()
+    full = prepare_inputs(*data, compact=False)
+    small = full.compact()
+    lows, highs = np.meshgrid(threshold_axis(-3.0, -0.5, step), threshold_axis(0.5, 3.0, step), indexing="ij")
+    lows, highs = lows.ravel(), highs.ravel()
+    ref = simulate_metrics(full, lows, highs, TOTAL_COSTS, chunk_points=chunk_points)
+    cmp_ = simulate_metrics(small, lows, highs, TOTAL_COSTS, chunk_points=chunk_points)
+    errors = {k: float(np.abs(ref[k] - cmp_[k]).max()) for k in ref}
+    mismatched = int((ref["rebalance_count"] != cmp_["rebalance_count"]).sum())
+    n = min(chunk_points, len(lows))
+    mem = {name: measure(lambda inp=inp: simulate_grid(inp, lows[:n], highs[:n], TOTAL_COSTS), repeat=1)
+           for name, inp in (("float64", full), ("compact", small))}
+    return {"weeks": len(full), "points": len(lows), "chunk_points": n, "max_abs_error": errors,
+            "rebalance_count_mismatches": mismatched,
+            "inputs_bytes": {"float64": full.nbytes(), "compact": small.nbytes()},
+            "chunk_peak_mb": {k: v["peak_mb"] for k, v in mem.items()},
+            "chunk_ms": {k: v["best_ms"] for k, v in mem.items()}}
+
+def print_compact_check(res):
+    print(f"History: {res['weeks']} weeks, grid {res['points']} points, chunk {res['chunk_points']} points")
+    print("Max abs error vs float64:")
+    for k, v in res["max_abs_error"].items():
+        print(f"  {k:16s} {v:.2e}")
+    print(f"Rebalance-count mismatches: {res['rebalance_count_mismatches']}")
+    ib, pk, ms = res["inputs_bytes"], res["chunk_peak_mb"], res["chunk_ms"]
+    print(f"SimInputs: {ib['float64'] / 1024:.1f} KB -> {ib['compact'] / 1024:.1f} KB")
+    print(f"Chunk peak memory: {pk['float64']:.1f} MB -> {pk['compact']:.1f} MB ({1 - pk['compact'] / pk['float64']:.0%} less)")
+    print(f"Chunk time: {ms['float64']:.1f} ms -> {ms['compact']:.1f} ms")
+
+# ---------- 漂移持仓：信号周的成交口径 ----------
+def drift_check(jump=1.0):
+    """玩具行情：信号周 BTC 上涨 jump、其余不动。成交应以周末漂移后的权重为起点：
+    BTC 的成本按 |目标 - 漂移后权重| 计，未越过 MIN_CHANGE 的 GLD 保持漂移后的权重（不被免费拉回）"""
+    import numpy as np
+    from simulator import _drift
+    from portfolio import DEFAULT_ASSETS as assets, MHI_BANDS, TOTAL_COSTS
+    init = assets.vector({"SPY": 0.35, "GLD": 0.45, "BTC": 0.10, "CASH": 0.10})
+    target = assets.vector({"SPY": 0.45, "GLD": 0.40, "BTC": 0.05, "CASH": 0.10})
+    returns = np.zeros((3, len(assets)))
+    returns[0, assets.pos["BTC"]] = jump
+    signal = np.array([[True, False, False]])
+    held, traded, costs, after = _drift(returns, signal, np.broadcast_to(target, (1, 3, len(assets))),
+                                        init[None], MHI_BANDS, TOTAL_COSTS)
+    drifted = init * (1 + returns[0])
+    drifted /= drifted.sum()
+    expect = drifted.copy()
+    for a in ("SPY", "BTC"):                                   # 偏离 ≥ MIN_CHANGE 的资产成交到目标
+        expect[assets.pos[a]] = target[assets.pos[a]]
+    expect[-1] = 1 - expect[:-1].sum()
+    return {"drifted": assets.to_dict(drifted), "held_after": assets.to_dict(held[0, 1]),
+            "expected_after": assets.to_dict(expect), "cost": float(costs[0, 0]),
+            "expected_cost": float(TOTAL_COSTS.cost(drifted, expect)), "traded": bool(traded[0, 0]),
+            "ok": bool(traded[0, 0] and np.allclose(held[0, 1], expect) and np.allclose(after[0], expect)
+                       and np.isclose(costs[0, 0], TOTAL_COSTS.cost(drifted, expect)))}
+
+def print_drift_check(res):
+    fmt = lambda d: ", ".join(f"{k} {v:.4f}" for k, v in d.items())
+    print(f"Drifted before trade: {fmt(res['drifted'])}")
+    print(f"Held after trade    : {fmt(res['held_after'])}")
+    print(f"Expected            : {fmt(res['expected_after'])}")
+    print(f"Trade cost          : {res['cost']:.6f} (expected {res['expected_cost']:.6f})")
+    print("Drift check: " + ("OK" if res["ok"] else "FAILED"))
+
+# ---------- 历史记录 ----------
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def run_metadata():
+    import numpy as np
+    import pandas as pd
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "commit": _git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()}-{platform.machine()}",
+        "cpus": os.cpu_count(),
+    }
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(record, path=HISTORY_PATH):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+def _case_key(row):
+    return (row["case"], row["years"], row["tickers"])
+
+def compare(rows, history):
+    """每个用例与历史中最近一次同规模的结果对比（best_ms 比值）"""
+    prev = {}
+    for rec in history:
+        for r in rec.get("cases", []):
+            prev[_case_key(r)] = dict(r, commit=rec.get("commit"))
+    print(f"\n=== Compared with previous runs ({len(history)} in history) ===")
+    print(f"{'case':28s} {'years':>5s} {'tickers':>7s} {'before':>10s} {'after':>10s} {'ratio':>6s}  commit")
+    regressions = 0
+    for r in rows:
+        p = prev.get(_case_key(r))
+        if p is None:
+            continue
+        ratio = r["best_ms"] / p["best_ms"] if p["best_ms"] > 0 else float("inf")
+        flag = "  REGRESSION" if ratio > REGRESSION_RATIO and r["best_ms"] >= REGRESSION_MIN_MS else ""
+        regressions += bool(flag)
+        print(f"{r['case']:28s} {r['years']:5d} {str(r['tickers'] or '-'):>7s} {p['best_ms']:9.1f}ms {r['best_ms']:9.1f}ms {ratio:6.2f}  {p['commit']}{flag}")
+    print(f"{regressions} regression(s) beyond {REGRESSION_RATIO:.2f}x")
+    return regressions
+
+def print_rows(rows):
+    print(f"{'case':28s} {'years':>5s} {'tickers':>7s} {'best':>10s} {'median':>10s} {'peak':>9s}")
+    for r in rows:
+        peak = f"{r['peak_mb']:7.1f}MB" if "peak_mb" in r else "      -"
+        print(f"{r['case']:28s} {r['years']:5d} {str(r['tickers'] or '-'):>7s} {r['best_ms']:9.1f}ms {r['median_ms']:9.1f}ms {peak}")
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="MHI performance benchmarks")
+    p.add_argument("--years", type=_int_list, default=list(DEFAULT_YEARS))
+    p.add_argument("--tickers", type=_int_list, default=None)
+    p.add_argument("--full", action="store_true", help="include the 3000-ticker width")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    p.add_argument("--startup-only", action="store_true")
+    p.add_argument("--no-history", action="store_true")
+    p.add_argument("--compare", action="store_true")
+    p.add_argument("--history", default=HISTORY_PATH)
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--compact-check", action="store_true",
+                   help="compare compact (float32) simulation against float64 on the current history and exit")
+    p.add_argument("--drift-check", action="store_true",
+                   help="check that drift-mode trades start from the drifted weights and exit")
+    args = p.parse_args(argv)
+    if args.drift_check:
+        print("=== Drift Mode Check (single-asset jump in a signal week) ===")
+        res = drift_check()
+        print_drift_check(res)
+        if not res["ok"]:
+            sys.exit(1)
+        return res
+    if args.compact_check:
+        print("=== Compact Mode Check (float32 vs float64) ===")
+        res = compact_check()
+        print_compact_check(res)
+        if args.json:
+            print(json.dumps(res, indent=2))
+        return res
+    tickers = args.tickers or list(FULL_TICKERS if args.full else DEFAULT_TICKERS)
+
+    print("=== Import-time Profile ===")
+    imp = bench_import_time()
+    print(f"import mhi_weekly: {imp['import_ms_median']:.1f} ms (median), {imp['import_ms_min']:.1f} ms (min)")
+    print(f"Heavy modules loaded at import: {imp['heavy_modules_loaded'] or 'none'}")
+    print("Slowest modules (self time):")
+    for name, ms in imp["slowest_self_ms"]:
+        print(f"  {name:30s} {ms:7.2f} ms")
+
+    print("\n=== advise Fast Path (cached MHI state) ===")
+    fast = bench_advise_fast_path()
+    print(f"advise (cached): {fast['advise_cached_ms_median']:.1f} ms median, {fast['advise_cached_ms_max']:.1f} ms max")
+    print(f"python startup : {fast['python_startup_ms_median']:.1f} ms median")
+
+    record = {"import": imp, "advise_fast_path": fast, "cases": []}
+    if not args.startup_only:
+        rows = []
+        for years in args.years:
+            for i, n in enumerate(tickers):
+                print(f"\n=== Synthetic data: {years}y × {n} tickers ===")
+                data_rows, data = bench_data_cases(years, n, args.repeat, not args.no_memory)
+                rows += data_rows
+                print_rows(data_rows)
+                if i == 0:   # 策略层只依赖 SPY/GLD/BTC 与 MHI，与宽度无关，每个长度测一次
+                    strat_rows = bench_strategy_cases(years, data, args.repeat, not args.no_memory)
+                    rows += strat_rows
+                    print_rows(strat_rows)
+        record["cases"] = rows
+
+    record.update(run_metadata())
+    history = load_history(args.history)
+    if args.compare and history:
+        compare(record["cases"], history)
+    if not args.no_history:
+        append_history(record, args.history)
+        print(f"\nAppended to {args.history}")
+    if args.json:
+        print(json.dumps(record, indent=2))
+    return record
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# portfolio.py
+# 紧凑的组合表示：资产索引 + NumPy 权重向量/矩阵，替代各脚本里硬编码的 {"SPY":..,"GLD":..,"BTC":..,"CASH":..}
+# 资产数可以是 3 个，也可以是 20~50 个 sleeve；热循环里只做数组运算，不按资产名逐个取值。
+
+import numpy as np
+import mhi_weekly as mw
+
+CASH = "CASH"
+
+# 分档编码（int8）：LOW / NEUTRAL / HIGH
+LOW, NEUTRAL, HIGH = 0, 1, 2
+BUCKET_NAMES = ("LOW", "NEUTRAL", "HIGH")
+
+class AssetIndex:
+    """资产名 <-> 列位置；CASH 永远放在最后一列"""
+    __slots__ = ("names", "pos")
+
+    def __init__(self, names):
+        names = [n for n in names if n != CASH] + [CASH]
+        self.names = tuple(names)
+        self.pos = {n: i for i, n in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return name in self.pos
+
+    def __repr__(self):
+        return f"AssetIndex({list(self.names)})"
+
+    @property
+    def risky(self):
+        return self.names[:-1]
+
+    def vector(self, mapping, default=0.0):
+        """dict -> 权重向量（缺失资产记为default）"""
+        return np.array([mapping.get(n, default) for n in self.names], dtype=float)
+
+    def to_dict(self, vec):
+        return {n: float(v) for n, v in zip(self.names, vec)}
+
+DEFAULT_ASSETS = AssetIndex(["SPY", "GLD", "BTC", CASH])
+
+def normalize_target(vec, cash_max=None):
+    """现金上限 + 风险资产按比例归一（与 mhi_weekly.pick_weights 同口径），支持批量（最后一维为资产）"""
+    cash_max = mw.CASH_MAX if cash_max is None else cash_max
+    out = np.array(vec, dtype=float, copy=True)
+    out[..., -1] = np.minimum(out[..., -1], cash_max)
+    s = out[..., :-1].sum(axis=-1, keepdims=True)
+    scale = np.divide(1 - out[..., -1:], s, out=np.ones_like(s), where=s > 0)
+    out[..., :-1] = np.maximum(0.0, out[..., :-1] * scale)
+    return out
+
+class WeightTable:
+    """每个分档一行目标权重：(3 × N) 矩阵，构造时已做现金上限与归一"""
+    __slots__ = ("assets", "matrix")
+
+    def __init__(self, assets, matrix):
+        self.assets = assets
+        self.matrix = np.asarray(matrix, dtype=float)
+
+    @classmethod
+    def from_dicts(cls, low, neutral, high, assets=None, cash_max=None):
+        assets = assets or AssetIndex(list(neutral))
+        raw = np.vstack([assets.vector(low), assets.vector(neutral), assets.vector(high)])
+        return cls(assets, normalize_target(raw, cash_max))
+
+    def row(self, bucket_code):
+        return self.matrix[bucket_code]
+
+    def row_dict(self, bucket_code):
+        return self.assets.to_dict(self.matrix[bucket_code])
+
+def default_table(assets=None):
+    """mhi_weekly 里三档权重对应的表"""
+    return WeightTable.from_dicts(mw.LOW_MHI_WEI, mw.BASE_WEIGHTS, mw.HIGH_MHI_WEI, assets or DEFAULT_ASSETS)
+
+def bucket_codes(mhi, low=mw.LOW_THRESHOLD, high=mw.HIGH_THRESHOLD):
+    """MHI -> 分档编码；low/high 可以是数组（广播得到 grid × T）"""
+    mhi = np.asarray(mhi, dtype=float)
+    low = np.asarray(low, dtype=float)[..., None] if np.ndim(low) else low
+    high = np.asarray(high, dtype=float)[..., None] if np.ndim(high) else high
+    return np.where(mhi <= low, np.int8(LOW), np.where(mhi >= high, np.int8(HIGH), np.int8(NEUTRAL)))
+
+def pick_weights_array(mhi, low=mw.LOW_THRESHOLD, high=mw.HIGH_THRESHOLD, table=None):
+    """向量化的 pick_weights：返回 (分档编码, 目标权重[..., N])"""
+    table = table or default_table()
+    codes = bucket_codes(mhi, low, high)
+    return codes, table.matrix[codes]
+
+def apply_real_yield_tilt_array(targets, ry_delta, assets=None):
+    """向量化的真实利率拨杆：ry_delta[..., T] 与 targets[..., T, N] 对齐；NaN 表示不拨"""
+    assets = assets or DEFAULT_ASSETS
+    if not mw.USE_REAL_YIELD_TILT or "GLD" not in assets or "SPY" not in assets:
+        return targets
+    g, s = assets.pos["GLD"], assets.pos["SPY"]
+    out = np.array(targets, dtype=np.result_type(targets, np.float32), copy=True)   # 保留 float32（紧凑模式）
+    with np.errstate(invalid="ignore"):
+        down = np.asarray(ry_delta) <= -0.20   # 真实利率下行 -> 金+10%、股-10%
+        up = np.asarray(ry_delta) >= 0.20      # 上行 -> 股+10%、金-10%
+    out[..., g] = np.where(down, np.minimum(1.0, out[..., g] + 0.10), np.where(up, np.maximum(0.0, out[..., g] - 0.10), out[..., g]))
+    out[..., s] = np.where(down, np.maximum(0.0, out[..., s] - 0.10), np.where(up, np.minimum(1.0, out[..., s] + 0.10), out[..., s]))
+    return out
+
+class CostModel:
+    """按资产的单边成本率；成本 = |Δw| · rates（最后一维为资产，支持批量）"""
+    __slots__ = ("name", "assets", "rates")
+
+    def __init__(self, name, assets, rates):
+        self.name = name
+        self.assets = assets
+        self.rates = np.asarray(rates, dtype=float)
+
+    @classmethod
+    def from_dict(cls, name, rates, assets=None):
+        assets = assets or DEFAULT_ASSETS
+        return cls(name, assets, assets.vector(rates))
+
+    def cost(self, old, new):
+        diff = np.abs(np.asarray(new) - np.asarray(old))
+        return diff @ self.rates.astype(np.result_type(diff, np.float32), copy=False)
+
+    def __repr__(self):
+        return f"CostModel({self.name!r}, {self.assets.to_dict(self.rates)})"
+
+# 各脚本沿用的成本口径
+TOTAL_TRADING_COSTS = {"SPY": 0.0008, "GLD": 0.0015, "BTC": 0.0040, CASH: 0.0}   # 滑点+手续费+价差
+COMMISSION_RATES = {"SPY": 0.0005, "GLD": 0.0010, "BTC": 0.0025, CASH: 0.0}      # 交易手续费
+BID_ASK_SPREADS = {"SPY": 0.0001, "GLD": 0.0003, "BTC": 0.0015, CASH: 0.0}       # 买卖价差
+
+class DriftBands:
+    """漂移持仓模式的调仓带（与 mhi_weekly.backtest 同口径）：
+    所有风险资产偏离目标都不超过 comfort 时不调仓；单个风险资产变动小于 min_change 时不交易，现金为余数"""
+    __slots__ = ("name", "comfort", "min_change")
+
+    def __init__(self, name, comfort, min_change):
+        self.name = name
+        self.comfort = float(comfort)
+        self.min_change = float(min_change)
+
+    def __repr__(self):
+        return f"DriftBands({self.name!r}, comfort={self.comfort}, min_change={self.min_change})"
+
+MHI_BANDS = DriftBands("mhi", mw.COMFORT_ZONE, mw.MIN_CHANGE)
+FULL_REBALANCE = DriftBands("full", 0.0, 0.0)    # 持仓漂移，但信号一出现就完全回到目标
+
+NO_COSTS = CostModel.from_dict("none", {})
+TOTAL_COSTS = CostModel.from_dict("total", TOTAL_TRADING_COSTS)
+COMMISSION_SPREAD_COSTS = CostModel.from_dict(
+    "commission_spread", {k: COMMISSION_RATES[k] + BID_ASK_SPREADS[k] for k in COMMISSION_RATES})
@@ -0,0 +1,154 @@
+# profiling.py
+# 轻量级分阶段计时：命名 span + 计数器（行数、字节数、缓存命中…），可导出 JSON 汇总或 Chrome trace
+#
+# 用法:
+#   python mhi_weekly.py advise 0.4 0.4 0.2 --refresh --profile prof.json          # JSON 汇总
+#   python threshold_optimization.py --profile run.trace.json                      # Chrome trace（chrome://tracing / Perfetto）
+#   MHI_PROFILE=prof.json python rebalance_analysis.py                             # 任意脚本，用环境变量开启
+# 代码里:
+#   with profiling.span("weekly_last", rows=len(df)): ...
+#   @profiling.timed("build_mhi")
+#   profiling.count("cache.hits", n)
+# 关闭时（默认）span() 返回同一个空上下文、count() 直接返回，开销只是一次函数调用与全局变量判断。
+
+import os, sys, json, time, atexit, threading
+
+ENABLED = False
+_events = []        # (名称, 开始ns, 持续ns, 线程id, 参数)
+_counter_events = []   # (名称, 时刻ns, 累计值)
+_counters = {}
+_lock = threading.Lock()
+_T0 = time.perf_counter_ns()
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _events.append((self.name, self.start - _T0, end - self.start, threading.get_ident(), self.args))
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullSpan()
+
+def span(name, **args):
+    """计时区间；未开启时返回共享的空上下文"""
+    return _Span(name, args) if ENABLED else _NULL
+
+def timed(name=None):
+    """函数装饰器版 span（未开启时直接调用原函数）"""
+    def deco(fn):
+        label = name or fn.__name__
+        def wrapper(*a, **kw):
+            if not ENABLED:
+                return fn(*a, **kw)
+            with _Span(label, {}):
+                return fn(*a, **kw)
+        wrapper.__name__, wrapper.__doc__, wrapper.__wrapped__ = fn.__name__, fn.__doc__, fn
+        return wrapper
+    return deco
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        v = _counters.get(name, 0) + n
+        _counters[name] = v
+        _counter_events.append((name, time.perf_counter_ns() - _T0, v))
+
+def enable(path=None):
+    """开启采集；给出 path 时在进程退出前导出并在 stderr 打印汇总"""
+    global ENABLED
+    ENABLED = True
+    if path:
+        atexit.register(_export_at_exit, path)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    _events.clear()
+    _counter_events.clear()
+    _counters.clear()
+
+def counters():
+    return dict(_counters)
+
+def summary():
+    """按 span 名称汇总：调用次数、总/平均/最大耗时（ms），按总耗时降序"""
+    agg = {}
+    for name, _, dur, _, _ in _events:
+        a = agg.setdefault(name, [0, 0, 0])
+        a[0] += 1; a[1] += dur; a[2] = max(a[2], dur)
+    rows = [{"name": k, "calls": c, "total_ms": t / 1e6, "mean_ms": t / c / 1e6, "max_ms": m / 1e6}
+            for k, (c, t, m) in agg.items()]
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+def report(file=None):
+    file = file or sys.stderr
+    print(f"{'span':32s} {'calls':>6s} {'total':>11s} {'mean':>10s} {'max':>10s}", file=file)
+    for r in summary():
+        print(f"{r['name']:32s} {r['calls']:6d} {r['total_ms']:9.1f}ms {r['mean_ms']:8.2f}ms {r['max_ms']:8.2f}ms", file=file)
+    for k, v in sorted(_counters.items()):
+        print(f"  {k:30s} {v}", file=file)
+
+def chrome_trace():
+    """Chrome trace event 格式（"X" 完整事件 + "C" 计数器事件，时间单位 μs）"""
+    pid = os.getpid()
+    ev = [{"name": n, "ph": "X", "ts": s / 1000, "dur": d / 1000, "pid": pid, "tid": tid, "args": args}
+          for n, s, d, tid, args in _events]
+    ev += [{"name": n, "ph": "C", "ts": ts / 1000, "pid": pid, "args": {"value": v}} for n, ts, v in _counter_events]
+    return {"traceEvents": ev, "displayTimeUnit": "ms"}
+
+def export(path):
+    """*.trace.json 写 Chrome trace，其余写 JSON 汇总（spans 汇总 + 计数器 + 原始事件）"""
+    if path.endswith(".trace.json"):
+        data = chrome_trace()
+    else:
+        data = {"spans": summary(), "counters": counters(),
+                "events": [{"name": n, "start_ms": s / 1e6, "dur_ms": d / 1e6, "args": args}
+                           for n, s, d, _, args in _events]}
+    with open(path, "w") as f:
+        json.dump(data, f, default=str)
+    return path
+
+def _export_at_exit(path):
+    report()
+    print(f"Profile written to {export(path)}", file=sys.stderr)
+
+def from_argv(argv=None):
+    """解析并移除 --profile PATH / --profile=PATH（原地修改 argv，默认 sys.argv）；也认 MHI_PROFILE 环境变量"""
+    argv = sys.argv if argv is None else argv
+    path = None
+    for i, a in enumerate(argv):
+        if a.startswith("--profile="):
+            path = a.split("=", 1)[1]
+            del argv[i]
+            break
+        if a == "--profile":
+            path = argv[i + 1] if i + 1 < len(argv) else "profile.json"
+            del argv[i:i + 2]
+            break
+    if path:
+        enable(path)
+    return path
+
+if os.getenv("MHI_PROFILE"):
+    enable(os.getenv("MHI_PROFILE"))
@@ -3,7 +3,10 @@
 
 import pandas as pd
 import numpy as np
-from mhi_weekly import build_mhi, apply_real_yield_tilt, pick_weights
+from mhi_weekly import build_mhi, BASE_WEIGHTS
+import profiling
+from portfolio import TOTAL_COSTS
+from simulator import prepare_inputs, simulate
 
 def detailed_rebalancing_impact_analysis():
     """详细分析调仓对收益的具体影响"""
@@ -12,71 +15,32 @@ def detailed_rebalancing_impact_analysis():
     # 获取数据
     price_w, mhi, ry_w = build_mhi()
     
-    # 模拟买入持有策略 (基础权重，无调仓)
-    buy_hold_returns = []
-    for i in range(1, len(price_w)):
-        spy_ret = price_w['SPY'].iloc[i] / price_w['SPY'].iloc[i-1] - 1
-        gld_ret = price_w['GLD'].iloc[i] / price_w['GLD'].iloc[i-1] - 1
-        btc_ret = price_w['BTC'].iloc[i] / price_w['BTC'].iloc[i-1] - 1
-        
-        # 基础权重: SPY 35%, GLD 45%, BTC 10%, CASH 10%
-        portfolio_ret = 0.35 * spy_ret + 0.45 * gld_ret + 0.10 * btc_ret
-        buy_hold_returns.append(portfolio_ret)
+    inputs = prepare_inputs(price_w, mhi, ry_w)
+    assets = inputs.assets
+    R = inputs.returns
+    
+    # 模拟买入持有策略 (基础权重，无调仓): SPY 35%, GLD 45%, BTC 10%, CASH 10%
+    buy_hold_returns = (R @ assets.vector(BASE_WEIGHTS))[1:]
     
-    # 模拟调仓策略
-    current_weights = {"SPY": 0.35, "GLD": 0.45, "BTC": 0.10, "CASH": 0.10}
-    rebal_returns = []
+    # 模拟调仓策略（含交易成本）
+    sim = simulate(inputs, cost_model=TOTAL_COSTS)
+    rebal_returns = sim.net[0, 1:]
     rebalance_events = []
     
-    for i in range(1, len(price_w)):
-        date = price_w.index[i]
-        
-        spy_ret = price_w['SPY'].iloc[i] / price_w['SPY'].iloc[i-1] - 1
-        gld_ret = price_w['GLD'].iloc[i] / price_w['GLD'].iloc[i-1] - 1
-        btc_ret = price_w['BTC'].iloc[i] / price_w['BTC'].iloc[i-1] - 1
-        
-        # 当期收益（使用当前权重）
-        portfolio_ret = (current_weights["SPY"] * spy_ret + 
-                        current_weights["GLD"] * gld_ret + 
-                        current_weights["BTC"] * btc_ret)
-        
-        # 每4周检查调仓
-        if i % 4 == 0 and i < len(mhi) and i >= 12:
-            mhi_val = float(mhi.iloc[i])
-            bucket, target = pick_weights(mhi_val)
-            target = apply_real_yield_tilt(target, ry_w, date)
-            
-            # 三周确认机制
-            recent_buckets = []
-            for j in range(1, 4):
-                if i-j*4 >= 0 and i-j*4 < len(mhi):
-                    recent_bucket, _ = pick_weights(float(mhi.iloc[i-j*4]))
-                    recent_buckets.append(recent_bucket)
-            
-            if len(set(recent_buckets)) == 1 and bucket != "NEUTRAL":
-                # 记录调仓事件
-                old_weights = current_weights.copy()
-                
-                # 计算交易成本并扣除
-                trading_cost = calculate_trading_cost(old_weights, target)
-                portfolio_ret -= trading_cost
-                
-                rebalance_events.append({
-                    'date': date,
-                    'week_index': i,
-                    'mhi': mhi_val,
-                    'bucket': bucket,
-                    'old_weights': old_weights,
-                    'new_weights': target,
-                    'trading_cost': trading_cost,
-                    'spy_ret': spy_ret,
-                    'gld_ret': gld_ret,
-                    'btc_ret': btc_ret
-                })
-                
-                current_weights = target.copy()
-        
-        rebal_returns.append(portfolio_ret)
+    for ev in sim.events():
+        # 记录调仓事件
+        rebalance_events.append({
+            'date': ev.date,
+            'week_index': ev.week_index,
+            'mhi': ev.mhi,
+            'bucket': ev.bucket,
+            'old_weights': assets.to_dict(ev.old_weights),
+            'new_weights': assets.to_dict(ev.new_weights),
+            'trading_cost': ev.trading_cost,
+            'spy_ret': R[ev.week_index, assets.pos['SPY']],
+            'gld_ret': R[ev.week_index, assets.pos['GLD']],
+            'btc_ret': R[ev.week_index, assets.pos['BTC']]
+        })
     
     # 转换为Series
     buy_hold_series = pd.Series(buy_hold_returns, index=price_w.index[1:])
@@ -142,30 +106,14 @@ def detailed_rebalancing_impact_analysis():
         if end_idx > start_idx:
             print(f"\nNext 12 Weeks Performance:")
             
-            # 新权重表现
-            new_weight_rets = []
-            old_weight_rets = []
-            
-            for j in range(start_idx + 1, end_idx + 1):
-                if j < len(price_w):
-                    spy_ret_j = price_w['SPY'].iloc[j] / price_w['SPY'].iloc[j-1] - 1
-                    gld_ret_j = price_w['GLD'].iloc[j] / price_w['GLD'].iloc[j-1] - 1
-                    btc_ret_j = price_w['BTC'].iloc[j] / price_w['BTC'].iloc[j-1] - 1
-                    
-                    new_ret_j = (event['new_weights']['SPY'] * spy_ret_j + 
-                               event['new_weights']['GLD'] * gld_ret_j + 
-                               event['new_weights']['BTC'] * btc_ret_j)
-                    
-                    old_ret_j = (event['old_weights']['SPY'] * spy_ret_j + 
-                               event['old_weights']['GLD'] * gld_ret_j + 
-                               event['old_weights']['BTC'] * btc_ret_j)
-                    
-                    new_weight_rets.append(new_ret_j)
-                    old_weight_rets.append(old_ret_j)
+            # 新权重/旧权重表现
+            window = R[start_idx + 1:end_idx + 1]
+            new_weight_rets = window @ assets.vector(event['new_weights'])
+            old_weight_rets = window @ assets.vector(event['old_weights'])
             
-            if new_weight_rets:
-                new_weight_cumret = np.prod([1 + r for r in new_weight_rets]) - 1
-                old_weight_cumret = np.prod([1 + r for r in old_weight_rets]) - 1
+            if len(new_weight_rets):
+                new_weight_cumret = np.prod(1 + new_weight_rets) - 1
+                old_weight_cumret = np.prod(1 + old_weight_rets) - 1
                 timing_effect = new_weight_cumret - old_weight_cumret
                 
                 print(f"  New weights performance: {new_weight_cumret:+.1%}")
@@ -229,16 +177,9 @@ def detailed_rebalancing_impact_analysis():
 
 def calculate_trading_cost(old_weights, new_weights):
     """计算交易成本"""
-    TOTAL_TRADING_COSTS = {
-        "SPY": 0.0008, "GLD": 0.0015, "BTC": 0.0040, "CASH": 0.0000
-    }
-    
-    total_cost = 0.0
-    for asset in ["SPY", "GLD", "BTC", "CASH"]:
-        weight_change = abs(new_weights.get(asset, 0.0) - old_weights.get(asset, 0.0))
-        total_cost += weight_change * TOTAL_TRADING_COSTS[asset]
-    
-    return total_cost
+    assets = TOTAL_COSTS.assets
+    return float(TOTAL_COSTS.cost(assets.vector(old_weights), assets.vector(new_weights)))
 
 if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
     results = detailed_rebalancing_impact_analysis()
\ No newline at end of file
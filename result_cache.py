@@ -0,0 +1,315 @@
+# result_cache.py
+# 扫参结果的磁盘缓存：按 (阈值对, 成本模型, 配置哈希, 数据版本哈希) 记忆化
+# 每个数据版本一个列式 .npz 文件（指标列 + float32 权益曲线矩阵 + 模拟终点检查点）；扫参只计算缺失的点。
+# 新数据只是旧数据的延长（前缀在 PREFIX_ATOL 容差内一致，见 is_prefix）时，从检查点续算新增的周并流式更新指标——按 (成本模型, 配置) 分组，
+# 各组在下次被用到时各自续算，旧文件等所有分组都迁完才删除；数据被修订的旧版本不再命中（其他版本的文件本次运行不删）。
+# 超过容量上限时，文件内按最近使用时间淘汰行，目录内按修改时间淘汰其他版本的文件。
+
+import os, time, hashlib
+import numpy as np
+import mhi_weekly as mw
+import profiling
+import simulator as sim
+from simulator import SimState, simulate_grid, extend_grid, metrics_from_state
+from portfolio import default_table
+
+CACHE_DIR = os.getenv("SWEEP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sweep_cache"))
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CHUNK_POINTS = 2048          # 每批模拟的网格点数（限制 (G, T, N) 中间数组的内存）
+CHECKPOINT_SECONDS = 30.0    # 长扫参中途落盘的最小间隔（中断后重跑时已完成的点直接命中）
+METRICS = ["total_return", "annual_return", "annual_vol", "sharpe", "max_dd", "rebalance_count", "total_costs"]
+STATE_COLS = ["st_weights", "st_value", "st_peak", "st_codes", "st_mean", "st_m2"]
+DATA_COLS = ["dates", "returns", "mhi", "ry_delta"]    # 随缓存保存的输入数组（判断新数据是否为其延长）
+PREFIX_ATOL = 1e-9           # 续算判定的绝对容差：周收益 / MHI / 真实利率变化（复权与浮点噪声远小于此）
+
+def _hash(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(np.ascontiguousarray(p).tobytes() if isinstance(p, np.ndarray) else repr(p).encode())
+    return h.hexdigest()[:16]
+
+def data_version(inputs):
+    """价格/MHI/真实利率数据的版本哈希"""
+    return _hash(np.asarray(inputs.dates.asi8), inputs.returns, inputs.mhi, inputs.ry_delta)
+
+def data_arrays(inputs):
+    """判断前缀用的输入数组（float64，紧凑模式也一样）"""
+    return {"dates": np.asarray(inputs.dates.asi8), "returns": np.asarray(inputs.returns, dtype=float),
+            "mhi": np.asarray(inputs.mhi, dtype=float), "ry_delta": np.asarray(inputs.ry_delta, dtype=float)}
+
+def is_prefix(data, inputs, atol=PREFIX_ATOL):
+    """data（data_arrays 的结果）是否为 inputs 的前缀：日期完全相同，数值相差不超过 atol（NaN 位置相同）"""
+    n = len(data["dates"])
+    if not 1 < n <= len(inputs):
+        return False
+    new = data_arrays(inputs.prefix(n))
+    return np.array_equal(data["dates"], new["dates"]) and all(
+        data[k].shape == new[k].shape and np.allclose(data[k], new[k], rtol=0, atol=atol, equal_nan=True)
+        for k in DATA_COLS[1:])
+
+def config_hash(table=None, initial=None, drift=None):
+    """影响模拟结果的规则参数哈希（固定权重模式不含 drift 项，旧缓存仍然有效）"""
+    table = table or default_table()
+    parts = (table.assets.names, table.matrix, initial, sim.CHECK_EVERY, sim.WARMUP,
+             sim.CONFIRM_LAGS, mw.CASH_MAX, mw.USE_REAL_YIELD_TILT)
+    if drift is not None:
+        parts += (("drift", 2, drift.comfort, drift.min_change),)   # 2: 信号周按周末漂移后的权重成交
+    return _hash(*parts)
+
+def cost_hash(cost_model):
+    return _hash(cost_model.name, cost_model.assets.names, cost_model.rates)
+
+def _key(cost_key, cfg_key, low, high):
+    return f"{cost_key}|{cfg_key}|{low:.9f}|{high:.9f}"
+
+def _columns(state, equity):
+    """SimState + 权益曲线 -> 缓存列"""
+    m = metrics_from_state(state)
+    return {**m, "rebalance_count": state.rebalances, "total_costs": state.costs, "equity": equity,
+            "st_weights": state.weights, "st_value": state.value, "st_peak": state.peak,
+            "st_codes": state.recent_codes, "st_mean": state.mean, "st_m2": state.m2}
+
+class SweepCache:
+    """单个数据版本的列式缓存"""
+
+    def __init__(self, version, n_bars, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.version = version
+        self.n_bars = n_bars
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.path = os.path.join(cache_dir, f"sweep_{n_bars}_{version}.npz")
+        self._index = {}
+        self._sources = set()    # 还有分组未续算过来的旧版本文件，save 时保留
+        self._superseded = set() # 本次续算已全部迁完的前缀版本文件，save 时删除
+        self.data = self._read_data(self.path)
+        self.cols = self._read(self.path)
+        self._reindex()
+
+    @classmethod
+    def for_inputs(cls, inputs, cost_model, table, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, drift=None):
+        """打开当前数据版本的缓存；更短数据的缓存若是其前缀，把本次 (成本模型, 配置) 的点从检查点续算过来。
+        旧文件里其他成本模型/配置的点留在原文件，等各自下次用到时再续算，全部迁完后旧文件才删除"""
+        cache = cls(data_version(inputs), len(inputs), cache_dir, max_bytes)
+        cache.data = data_arrays(inputs)
+        if os.path.isdir(cache_dir):
+            cache.migrate(inputs, cost_model, table, drift)
+        return cache
+
+    def _older(self, inputs):
+        """数据在 PREFIX_ATOL 内是 inputs 前缀的其他版本文件（含同长度、只差浮点噪声的），数据从长到短；
+        没存输入数组的旧格式文件退回按前缀哈希精确比较"""
+        found = []
+        for f in os.listdir(self.cache_dir):
+            parts = f[:-4].split("_") if f.startswith("sweep_") and f.endswith(".npz") else []
+            path = os.path.join(self.cache_dir, f)
+            if len(parts) != 3 or not parts[1].isdigit() or path == self.path:
+                continue
+            n = int(parts[1])
+            data = self._read_data(path)
+            if data is not None and is_prefix(data, inputs):
+                found.append((n, path))
+            elif data is None and 1 < n < len(inputs) and data_version(inputs.prefix(n)) == parts[2]:
+                found.append((n, path))
+        return [path for _, path in sorted(found, reverse=True)]
+
+    def _groups(self, cols=None):
+        cols = self.cols if cols is None else cols
+        return set() if cols is None else set(zip(cols["cost_key"].tolist(), cols["config_key"].tolist()))
+
+    def migrate(self, inputs, cost_model, table, drift=None):
+        """从最长的、含本分组的前缀版本续算本分组；记下仍有未迁移分组的旧文件"""
+        group = (cost_hash(cost_model), config_hash(table, drift=drift))
+        have = self._groups()
+        for path in self._older(inputs):
+            cols = self._read(path)
+            if cols is None:
+                continue
+            groups = self._groups(cols)
+            if group in groups and group not in have:
+                self._merge(self._extend(cols, group, inputs, cost_model, table, drift))
+                have.add(group)
+            if groups - have:
+                self._sources.add(path)
+            else:
+                self._superseded.add(path)
+
+    @staticmethod
+    def _read_data(path):
+        """只读文件里的输入数组（npz 成员按需解压，不读整个缓存）；没有则 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as z:
+                if not all("data_" + k in z.files for k in DATA_COLS):
+                    return None
+                return {k: z["data_" + k] for k in DATA_COLS}
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _read(path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as z:
+                cols = {k: z[k] for k in z.files if not k.startswith("data_")}
+        except (OSError, ValueError):
+            return None
+        if any(c not in cols for c in STATE_COLS):
+            return None   # 旧格式（无检查点）
+        return cols
+
+    def _reindex(self):
+        self._index = {} if self.cols is None else {k: i for i, k in enumerate(self.cols["key"])}
+
+    @staticmethod
+    def _extend(cols, group, inputs, cost_model, table, drift=None):
+        """旧版本里属于 group = (cost_key, config_key) 的行，用检查点续算到 inputs 的末尾"""
+        keep = np.flatnonzero((cols["cost_key"] == group[0]) & (cols["config_key"] == group[1]))
+        c = {k: v[keep] for k, v in cols.items()}
+        n_prev = c["equity"].shape[1]
+        state = SimState(n_prev + 1, c["low"], c["high"], c["st_weights"], c["st_value"], c["st_peak"],
+                         c["max_dd"], c["st_codes"], c["total_costs"], c["rebalance_count"].astype(np.int64),
+                         n_prev, c["st_mean"], c["st_m2"])
+        if n_prev + 1 == len(inputs):
+            return c             # 同长度，只差浮点噪声：原样沿用
+        res = extend_grid(inputs, state, cost_model, table, drift)
+        eq_new = state.value[:, None] * np.cumprod(1 + res.period_returns, axis=1)
+        equity = np.concatenate([c["equity"], eq_new.astype(np.float32)], axis=1)
+        c.update({k: np.asarray(v, dtype=c[k].dtype) for k, v in _columns(res.state, equity).items()})
+        return c
+
+    def _merge(self, new):
+        if self.cols is None or len(self.cols["key"]) == 0:
+            self.cols = new
+        else:
+            self.cols = {k: np.concatenate([self.cols[k], new[k]]) for k in new}
+        self._evict()
+        self._reindex()
+
+    def __len__(self):
+        return 0 if self.cols is None else len(self.cols["key"])
+
+    def lookup(self, keys):
+        """返回每个key在缓存里的行号（缺失为-1）"""
+        return np.array([self._index.get(k, -1) for k in keys], dtype=np.int64)
+
+    def get(self, rows):
+        now = time.time()
+        self.cols["last_used"][rows] = now
+        out = {m: self.cols[m][rows] for m in METRICS}
+        out["equity"] = self.cols["equity"][rows]
+        return out
+
+    def put(self, keys, lows, highs, cost_key, cfg_key, values):
+        n = len(keys)
+        self._merge({
+            "key": np.asarray(keys),
+            "low": np.asarray(lows, dtype=float), "high": np.asarray(highs, dtype=float),
+            "cost_key": np.full(n, cost_key), "config_key": np.full(n, cfg_key),
+            "last_used": np.full(n, time.time()),
+            "equity": np.asarray(values["equity"], dtype=np.float32),
+            "st_codes": np.asarray(values["st_codes"], dtype=np.int8),
+            **{m: np.asarray(values[m], dtype=float) for m in METRICS + STATE_COLS if m != "st_codes"},
+        })
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到缓存不超过容量上限"""
+        row_bytes = max(1, sum(v[:1].nbytes for v in self.cols.values()))
+        cap = max(1, self.max_bytes // row_bytes)
+        if len(self.cols["key"]) > cap:
+            keep = np.sort(np.argsort(-self.cols["last_used"], kind="stable")[:cap])
+            self.cols = {k: v[keep] for k, v in self.cols.items()}
+
+    def save(self):
+        if self.cols is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.path[:-4] + ".tmp.npz"
+        np.savez(tmp, **self.cols, **{"data_" + k: v for k, v in (self.data or {}).items()})
+        os.replace(tmp, self.path)
+        # 只删本次续算取代的前缀版本；其他数据版本（例如别的区域/数据源在用的）交给容量上限
+        for path in self._superseded - self._sources:
+            if os.path.exists(path):
+                os.remove(path)
+        self._superseded.clear()
+        self._evict_files()
+
+    def _evict_files(self):
+        """目录内缓存文件总大小超过容量上限时，按修改时间从旧到新删除其他版本的文件（当前文件与待迁移的不删）"""
+        keep = {self.path} | self._sources
+        files = []
+        for f in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, f)
+            if f.startswith("sweep_") and f.endswith(".npz") and ".tmp" not in f and os.path.isfile(path):
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path not in keep:
+                os.remove(path)
+                total -= size
+
+@profiling.timed("cached_sweep")
+def cached_sweep(inputs, lows, highs, cost_model, table=None, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 with_equity=False, on_chunk=None, progress=None, checkpoint_seconds=CHECKPOINT_SECONDS, drift=None):
+    """网格扫参（带缓存）：只对缓存里没有的点调用 simulate_grid；返回各指标数组（可选权益曲线）
+    on_chunk(res) 在每批新模拟完成后调用（例如把调仓事件写入 ResultStore），批结果随后即被释放
+    progress（见 sweep_runner.SweepProgress）：逐批汇报进度；其 cancelled 置位后在批边界停止、
+    已完成的点落盘，返回值 "cancelled" 为 True（未完成的点指标为0）
+    drift：DriftBands 时为漂移持仓模式（与固定权重模式分开缓存）"""
+    lows, highs = np.broadcast_arrays(np.asarray(lows, dtype=float), np.asarray(highs, dtype=float))
+    table = table or default_table(inputs.assets)
+    cost_key, cfg_key = cost_hash(cost_model), config_hash(table, drift=drift)
+    keys = [_key(cost_key, cfg_key, lo, hi) for lo, hi in zip(lows, highs)]
+    cache = SweepCache.for_inputs(inputs, cost_model, table, cache_dir, max_bytes, drift)
+
+    rows = cache.lookup(keys)
+    hit, miss = np.flatnonzero(rows >= 0), np.flatnonzero(rows < 0)
+    profiling.count("sweep_cache.hits", len(hit))
+    profiling.count("sweep_cache.misses", len(miss))
+    out = {m: np.zeros(len(keys)) for m in METRICS}
+    if with_equity:
+        out["equity"] = np.zeros((len(keys), len(inputs) - 1), dtype=np.float32)
+
+    if len(hit):
+        cached = cache.get(rows[hit])
+        for m in out:
+            out[m][hit] = cached[m]
+
+    if progress is not None:
+        progress.advance(len(hit), computed=False)
+
+    def flush(pending):
+        if pending:
+            idx = np.concatenate([p for p, _ in pending])
+            fresh = {k: np.concatenate([ch[k] for _, ch in pending]) for k in pending[0][1]}
+            cache.put([keys[i] for i in idx], lows[idx], highs[idx], cost_key, cfg_key, fresh)
+        with profiling.span("sweep_cache.save", rows=len(cache)):
+            cache.save()
+
+    pending, last_save, cancelled = [], time.time(), False
+    for c in range(0, len(miss), CHUNK_POINTS):
+        if progress is not None and progress.cancelled:
+            cancelled = True
+            break
+        part = miss[c:c + CHUNK_POINTS]
+        res = simulate_grid(inputs, lows[part], highs[part], cost_model, table, drift=drift)
+        fresh = _columns(res.state, np.cumprod(1 + res.net[:, 1:], axis=1).astype(np.float32))
+        for m in out:
+            out[m][part] = fresh[m]
+        if on_chunk is not None:
+            on_chunk(res)
+        pending.append((part, fresh))
+        if progress is not None:
+            progress.advance(len(part))
+        if time.time() - last_save >= checkpoint_seconds:
+            flush(pending)   # 中途检查点：按时间节流，避免每批重写整个缓存文件
+            pending, last_save = [], time.time()
+    flush(pending)
+
+    out["cache_hits"], out["cache_misses"] = len(hit), len(miss)
+    out["cancelled"] = cancelled
+    return out
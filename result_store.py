@@ -0,0 +1,120 @@
+# result_store.py
+# 扫参结果的列式存储（SQLite，标准库即可）：每个网格点一行指标、每次调仓一行事件，列全是标量类型。
+# 结果边算边写（按批 executemany），内存里不再保留 rebalance_details 之类的嵌套对象；
+# 常用查询（按夏普取前k、某个阈值对的调仓事件、分组统计）都走索引。
+
+import os, sqlite3
+import numpy as np
+from portfolio import BUCKET_NAMES
+
+STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep_results.sqlite"))
+METRIC_COLS = ["total_return", "annual_return", "annual_vol", "sharpe", "max_dd", "rebalance_count", "total_costs"]
+KEY_COLS = ["data_version", "cost_key", "config_key", "low", "high"]
+
+class ResultStore:
+    """points: 每个网格点的指标；events: 每次调仓（权重变化按资产展开成 dw_<资产> 列）"""
+
+    def __init__(self, path=STORE_PATH, assets=None):
+        from portfolio import DEFAULT_ASSETS
+        self.path = path
+        self.assets = assets or DEFAULT_ASSETS
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create()
+
+    def _create(self):
+        dw = ", ".join(f'"dw_{a}" REAL' for a in self.assets)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS points (
+                data_version TEXT, cost_key TEXT, config_key TEXT, low REAL, high REAL,
+                total_return REAL, annual_return REAL, annual_vol REAL, sharpe REAL, max_dd REAL,
+                rebalance_count INTEGER, total_costs REAL,
+                PRIMARY KEY (data_version, cost_key, config_key, low, high));
+            CREATE INDEX IF NOT EXISTS points_sharpe ON points (data_version, cost_key, sharpe DESC);
+            CREATE TABLE IF NOT EXISTS events (
+                data_version TEXT, cost_key TEXT, config_key TEXT, low REAL, high REAL,
+                week_index INTEGER, date TEXT, mhi REAL, bucket TEXT, trading_cost REAL, {dw});
+            CREATE INDEX IF NOT EXISTS events_pair ON events (data_version, cost_key, low, high, week_index);
+        """)
+        cols = {r[1] for r in self.conn.execute("PRAGMA table_info(events)")}
+        for a in self.assets:
+            if f"dw_{a}" not in cols:   # 资产集合扩大时补列
+                self.conn.execute(f'ALTER TABLE events ADD COLUMN "dw_{a}" REAL')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 写入 ----------
+    def write_points(self, scope, lows, highs, values):
+        """scope = (data_version, cost_key, config_key)；values 为各指标的数组"""
+        n = len(lows)
+        cols = [np.full(n, s, dtype=object) for s in scope] + [np.asarray(lows, float), np.asarray(highs, float)]
+        cols += [np.asarray(values[m], dtype=int if m == "rebalance_count" else float) for m in METRIC_COLS]
+        ph = ", ".join("?" * len(cols))
+        self.conn.executemany(f"INSERT OR REPLACE INTO points VALUES ({ph})",
+                              zip(*[c.tolist() for c in cols]))
+        self.conn.commit()
+
+    def write_events(self, scope, sim):
+        """把一批 SimResult 的调仓事件按列展开写入（同一阈值对的旧事件先删除）"""
+        g, k = np.nonzero(sim.rebal)
+        pairs = list(zip(sim.low.tolist(), sim.high.tolist()))
+        self.conn.executemany("DELETE FROM events WHERE data_version=? AND cost_key=? AND config_key=? AND low=? AND high=?",
+                              [(*scope, lo, hi) for lo, hi in pairs])
+        if len(g):
+            idx = sim.start + k
+            dates = sim.inputs.dates[idx].strftime("%Y-%m-%d")
+            T = sim.held.shape[1]
+            nxt = np.minimum(k + 1, T - 1)
+            new = np.where((k + 1 < T)[:, None], sim.held[g, nxt], sim.after[g])   # 实际成交后的权重（同 SimResult.events）
+            dw = new - sim.held[g, k]
+            cols = [np.full(len(g), s, dtype=object) for s in scope]
+            cols += [sim.low[g], sim.high[g], idx, np.asarray(dates), sim.inputs.mhi[idx],
+                     np.asarray(BUCKET_NAMES)[sim.codes[g, k]], sim.costs[g, k]]
+            cols += [dw[:, j] for j in range(dw.shape[1])]
+            names = KEY_COLS + ["week_index", "date", "mhi", "bucket", "trading_cost"] + [f'"dw_{a}"' for a in sim.inputs.assets]
+            self.conn.executemany(f"INSERT INTO events ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                                  zip(*[np.asarray(c).tolist() for c in cols]))
+        self.conn.commit()
+
+    def prune(self, data_version):
+        """删除其他数据版本的结果"""
+        for t in ("points", "events"):
+            self.conn.execute(f"DELETE FROM {t} WHERE data_version != ?", (data_version,))
+        self.conn.commit()
+
+    # ---------- 查询 ----------
+    def _rows(self, sql, args):
+        cur = self.conn.execute(sql, args)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, r)) for r in cur.fetchall()]
+
+    def top_k(self, scope, metric="sharpe", k=10):
+        """同分时按写入顺序（与原先 sorted/max 的稳定顺序一致）"""
+        if metric not in METRIC_COLS:
+            raise ValueError(f"unknown metric {metric!r}")
+        return self._rows(f"SELECT * FROM points WHERE data_version=? AND cost_key=? AND config_key=? "
+                          f"ORDER BY {metric} DESC, rowid LIMIT ?", (*scope, k))
+
+    def best_by(self, scope, group_col, metric="sharpe"):
+        """每个 group_col 取值下 metric 最好的一行（如每个负阈值的最佳正阈值）"""
+        return self._rows(f"""
+            SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {group_col} ORDER BY {metric} DESC, rowid) AS rn
+                           FROM points WHERE data_version=? AND cost_key=? AND config_key=?)
+            WHERE rn = 1 ORDER BY {group_col}""", scope)
+
+    def group_stats(self, scope, group_col="rebalance_count"):
+        return self._rows(f"""
+            SELECT {group_col}, COUNT(*) AS n, AVG(sharpe) AS avg_sharpe, AVG(total_return) AS avg_return,
+                   AVG(total_costs) AS avg_costs
+            FROM points WHERE data_version=? AND cost_key=? AND config_key=? GROUP BY {group_col} ORDER BY {group_col}""", scope)
+
+    def events_for(self, scope, low, high):
+        return self._rows("SELECT * FROM events WHERE data_version=? AND cost_key=? AND config_key=? AND low=? AND high=? "
+                          "ORDER BY week_index", (*scope, float(low), float(high)))
+
+    def count(self, scope):
+        return self.conn.execute("SELECT COUNT(*) FROM points WHERE data_version=? AND cost_key=? AND config_key=?",
+                                 scope).fetchone()[0]
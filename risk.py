@@ -0,0 +1,197 @@
+# risk.py
+# 尾部风险：VaR / CVaR（以周收益表示，负数为亏损，与 max_dd 同号），全部按 (组合数 G, 周 T) 批量计算
+#   tail_metrics          已实现收益的历史 VaR/CVaR（每个组合一个数）——扫参里按尾部风险排序用，几乎零额外开销
+#   rolling_historical_var 历史模拟：第 t 周的持仓权重作用在之前 window 周的资产收益上
+#   parametric_var        EWMA 协方差（RiskMetrics）的正态 VaR：σ = sqrt(wᵀΣw)
+#   monte_carlo_var       模拟 VaR：过滤历史模拟（按 EWMA 协方差标准化的历史冲击重抽样，保留肥尾与相关结构），
+#                         或正态抽样
+# 三种预测都只用第 t 周之前的信息，可以和第 t 周的实际收益比较（突破率）。
+# 权重与资产收益的最后一列是 CASH（无风险，不参与协方差）。
+#
+# 用法:
+#   python risk.py                                 # 策略 + 各基准的 VaR/CVaR 与突破率
+#   python risk.py --levels 0.95,0.99 --window 104 --paths 2000 --costs total
+
+import argparse
+from statistics import NormalDist
+import numpy as np
+import profiling
+from covariance import EWMA_LAMBDA, ewma_forecast_series
+
+VAR_LEVELS = (0.95, 0.99)
+VAR_WINDOW = 104             # 历史模拟窗口：2年周线
+MC_PATHS = 2000
+MC_SEED = 0
+MC_MIN_RESIDUALS = 26        # 过滤历史模拟至少要有这么多历史冲击
+BLOCK_ELEMS = 1 << 23        # (G, T, 样本) 中间数组按块处理的元素上限（约64MB）
+
+def level_key(level):
+    return f"{round(level * 100):d}"
+
+def _k(n, level):
+    return max(1, int(np.ceil((1 - level) * n - 1e-9)))
+
+def _tail(samples, level):
+    """最后一维样本的经验 VaR（第 k 小）与 CVaR（最小 k 个的均值），k = ceil((1-level)·n)"""
+    k = _k(samples.shape[-1], level)
+    part = np.partition(samples, k - 1, axis=-1)[..., :k]
+    return part[..., k - 1], part.mean(axis=-1)
+
+def tail_metrics(returns, levels=VAR_LEVELS):
+    """已实现收益 (G, T) 的历史 VaR/CVaR：{"var_95": (G,), "cvar_95": (G,), ...}"""
+    r = np.atleast_2d(np.asarray(returns, dtype=float))
+    out = {}
+    for level in levels:
+        var, cvar = _tail(r, level)
+        out["var_" + level_key(level)], out["cvar_" + level_key(level)] = var, cvar
+    return out
+
+def _schedule(weights, T):
+    """(G, N) 固定权重或 (G, T, N) 每周权重 -> (G, T, N)"""
+    w = np.asarray(weights, dtype=float)
+    return np.broadcast_to(w[:, None, :], (len(w), T, w.shape[-1])) if w.ndim == 2 else w
+
+def _blocks(G, per_row):
+    step = max(1, BLOCK_ELEMS // max(1, per_row))
+    return [slice(g, g + step) for g in range(0, G, step)]
+
+@profiling.timed("risk.rolling_historical")
+def rolling_historical_var(weights, returns, level=0.95, window=VAR_WINDOW):
+    """历史模拟 VaR/CVaR (G, T)：第 t 周的权重 × 第 t-window..t-1 周的资产收益；前 window 周为 NaN"""
+    R = np.asarray(returns, dtype=float)
+    T = len(R)
+    W = _schedule(weights, T)
+    var = np.full(W.shape[:2], np.nan)
+    cvar = np.full(W.shape[:2], np.nan)
+    if T <= window:
+        return var, cvar
+    wins = np.lib.stride_tricks.sliding_window_view(R[:-1], window, axis=0)     # (T-window, N, window)
+    for sl in _blocks(len(W), (T - window) * window):
+        samples = np.einsum("gtn,tnw->gtw", W[sl, window:], wins)
+        var[sl, window:], cvar[sl, window:] = _tail(samples, level)
+    return var, cvar
+
+@profiling.timed("risk.parametric")
+def parametric_var(weights, cov, level=0.95):
+    """正态 VaR/CVaR (G, T)；cov 为各周的预测协方差 (T, N-1, N-1)（不含 CASH）"""
+    W = _schedule(weights, len(cov))[..., :-1]
+    sigma = np.sqrt(np.maximum(np.einsum("gtn,tnm,gtm->gt", W, cov, W), 0))
+    nd = NormalDist()
+    z = nd.inv_cdf(1 - level)
+    return z * sigma, -sigma * nd.pdf(z) / (1 - level)
+
+def _cholesky(cov):
+    """逐周 Cholesky 因子；NaN（无预测）的周保持 NaN，加极小的对角项防止半正定矩阵失败"""
+    L = np.full_like(cov, np.nan)
+    ok = ~np.isnan(cov).any(axis=(1, 2))
+    eye = np.eye(cov.shape[1]) * 1e-12
+    L[ok] = np.linalg.cholesky(cov[ok] + eye)
+    return L, ok
+
+@profiling.timed("risk.monte_carlo")
+def monte_carlo_var(weights, returns, cov, level=0.95, paths=MC_PATHS, seed=MC_SEED, method="filtered"):
+    """模拟 VaR/CVaR (G, T)；组合收益样本 = (w·L_t)·z，L_t 为第 t 周预测协方差的 Cholesky 因子
+    method="filtered"：z 从第 t 周之前的标准化历史冲击 L_s⁻¹ r_s 里重抽样（不足 MC_MIN_RESIDUALS 个时为 NaN）
+    method="normal"：z 为标准正态（所有周共用同一组随机数）"""
+    R = np.asarray(returns, dtype=float)[:, :-1]
+    T, N = R.shape
+    W = _schedule(weights, T)[..., :-1]
+    L, ok = _cholesky(cov)
+    a = np.einsum("gtn,tnm->gtm", W, np.where(ok[:, None, None], L, 0.0))     # (G, T, N)
+    rng = np.random.default_rng(seed)
+    var = np.full(W.shape[:2], np.nan)
+    cvar = np.full(W.shape[:2], np.nan)
+    if method == "normal":
+        Z = rng.standard_normal((paths, N))
+        valid = ok
+        for sl in _blocks(len(W), T * paths):
+            var[sl], cvar[sl] = _tail(a[sl] @ Z.T, level)
+    elif method == "filtered":
+        eps = np.zeros((T, N))
+        eps[ok] = np.linalg.solve(L[ok], R[ok][..., None])[..., 0]
+        pool = np.flatnonzero(ok)                               # 有标准化冲击的周
+        n_before = np.searchsorted(pool, np.arange(T))          # 第 t 周之前可用的冲击数
+        valid = ok & (n_before >= MC_MIN_RESIDUALS)
+        t_idx = np.flatnonzero(valid)
+        draw = pool[(rng.random((len(t_idx), paths)) * n_before[t_idx, None]).astype(np.int64)]
+        Z = eps[draw]                                           # (T', P, N)
+        for sl in _blocks(len(W), len(t_idx) * paths):
+            var[sl, t_idx], cvar[sl, t_idx] = _tail(np.einsum("gtn,tpn->gtp", a[sl][:, t_idx], Z), level)
+    else:
+        raise ValueError(f"unknown Monte Carlo method {method!r}; expected 'filtered' or 'normal'")
+    var[:, ~valid] = np.nan
+    cvar[:, ~valid] = np.nan
+    return var, cvar
+
+def schedule_risk(weights, returns, levels=VAR_LEVELS, window=VAR_WINDOW, lam=EWMA_LAMBDA, paths=MC_PATHS,
+                  seed=MC_SEED, method="filtered", cov=None):
+    """每周权重 (G, T, N) 或固定权重 (G, N) + 资产收益 (T, N) -> {(方法, level): (VaR (G, T), CVaR (G, T))}
+    方法: "historical" / "ewma" / "monte_carlo"；EWMA 预测协方差（covariance.ewma_forecast_series）只算一次，共用；
+    EWMA 初值覆盖的前 EWMA_SEED_WEEKS+1 周没有预测
+    cov：已有的各周预测协方差 (T, N-1, N-1) 时直接使用"""
+    R = np.asarray(returns, dtype=float)
+    cov = ewma_forecast_series(R[:, :-1], lam)[:len(R)] if cov is None else cov
+    out = {}
+    for level in levels:
+        out["historical", level] = rolling_historical_var(weights, R, level, window)
+        out["ewma", level] = parametric_var(weights, cov, level)
+        out["monte_carlo", level] = monte_carlo_var(weights, R, cov, level, paths, seed, method)
+    return out
+
+def breach_rate(realized, var):
+    """实际收益跌破预测 VaR 的频率（只统计有预测的周）；模型准确时约等于 1 - level"""
+    ok = ~np.isnan(var)
+    return np.divide((ok & (realized < var)).sum(axis=-1), ok.sum(axis=-1),
+                     out=np.full(var.shape[:-1], np.nan), where=ok.sum(axis=-1) > 0)
+
+def _mean_valid(x):
+    ok = ~np.isnan(x)
+    return np.divide(np.where(ok, x, 0).sum(axis=-1), ok.sum(axis=-1),
+                     out=np.full(x.shape[:-1], np.nan), where=ok.sum(axis=-1) > 0)
+
+def main(argv=None):
+    import pandas as pd
+    from mhi_weekly import build_mhi
+    from simulator import prepare_inputs, simulate
+    from benchmarks import BenchmarkSet, WEEKLY
+    from benchmark_analysis import BENCHMARKS
+    from sweep_runner import COST_MODELS
+    p = argparse.ArgumentParser(description="VaR / CVaR of the MHI strategy and benchmarks")
+    p.add_argument("--levels", default=",".join(str(l) for l in VAR_LEVELS))
+    p.add_argument("--window", type=int, default=VAR_WINDOW)
+    p.add_argument("--paths", type=int, default=MC_PATHS)
+    p.add_argument("--method", choices=("filtered", "normal"), default="filtered")
+    p.add_argument("--costs", default="total", choices=sorted(COST_MODELS))
+    args = p.parse_args(argv)
+    levels = [float(x) for x in args.levels.split(",")]
+
+    inputs = prepare_inputs(*build_mhi())
+    res = simulate(inputs, cost_model=COST_MODELS[args.costs])
+    bs = BenchmarkSet.from_dicts(BENCHMARKS, inputs.assets)
+    bench = bs.evaluate(inputs.returns, WEEKLY, COST_MODELS[args.costs])
+    names = ["MHI_Strategy"] + list(bs.names)
+    T = len(inputs)
+    weights = np.concatenate([res.held.astype(float), np.broadcast_to(bs.matrix[:, None, :], (len(bs), T, bs.matrix.shape[1]))])
+    realized = np.vstack([res.net.astype(float), bench.returns.T])
+    forecasts = schedule_risk(weights, inputs.returns, levels, args.window, paths=args.paths, method=args.method)
+    realized_tail = tail_metrics(realized[:, 1:], levels)
+
+    print(f"=== Weekly VaR / CVaR ({T} weeks, {args.costs} costs, window {args.window}, "
+          f"EWMA λ={EWMA_LAMBDA}, {args.paths} {args.method} paths) ===")
+    for level in levels:
+        key = level_key(level)
+        rows = {"Hist VaR": realized_tail["var_" + key], "Hist CVaR": realized_tail["cvar_" + key]}
+        for method, label in (("historical", "Roll"), ("ewma", "EWMA"), ("monte_carlo", "MC")):
+            var, cvar = forecasts[method, level]
+            rows[f"{label} VaR"] = _mean_valid(var)
+            rows[f"{label} CVaR"] = _mean_valid(cvar)
+            rows[f"{label} breach"] = breach_rate(realized, var)
+        table = pd.DataFrame(rows, index=names)
+        print(f"\n--- {level:.0%} (expected breach rate {1 - level:.1%}) ---")
+        print(table.to_string(float_format=lambda x: f"{x:.2%}"))
+    print("\nVaR/CVaR are weekly returns (negative = loss); Roll/EWMA/MC columns average each week's forecast.")
+    return forecasts
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
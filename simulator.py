@@ -0,0 +1,356 @@
+# simulator.py
+# 向量化策略模拟器：周收益矩阵 (T × N) + MHI 序列 -> 整条持仓路径与净收益
+# 规则与各分析脚本里的逐周循环一致：每4周检查、至少12周数据、前3个检查点分档一致才确认、只在LOW/HIGH调仓，
+# 调仓当周按旧权重计收益并扣除交易成本，下一周起按新权重。阈值可以传数组，一次算完整个网格。
+# 默认两次调仓之间持仓权重不变（隐含每周免费回到目标）；传入 drift=DriftBands(...) 则持仓随价格漂移，
+# 调仓时再按舒适区间/最小变动（COMFORT_ZONE / MIN_CHANGE）决定交易哪些资产。
+# vol_target=年化目标波动（标量或每个网格点一个）时在固定权重持仓上再叠加逐周的波动率缩放（见 vol_target.py）。
+
+import os
+import numpy as np
+import pandas as pd
+import mhi_weekly as mw
+import profiling
+from portfolio import (AssetIndex, NEUTRAL, BUCKET_NAMES, NO_COSTS,
+                       default_table, bucket_codes, apply_real_yield_tilt_array)
+
+CHECK_EVERY = 4              # 每4周检查一次是否调仓
+WARMUP = 12                  # 至少3个月数据
+CONFIRM_LAGS = (4, 8, 12)    # 确认：前3个检查点分档相同
+
+# 紧凑模式（可选）：收益与 (G, T, N) 持仓/目标张量用 float32，日期存为 uint16 周偏移；
+# MHI/真实利率这类 T 长度的序列仍为 float64，保证分档判定与 float64 完全一致。
+COMPACT = os.getenv("MHI_COMPACT", "") == "1"
+WEEK_NS = 7 * 24 * 3600 * 10**9
+
+class SimInputs:
+    """模拟所需的全部数组（与具体阈值/成本无关，可在整个网格间复用）"""
+    __slots__ = ("assets", "_dates", "origin", "offsets", "returns", "mhi", "ry_delta")
+
+    def __init__(self, assets, dates, returns, mhi, ry_delta):
+        self.assets = assets
+        self._dates = dates
+        self.origin = self.offsets = None   # 紧凑模式：起始日 + uint16 周偏移，代替 DatetimeIndex
+        self.returns = returns      # (T, N)，CASH列为0，第0行为0
+        self.mhi = mhi              # (T,)
+        self.ry_delta = ry_delta    # (T,)，真实利率4周变化，NaN表示不拨
+
+    @property
+    def dates(self):
+        if self._dates is not None:
+            return self._dates
+        return pd.DatetimeIndex(self.origin + self.offsets.astype(np.int64) * WEEK_NS)
+
+    @property
+    def compact_mode(self):
+        return self.returns.dtype == np.float32
+
+    def __len__(self):
+        return len(self.returns)
+
+    def _with(self, sl, returns):
+        out = SimInputs(self.assets, None if self._dates is None else self._dates[sl],
+                        returns, self.mhi[sl], self.ry_delta[sl])
+        out.origin = self.origin
+        out.offsets = None if self.offsets is None else self.offsets[sl]
+        return out
+
+    def prefix(self, n):
+        """前n周（用来判断新数据是否只是旧数据的延长）"""
+        return self._with(slice(0, n), self.returns[:n])
+
+    def compact(self):
+        """紧凑副本：收益 float32；日期能表示为整周偏移（< 65536 周）时改存 uint16"""
+        out = self._with(slice(None), self.returns.astype(np.float32))
+        if self._dates is not None and len(self._dates):
+            ns = np.asarray(self._dates.asi8)
+            weeks = (ns - ns[0]) // WEEK_NS
+            if (weeks * WEEK_NS == ns - ns[0]).all() and weeks[-1] < 2**16:
+                out._dates, out.origin, out.offsets = None, int(ns[0]), weeks.astype(np.uint16)
+        return out
+
+    def nbytes(self):
+        dates = self.offsets.nbytes if self._dates is None else self._dates.asi8.nbytes
+        return dates + self.returns.nbytes + self.mhi.nbytes + self.ry_delta.nbytes
+
+@profiling.timed("prepare_inputs")
+def prepare_inputs(price_w, mhi, ry_w=None, assets=None, compact=None):
+    """build_mhi() 的输出 -> SimInputs；price_w 的列即资产（任意个数）
+    compact=True（或环境变量 MHI_COMPACT=1）得到紧凑模式的输入"""
+    assets = assets or AssetIndex(list(price_w.columns))
+    price_w = price_w.loc[mhi.index]
+    px = price_w[list(assets.risky)].to_numpy(dtype=float)
+    R = np.zeros((len(px), len(assets)))
+    R[1:, :-1] = px[1:] / px[:-1] - 1
+    if ry_w is not None and mw.USE_REAL_YIELD_TILT:
+        ry_delta = (ry_w - ry_w.shift(4)).reindex(price_w.index).to_numpy(dtype=float)
+    else:
+        ry_delta = np.full(len(px), np.nan)
+    inputs = SimInputs(assets, price_w.index, R, mhi.to_numpy(dtype=float), ry_delta)
+    return inputs.compact() if (COMPACT if compact is None else compact) else inputs
+
+class RebalanceEvent:
+    __slots__ = ("week_index", "date", "mhi", "bucket", "trading_cost", "old_weights", "new_weights")
+
+    def __init__(self, week_index, date, mhi, bucket, trading_cost, old_weights, new_weights):
+        self.week_index = week_index
+        self.date = date
+        self.mhi = mhi
+        self.bucket = bucket
+        self.trading_cost = trading_cost
+        self.old_weights = old_weights   # 向量，按 assets 顺序
+        self.new_weights = new_weights
+
+class SimResult:
+    """网格模拟结果；所有数组第一维是网格点 g，第二维是从 start 开始的周"""
+    __slots__ = ("inputs", "low", "high", "start", "codes", "rebal", "targets", "held", "costs", "net", "after", "state")
+
+    def __init__(self, inputs, low, high, start, codes, rebal, targets, held, costs, net, after, state):
+        self.inputs = inputs
+        self.low, self.high = low, high
+        self.start = start        # 第一列对应的周序号（完整模拟为0，续算为上次的T）
+        self.codes = codes        # (G, T) int8 分档
+        self.rebal = rebal        # (G, T) bool 当周是否调仓
+        self.targets = targets    # (G, T, N) 当周的目标权重（已拨杆）
+        self.held = held          # (G, T, N) 第t周实际持有的权重
+        self.costs = costs        # (G, T) 当周交易成本
+        self.net = net            # (G, T) 当周净收益（第0周为0）
+        self.after = after        # (G, N) 最后一周之后持有的权重（续算的起点）
+        self.state = state        # SimState：模拟结束时的检查点，可用于续算
+
+    @property
+    def rebalance_count(self):
+        return self.rebal.sum(axis=1)
+
+    @property
+    def total_costs(self):
+        return self.costs.sum(axis=1)
+
+    @property
+    def period_returns(self):
+        """参与指标计算的收益（完整模拟时去掉第0周）"""
+        return self.net[:, 1:] if self.start == 0 else self.net
+
+    def returns_series(self, g=0):
+        skip = 1 if self.start == 0 else 0
+        return pd.Series(self.net[g, skip:], index=self.inputs.dates[self.start + skip:])
+
+    def events(self, g=0):
+        out = []
+        for k in np.flatnonzero(self.rebal[g]):
+            i = self.start + int(k)
+            new = self.held[g, k + 1] if k + 1 < self.held.shape[1] else self.after[g]   # 实际成交后的权重
+            out.append(RebalanceEvent(i, self.inputs.dates[i], float(self.inputs.mhi[i]),
+                                      BUCKET_NAMES[self.codes[g, k]], float(self.costs[g, k]),
+                                      self.held[g, k], new))
+        return out
+
+class SimState:
+    """模拟终点的检查点（每个网格点一行）：持仓、净值、回撤峰值、近期分档、累计成本与流式统计量"""
+    __slots__ = ("t", "low", "high", "weights", "value", "peak", "max_dd", "recent_codes",
+                 "costs", "rebalances", "n", "mean", "m2")
+
+    def __init__(self, t, low, high, weights, value, peak, max_dd, recent_codes, costs, rebalances, n, mean, m2):
+        self.t = t                        # 已处理的周数
+        self.low, self.high = low, high   # (G,)
+        self.weights = weights            # (G, N) 下一周持有的权重
+        self.value = value                # (G,) 净值（起点为1）
+        self.peak = peak                  # (G,) 净值历史最高
+        self.max_dd = max_dd              # (G,) 迄今最大回撤
+        self.recent_codes = recent_codes  # (G, max(CONFIRM_LAGS)) 最近几周的分档，用于确认
+        self.costs = costs                # (G,) 累计交易成本
+        self.rebalances = rebalances      # (G,) 累计调仓次数
+        self.n, self.mean, self.m2 = n, mean, m2   # 周收益的 Welford 统计量
+
+    def take(self, rows):
+        """取部分网格点"""
+        return SimState(self.t, *(getattr(self, k)[rows] for k in self.__slots__[1:-3]),
+                        self.n, self.mean[rows], self.m2[rows])
+
+def _advance_state(prev, res, codes_all):
+    """把一段新模拟并入检查点（流式更新净值/回撤/均值方差）"""
+    r = res.period_returns.astype(np.float64, copy=False)   # 紧凑模式下累计量仍用 float64
+    G, k = r.shape
+    eq = prev.value[:, None] * np.cumprod(1 + r, axis=1)
+    peaks = np.maximum(prev.peak[:, None], np.maximum.accumulate(eq, axis=1))
+    mean_b = r.mean(axis=1) if k else np.zeros(G)
+    m2_b = ((r - mean_b[:, None]) ** 2).sum(axis=1)
+    n = prev.n + k
+    delta = mean_b - prev.mean
+    mean = prev.mean + delta * k / n if n else prev.mean
+    m2 = prev.m2 + m2_b + delta ** 2 * prev.n * k / n if n else prev.m2
+    return SimState(len(res.inputs), prev.low, prev.high, res.after,
+                    eq[:, -1] if k else prev.value, peaks[:, -1] if k else prev.peak,
+                    np.minimum(prev.max_dd, (eq / peaks - 1).min(axis=1)) if k else prev.max_dd,
+                    codes_all[:, -max(CONFIRM_LAGS):], prev.costs + res.total_costs,
+                    prev.rebalances + res.rebalance_count, n, mean, m2)
+
+def confirmed_mask(codes):
+    """codes (G, T) -> 当周前3个检查点分档是否一致"""
+    G, T = codes.shape
+    conf = np.zeros((G, T), dtype=bool)
+    m = max(CONFIRM_LAGS)
+    if T > m:
+        lagged = [codes[:, m - lag:T - lag] for lag in CONFIRM_LAGS]
+        conf[:, m:] = np.logical_and.reduce([lagged[0] == x for x in lagged[1:]])
+    return conf
+
+def _drift(returns, signal, targets, init, bands, cost_model):
+    """漂移持仓：按调仓信号所在的周分段，段内持仓 = 段首权重 × 资产累计增长（归一），
+    只在信号周逐个判断舒适区间/最小变动；循环次数 = 有信号的周数（≤ T/CHECK_EVERY），每步处理整个网格"""
+    G, T, N = targets.shape
+    growth = 1 + returns.astype(np.float64, copy=False)
+    held = np.empty((G, T, N), dtype=targets.dtype)
+    traded = np.zeros((G, T), dtype=bool)
+    costs = np.zeros((G, T), dtype=targets.dtype)
+    w = np.array(init, dtype=np.float64)
+    seg = 0
+    for e in list(np.flatnonzero(signal.any(axis=0))) + [T]:
+        if seg == T:                                     # 最后一周就是信号周：w 已是成交后的权重
+            break
+        n = min(e + 1, T) - seg                          # 本段 seg..e（含信号周本身）
+        cum = np.ones((n, N))
+        np.cumprod(growth[seg:seg + n - 1], axis=0, out=cum[1:])
+        path = w[:, None, :] * cum[None]
+        held[:, seg:seg + n] = path / path.sum(axis=2, keepdims=True)
+        drifted = held[:, min(e, T - 1)].astype(np.float64) * growth[min(e, T - 1)]
+        w = drifted / drifted.sum(axis=1, keepdims=True)  # 周末（当周涨跌之后）的权重 = 不交易时下一周的权重
+        if e == T:
+            break
+        # 信号周的周末成交：偏离、成本与不交易资产的权重都以漂移后的 w 为准
+        tgt = targets[:, e].astype(np.float64)
+        gap = np.abs(tgt[:, :-1] - w[:, :-1])
+        move = signal[:, e:e + 1] & (gap >= bands.min_change) & (gap.max(axis=1, keepdims=True) > bands.comfort)
+        hit = move.any(axis=1)
+        if hit.any():
+            new = w.copy()
+            new[:, :-1] = np.where(move, tgt[:, :-1], w[:, :-1])
+            new[:, -1] = 1 - new[:, :-1].sum(axis=1)     # 现金为余数
+            traded[:, e] = hit
+            costs[:, e] = np.where(hit, cost_model.cost(w, new), 0.0)
+            w = np.where(hit[:, None], new, w)           # 调仓当周按旧权重计收益，下一周起按新权重
+        seg = e + 1
+    return held, traded, costs, w
+
+def _run(inputs, lows, highs, cost_model, table, init, start=0, prev_codes=None, drift=None, vol_target=None):
+    """模拟第 start..T-1 周；init 为 start 周持有的权重 (N,) 或 (G, N)，prev_codes 为 start 之前的分档
+    drift：None 为固定权重；DriftBands 为漂移持仓 + 调仓带
+    vol_target：None 不缩放；否则持仓逐周按目标波动缩放，成本按每周的实际换手计"""
+    G, T = len(lows), len(inputs)
+    codes = bucket_codes(inputs.mhi[start:], lows, highs).reshape(G, T - start)
+    codes_all = codes if prev_codes is None else np.concatenate([prev_codes, codes], axis=1)
+    off = codes_all.shape[1] - codes.shape[1]
+    idx = np.arange(start, T)
+    check = (idx % CHECK_EVERY == 0) & (idx >= WARMUP)
+    rebal = check & confirmed_mask(codes_all)[:, off:] & (codes != NEUTRAL)
+    dtype = inputs.returns.dtype
+    targets = apply_real_yield_tilt_array(table.matrix.astype(dtype, copy=False)[codes], inputs.ry_delta[start:], inputs.assets)
+
+    if drift is not None and vol_target is not None:
+        raise ValueError("vol_target is only supported with fixed weights (drift=None)")
+    if drift is not None:
+        held, rebal, costs, after = _drift(inputs.returns[start:], rebal, targets,
+                                           np.broadcast_to(init, (G, targets.shape[-1])), drift, cost_model)
+        net = np.einsum("gtn,tn->gt", held, inputs.returns[start:]) - costs
+        return SimResult(inputs, lows, highs, start, codes, rebal, targets, held, costs, net, after, None), codes_all
+
+    # 第t周持有的 = t之前最后一次调仓的目标；这一段里还没调过仓则为 init
+    pos = np.arange(T - start, dtype=np.int32)
+    last = np.maximum.accumulate(np.where(rebal, pos, np.int32(-1)), axis=1)
+    src = np.concatenate([np.full((G, 1), -1, dtype=np.int32), last[:, :-1]], axis=1)
+    init = np.broadcast_to(np.asarray(init, dtype=dtype), (G, targets.shape[-1]))[:, None, :]
+    held = np.where((src >= 0)[..., None], targets[np.arange(G)[:, None], np.maximum(src, 0)], init)
+
+    after = np.where(rebal[:, -1:], targets[:, -1], held[:, -1])
+    if vol_target is not None:
+        from vol_target import overlay
+        held, costs, after = overlay(inputs.returns, held, after, vol_target, cost_model, start)
+    else:
+        costs = np.where(rebal, cost_model.cost(held, targets), dtype.type(0))
+    gross = np.einsum("gtn,tn->gt", held, inputs.returns[start:])
+    net = gross - costs
+    return SimResult(inputs, lows, highs, start, codes, rebal, targets, held, costs, net, after, None), codes_all
+
+def simulate_grid(inputs, lows, highs, cost_model=NO_COSTS, table=None, initial=None, drift=None, vol_target=None):
+    """对 (lows[g], highs[g]) 网格一次性模拟；返回 SimResult（含终点检查点 .state）
+    drift=DriftBands(...) 时持仓在调仓之间随价格漂移（见 _drift）
+    vol_target=0.10 或 (G,) 数组（NaN 表示该点不缩放）时叠加波动率目标层；这样的结果不能再 extend_grid 续算"""
+    table = table or default_table(inputs.assets)
+    # 初始持仓默认取中性档（即 BASE_WEIGHTS）
+    init = inputs.assets.vector(initial) if initial else table.row(NEUTRAL)
+    lows, highs = np.atleast_1d(np.asarray(lows, dtype=float)), np.atleast_1d(np.asarray(highs, dtype=float))
+    lows, highs = np.broadcast_arrays(lows, highs)
+    G = len(lows)
+    if vol_target is not None:
+        vol_target = np.broadcast_to(np.asarray(vol_target, dtype=float), (G,))
+    profiling.count("sim.points", G)
+    profiling.count("sim.point_weeks", G * len(inputs))
+    with profiling.span("simulate_grid", points=G, weeks=len(inputs)):
+        res, codes_all = _run(inputs, lows, highs, cost_model, table, init, drift=drift, vol_target=vol_target)
+    empty = SimState(0, lows, highs, None, np.ones(G), np.zeros(G), np.zeros(G), None,
+                     np.zeros(G), np.zeros(G, dtype=np.int64), 0, np.zeros(G), np.zeros(G))
+    res.state = _advance_state(empty, res, codes_all)
+    return res
+
+def extend_grid(inputs, state, cost_model=NO_COSTS, table=None, drift=None):
+    """从检查点续算：只处理 state.t 之后新增的周（inputs 必须是上次数据的延长；drift 须与原模拟相同）"""
+    table = table or default_table(inputs.assets)
+    profiling.count("sim.point_weeks", len(state.low) * (len(inputs) - state.t))
+    with profiling.span("extend_grid", points=len(state.low), new_weeks=len(inputs) - state.t):
+        res, codes_all = _run(inputs, state.low, state.high, cost_model, table, state.weights,
+                              start=state.t, prev_codes=state.recent_codes, drift=drift)
+    res.state = _advance_state(state, res, codes_all)
+    return res
+
+def simulate_metrics(inputs, lows, highs, cost_model=NO_COSTS, table=None, chunk_points=2048, on_chunk=None,
+                     drift=None, tail_levels=None, vol_target=None):
+    """只要指标时的分块网格模拟：同一时刻只保留 chunk_points 个点的 (G, T, N) 中间张量
+    返回与 result_cache.METRICS 同名的 (G,) 数组；on_chunk() 每块完成后调用（如心跳）
+    tail_levels=(0.95, ...)：另外返回已实现周收益的 var_95 / cvar_95 …（见 risk.tail_metrics）
+    vol_target：标量或与 lows 等长的数组，阈值 × 目标波动的网格可以一次扫完（见 vol_target.vol_grid）"""
+    lows, highs = np.broadcast_arrays(np.atleast_1d(np.asarray(lows, dtype=float)),
+                                      np.atleast_1d(np.asarray(highs, dtype=float)))
+    if vol_target is not None:
+        vol_target = np.broadcast_to(np.asarray(vol_target, dtype=float), lows.shape)
+    out = {}
+    for c in range(0, len(lows), chunk_points):
+        sl = slice(c, c + chunk_points)
+        res = simulate_grid(inputs, lows[sl], highs[sl], cost_model, table, drift=drift,
+                            vol_target=None if vol_target is None else vol_target[sl])
+        st = res.state
+        cols = {**metrics_from_state(st), "rebalance_count": st.rebalances, "total_costs": st.costs}
+        if tail_levels:
+            import risk
+            cols.update(risk.tail_metrics(res.period_returns, tail_levels))
+        for k, v in cols.items():
+            out.setdefault(k, np.zeros(len(lows)))[sl] = v
+        if on_chunk is not None:
+            on_chunk()
+    return out
+
+def metrics_from_state(state, periods_per_year=52):
+    """由检查点的流式统计量直接得到与 metrics_array 相同的指标"""
+    total = state.value - 1
+    years = state.n / periods_per_year
+    annual = (1 + total) ** (1 / years) - 1 if years > 0 else np.zeros_like(total)
+    var = state.m2 / (state.n - 1) if state.n > 1 else np.zeros_like(total)
+    vol = np.sqrt(np.maximum(var, 0)) * np.sqrt(periods_per_year)
+    sharpe = np.divide(annual, vol, out=np.zeros_like(vol), where=vol > 0)
+    return {"total_return": total, "annual_return": annual, "annual_vol": vol, "sharpe": sharpe, "max_dd": state.max_dd}
+
+def simulate(inputs, low=mw.LOW_THRESHOLD, high=mw.HIGH_THRESHOLD, cost_model=NO_COSTS, table=None, initial=None,
+             drift=None, vol_target=None):
+    """单组阈值的模拟（网格大小为1）"""
+    return simulate_grid(inputs, [low], [high], cost_model, table, initial, drift, vol_target)
+
+def metrics_array(returns, periods_per_year=52):
+    """与各脚本 calculate_metrics 同口径的向量化版本；returns (G, T) -> 每个指标一个 (G,) 数组"""
+    r = np.atleast_2d(returns)
+    eq = np.cumprod(1 + r, axis=1)
+    total = eq[:, -1] - 1
+    years = r.shape[1] / periods_per_year
+    annual = (1 + total) ** (1 / years) - 1 if years > 0 else np.zeros(len(r))
+    vol = r.std(axis=1, ddof=1) * np.sqrt(periods_per_year)
+    sharpe = np.divide(annual, vol, out=np.zeros_like(vol), where=vol > 0)
+    max_dd = (eq / np.maximum.accumulate(eq, axis=1) - 1).min(axis=1)
+    return {"total_return": total, "annual_return": annual, "annual_vol": vol, "sharpe": sharpe, "max_dd": max_dd}
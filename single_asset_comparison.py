@@ -3,7 +3,9 @@
 
 import pandas as pd
 import numpy as np
-from mhi_weekly import build_mhi
+from mhi_weekly import build_mhi, BASE_WEIGHTS
+import profiling
+from simulator import prepare_inputs
 
 def calculate_asset_metrics(price_series, asset_name):
     """计算单一资产的收益指标"""
@@ -169,15 +171,8 @@ def compare_with_single_assets():
     print(f"\n=== Base Weight Buy & Hold Comparison ===")
     
     # 基础权重: SPY 35%, GLD 45%, BTC 10%, CASH 10%
-    base_weight_returns = []
-    for i in range(1, len(price_w)):
-        spy_ret = price_w['SPY'].iloc[i] / price_w['SPY'].iloc[i-1] - 1
-        gld_ret = price_w['GLD'].iloc[i] / price_w['GLD'].iloc[i-1] - 1
-        btc_ret = price_w['BTC'].iloc[i] / price_w['BTC'].iloc[i-1] - 1
-        
-        portfolio_ret = 0.35 * spy_ret + 0.45 * gld_ret + 0.10 * btc_ret
-        # 10%现金收益为0
-        base_weight_returns.append(portfolio_ret)
+    inputs = prepare_inputs(price_w, mhi, ry_w)
+    base_weight_returns = (inputs.returns @ inputs.assets.vector(BASE_WEIGHTS))[1:]   # 10%现金收益为0
     
     base_weight_series = pd.Series(base_weight_returns, index=price_w.index[1:])
     base_weight_perf = calculate_asset_metrics(pd.Series((1 + base_weight_series).cumprod(), index=base_weight_series.index), 'Base Weight Buy&Hold')
@@ -200,4 +195,5 @@ def compare_with_single_assets():
         print(f"Strategy fails to beat buy & hold")
 
 if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
     compare_with_single_assets()
\ No newline at end of file
@@ -0,0 +1,227 @@
+# snapshot.py
+# 可移植的研究快照：把 build_mhi 的结果（对齐后的周线价格、MHI 及其各分量、真实利率/高收益利差周线）、
+# 配置常量与可选的扫参结果固化成一个目录，换一台机器也能得到完全相同的输入。
+#
+#   <快照目录>/manifest.json      格式/版本、数据来源、配置常量、各数组的 dtype/shape/sha256、列名
+#   <快照目录>/<数组名>.npy        每个数组一个 .npy（npz 成员无法内存映射），读取时 mmap，不复制
+#
+# 设置 MHI_SNAPSHOT=<快照目录> 后 mhi_weekly.build_mhi 直接读快照——所有从 build_mhi 取数的脚本
+# 都不再下载、不再重算（日线 OHLC、多区域面板等不经 build_mhi 的数据不在快照里）。
+#
+# 用法:
+#   python snapshot.py save research.mhisnap                     # 当前数据源 -> 快照
+#   python snapshot.py save research.mhisnap --sweep --step 0.05 # 顺带保存一次阈值扫参的结果
+#   python snapshot.py info research.mhisnap [--verify]
+#   MHI_SNAPSHOT=research.mhisnap python threshold_optimization.py
+
+import os, json, shutil, hashlib, argparse, datetime as dt
+import numpy as np
+import pandas as pd
+import mhi_weekly as mw
+import data_provider
+import profiling
+
+FORMAT = "mhi-snapshot"
+VERSION = 1
+MANIFEST = "manifest.json"
+CONFIG_KEYS = ("START", "BASE_WEIGHTS", "LOW_MHI_WEI", "HIGH_MHI_WEI", "LOW_THRESHOLD", "HIGH_THRESHOLD",
+               "CASH_MAX", "MIN_CHANGE", "CONFIRM_WEEKS", "COMFORT_ZONE", "COMMISSION",
+               "USE_REAL_YIELD_TILT", "USE_HY_OAS_IN_MHI", "FRED_POINT_IN_TIME", "TICKERS_YF")
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _provider_info():
+    """数据来源；合成后端记下全部参数（结束日期解析成具体日期），可据此重新生成"""
+    p = data_provider.get_provider()
+    info = {"name": p.name}
+    if p.name == "synthetic":
+        info.update(seed=p.seed, years=p.years, end=p.end_date().date().isoformat(), extra_sectors=p.extra_sectors)
+    return info
+
+@profiling.timed("snapshot.capture")
+def capture():
+    """按 build_mhi 的口径取数并计算，额外保留 MHI 各分量与高收益利差周线"""
+    sectors = data_provider.get_provider().sectors(mw.SECTORS)
+    px = mw.dl_yf(list(mw.TICKERS_YF.values()) + sectors)
+    ry_w, oas_w = mw.load_fred_series()
+    price_w, mhi, ry_w = mw.compute_mhi(px, ry_w, oas_w, sectors)
+    components = mw.mhi_components(mw.weekly_last(px), oas_w, sectors).loc[mhi.index]
+    return {"price_w": price_w, "mhi": mhi, "components": components, "ry_w": ry_w, "oas_w": oas_w,
+            "sectors": list(sectors)}
+
+@profiling.timed("snapshot.save")
+def save(path, data, sweep=None):
+    """data: capture() 的结果；sweep: sweep_runner.run_sweep 的结果（可选）。写临时目录后整体替换"""
+    from simulator import prepare_inputs
+    from result_cache import data_version
+    price_w, mhi, ry_w, oas_w = data["price_w"], data["mhi"], data["ry_w"], data["oas_w"]
+    arrays = {"weeks": price_w.index.values.astype("datetime64[ns]"),
+              "prices": np.ascontiguousarray(price_w.to_numpy(dtype=float)),
+              "mhi": mhi.to_numpy(dtype=float),
+              "components": np.ascontiguousarray(data["components"].to_numpy(dtype=float))}
+    for name, s in (("real_yield", ry_w), ("hy_oas", oas_w)):
+        if s is not None:
+            arrays[name + ".dates"] = s.index.values.astype("datetime64[ns]")
+            arrays[name] = s.to_numpy(dtype=float)
+    sweep_cols = []
+    if sweep is not None:
+        sweep_cols = [k for k, v in sweep.items() if isinstance(v, np.ndarray)]
+        arrays.update({"sweep." + k: sweep[k] for k in sweep_cols})
+
+    tmp = path.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    meta = {}
+    for name, a in arrays.items():
+        f = os.path.join(tmp, name + ".npy")
+        np.save(f, a, allow_pickle=False)
+        meta[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "sha256": _sha256(f)}
+    manifest = {
+        "format": FORMAT, "version": VERSION,
+        "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "provider": _provider_info(),
+        "data_version": data_version(prepare_inputs(price_w, mhi, ry_w)),
+        "config": {**{k: getattr(mw, k) for k in CONFIG_KEYS}, "SECTORS": data["sectors"]},
+        "columns": {"prices": list(price_w.columns), "components": list(data["components"].columns)},
+        "sweep": {"columns": sweep_cols, "points": len(sweep[sweep_cols[0]])} if sweep_cols else None,
+        "arrays": meta,
+    }
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1)
+    old = path.rstrip("/") + ".old"
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+class Snapshot:
+    """只读快照；数组按需以 mmap 打开并缓存"""
+    __slots__ = ("path", "manifest", "mmap", "_arrays")
+
+    def __init__(self, path, manifest, mmap=True):
+        self.path = path
+        self.manifest = manifest
+        self.mmap = mmap
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path} is not an MHI snapshot")
+        if manifest.get("version", 0) > VERSION:
+            raise ValueError(f"snapshot version {manifest['version']} is newer than supported ({VERSION})")
+        return cls(path, manifest, mmap)
+
+    def __contains__(self, name):
+        return name in self.manifest["arrays"]
+
+    def array(self, name):
+        if name not in self._arrays:
+            if name not in self:
+                raise KeyError(f"snapshot has no array {name!r}")
+            self._arrays[name] = np.load(os.path.join(self.path, name + ".npy"),
+                                         mmap_mode="r" if self.mmap else None, allow_pickle=False)
+            profiling.count("snapshot.bytes", self._arrays[name].nbytes)
+        return self._arrays[name]
+
+    def _series(self, name, index_name, label):
+        if name not in self:
+            return None
+        return pd.Series(self.array(name), index=pd.DatetimeIndex(self.array(index_name)), name=label, copy=False)
+
+    @property
+    def weeks(self):
+        return pd.DatetimeIndex(self.array("weeks"))
+
+    @profiling.timed("snapshot.mhi_data")
+    def mhi_data(self):
+        """与 build_mhi 相同的 (price_w, mhi, ry_w)；价格与 MHI 直接引用 mmap 数组"""
+        weeks = self.weeks
+        price_w = pd.DataFrame(self.array("prices"), index=weeks, columns=self.manifest["columns"]["prices"], copy=False)
+        mhi = pd.Series(self.array("mhi"), index=weeks, name="MHI", copy=False)
+        return price_w, mhi, self._series("real_yield", "real_yield.dates", "real_yield")
+
+    def components(self):
+        return pd.DataFrame(self.array("components"), index=self.weeks,
+                            columns=self.manifest["columns"]["components"], copy=False)
+
+    def hy_oas(self):
+        return self._series("hy_oas", "hy_oas.dates", "hy_oas")
+
+    def sweep(self):
+        """保存时附带的扫参结果（列数组 dict，同 sweep_runner.run_sweep）；没有则 None"""
+        info = self.manifest.get("sweep")
+        return None if not info else {k: self.array("sweep." + k) for k in info["columns"]}
+
+    def config_diff(self):
+        """快照里的配置常量与当前 mhi_weekly 不同的项：{名称: (快照值, 当前值)}"""
+        cfg = self.manifest["config"]
+        current = json.loads(json.dumps({k: getattr(mw, k) for k in CONFIG_KEYS}))   # 与 JSON 往返后的类型比较
+        return {k: (cfg.get(k), v) for k, v in current.items() if cfg.get(k) != v}
+
+    def verify(self):
+        """校验各数组文件的 sha256；返回不一致的数组名"""
+        return [name for name, meta in self.manifest["arrays"].items()
+                if _sha256(os.path.join(self.path, name + ".npy")) != meta["sha256"]]
+
+def load(path, mmap=True):
+    """打开快照；配置常量与当前代码不一致时提示（结果仍按当前代码的常量计算）"""
+    snap = Snapshot.open(path, mmap)
+    diff = snap.config_diff()
+    if diff:
+        print(f"[WARN] snapshot {path} was built with different settings: {', '.join(sorted(diff))}")
+    return snap
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Portable snapshots of the MHI pipeline state")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("save")
+    s.add_argument("path")
+    s.add_argument("--sweep", action="store_true", help="also run and store a threshold sweep")
+    s.add_argument("--step", type=float, default=0.05)
+    s.add_argument("--costs", default="total,commission_spread")
+    i = sub.add_parser("info")
+    i.add_argument("path")
+    i.add_argument("--verify", action="store_true", help="check the sha256 of every array")
+    args = p.parse_args(argv)
+
+    if args.cmd == "save":
+        data = capture()
+        sweep = None
+        if args.sweep:
+            from simulator import prepare_inputs
+            from sweep_runner import run_sweep, threshold_axis, COST_MODELS
+            inputs = prepare_inputs(data["price_w"], data["mhi"], data["ry_w"])
+            sweep = run_sweep(inputs, threshold_axis(-3.0, -0.5, args.step), threshold_axis(0.5, 3.0, args.step),
+                              [COST_MODELS[c] for c in args.costs.split(",")])
+        save(args.path, data, sweep)
+        print(f"Snapshot written to {args.path} ({len(data['mhi'])} weeks"
+              + (f", {len(sweep['low'])} sweep points)" if sweep is not None else ")"))
+    elif args.cmd == "info":
+        snap = Snapshot.open(args.path)
+        m = snap.manifest
+        weeks = snap.weeks
+        size = sum(np.prod(a["shape"], dtype=np.int64) * np.dtype(a["dtype"]).itemsize for a in m["arrays"].values())
+        print(f"{args.path}: {m['format']} v{m['version']}, created {m['created_at']}, provider {m['provider']}")
+        print(f"  {len(weeks)} weeks {weeks[0].date()} .. {weeks[-1].date()}, assets {m['columns']['prices']}, "
+              f"components {m['columns']['components']}")
+        print(f"  data version {m['data_version']}, {len(m['arrays'])} arrays, {size / 2**20:.2f} MB")
+        if m.get("sweep"):
+            print(f"  sweep: {m['sweep']['points']} points, columns {m['sweep']['columns']}")
+        for k, (old, cur) in snap.config_diff().items():
+            print(f"  config {k}: snapshot {old!r}, current {cur!r}")
+        if args.verify:
+            bad = snap.verify()
+            print("  checksums OK" if not bad else f"  checksum mismatch: {bad}")
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
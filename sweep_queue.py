@@ -0,0 +1,334 @@
+# sweep_queue.py
+# 基于共享目录的分布式扫参队列：多台研究机挂同一个文件系统即可协作，不需要任何消息中间件
+#
+#   <队列目录>/job.json             任务描述：成本模型、权重表、分片列表、数据版本
+#   <队列目录>/inputs.npz           共享数据产物（SimInputs 的数组），所有 worker 用同一份
+#   <队列目录>/shards/00012.npz     分片：一组 (low, high) + 成本模型/权重表名称
+#   <队列目录>/claims/00012.lock    认领：O_CREAT|O_EXCL 原子创建，内容为 worker 标识 + 一次性令牌；每批模拟后 touch 作为心跳；
+#                                  心跳与释放前都核对令牌，租约已被接手的 worker 不会续约或删掉新主人的锁
+#   <队列目录>/results/00012.npz    结果分区：写临时文件后 os.replace，存在即表示完成
+# 心跳超过 LEASE_SECONDS 的认领视为失效（worker 崩溃），其他 worker 先原子改名再重新认领。
+#
+# 用法:
+#   python sweep_queue.py submit /shared/q --step 0.01 --costs total,commission_spread [--drift mhi]
+#   python sweep_queue.py work /shared/q                  # 每台机器上跑一个或多个
+#   python sweep_queue.py work /shared/q --procs 4        # 本机起4个 worker 进程
+#   python sweep_queue.py status /shared/q
+#   python sweep_queue.py merge /shared/q [--store sweep_results.sqlite]
+
+import os, json, time, uuid, socket, argparse, itertools
+import numpy as np
+import pandas as pd
+import profiling
+from portfolio import AssetIndex, WeightTable, CostModel, DriftBands, default_table
+from simulator import SimInputs, simulate_metrics
+from result_cache import CHUNK_POINTS, METRICS, data_version, cost_hash, config_hash
+from sweep_runner import COST_MODELS, DRIFT_BANDS, threshold_axis
+
+SHARD_POINTS = 8192          # 每个分片的网格点数
+LEASE_SECONDS = 300.0        # 认领心跳超时（秒），超时后其他 worker 可以接手
+
+def _atomic_savez(path, **arrays):
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+def _atomic_json(path, obj):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp, path)
+
+def save_inputs(inputs, path):
+    _atomic_savez(path, assets=np.array(inputs.assets.names), dates=np.asarray(inputs.dates.asi8),
+                  returns=inputs.returns, mhi=inputs.mhi, ry_delta=inputs.ry_delta)
+
+def load_inputs(path):
+    with np.load(path) as z:
+        return SimInputs(AssetIndex(list(z["assets"])), pd.DatetimeIndex(z["dates"]),
+                         z["returns"], z["mhi"], z["ry_delta"])
+
+def _lock_info(path):
+    """锁文件的 (令牌, 修改时间 ns)；不存在时为 None"""
+    try:
+        with open(path) as f:
+            return f.read(), os.fstat(f.fileno()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class SweepQueue:
+    """一个队列目录；submit 由一台机器执行一次，work/merge 可以在任何挂载了该目录的机器上执行"""
+
+    def __init__(self, root):
+        self.root = root
+        self.shard_dir = os.path.join(root, "shards")
+        self.claim_dir = os.path.join(root, "claims")
+        self.result_dir = os.path.join(root, "results")
+        self._job = None
+        self._tokens = {}        # 本进程持有的认领：分片 -> 写入锁文件的令牌
+
+    # ---------- 提交 ----------
+    def submit(self, inputs, lows, highs, cost_models, tables=None, shard_points=SHARD_POINTS, drift=None):
+        """lows × highs × 成本模型 × 权重表 切成分片写入队列目录；返回分片数（drift 见 simulator._drift）"""
+        tables = tables or {"default": default_table(inputs.assets)}
+        for d in (self.shard_dir, self.claim_dir, self.result_dir):
+            os.makedirs(d, exist_ok=True)
+        if os.path.exists(os.path.join(self.root, "job.json")):
+            raise FileExistsError(f"{self.root} already holds a job")
+        save_inputs(inputs, os.path.join(self.root, "inputs.npz"))
+        pairs = np.array(list(itertools.product(lows, highs)), dtype=float).reshape(-1, 2)
+        shards = []
+        for cm in cost_models:
+            for name in tables:
+                for s in range(0, len(pairs), shard_points):
+                    sid = f"{len(shards):05d}"
+                    part = pairs[s:s + shard_points]
+                    _atomic_savez(os.path.join(self.shard_dir, sid + ".npz"), low=part[:, 0], high=part[:, 1])
+                    shards.append({"id": sid, "cost": cm.name, "table": name, "points": len(part)})
+        job = {
+            "created_at": time.time(),
+            "data_version": data_version(inputs),
+            "cost_models": {cm.name: {"assets": list(cm.assets.names), "rates": cm.rates.tolist(),
+                                      "key": cost_hash(cm)} for cm in cost_models},
+            "tables": {name: {"assets": list(t.assets.names), "matrix": t.matrix.tolist(),
+                              "key": config_hash(t, drift=drift)} for name, t in tables.items()},
+            "drift": None if drift is None else {"name": drift.name, "comfort": drift.comfort,
+                                                 "min_change": drift.min_change},
+            "shards": shards,
+            "total_points": int(sum(s["points"] for s in shards)),
+        }
+        _atomic_json(os.path.join(self.root, "job.json"), job)   # 最后写：job.json 存在即提交完成
+        return len(shards)
+
+    @property
+    def job(self):
+        if self._job is None:
+            with open(os.path.join(self.root, "job.json")) as f:
+                self._job = json.load(f)
+        return self._job
+
+    def _cost_model(self, name):
+        c = self.job["cost_models"][name]
+        return CostModel(name, AssetIndex(c["assets"]), c["rates"])
+
+    def _drift(self):
+        d = self.job.get("drift")
+        return None if d is None else DriftBands(d["name"], d["comfort"], d["min_change"])
+
+    def _table(self, name):
+        t = self.job["tables"][name]
+        return WeightTable(AssetIndex(t["assets"]), t["matrix"])
+
+    def _paths(self, sid):
+        return (os.path.join(self.shard_dir, sid + ".npz"), os.path.join(self.claim_dir, sid + ".lock"),
+                os.path.join(self.result_dir, sid + ".npz"))
+
+    # ---------- 认领 ----------
+    def claim(self, sid, worker):
+        """原子认领一个分片；已完成/他人持有且未过期时返回 False"""
+        _, lock, result = self._paths(sid)
+        if os.path.exists(result):
+            return False
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            seen = _lock_info(lock)
+            if seen is None:
+                return self.claim(sid, worker)      # 刚被释放，重试
+            if time.time() - seen[1] / 1e9 < LEASE_SECONDS:
+                return False
+            # 失效认领：改名只有一个 worker 能成功；但别人可能已先接手并写了新锁，
+            # 改走的若不是刚才看到的那个失效锁，就原样放回并放弃
+            stale = f"{lock}.stale.{worker}"
+            try:
+                os.rename(lock, stale)
+            except FileNotFoundError:
+                return False
+            if _lock_info(stale) != seen:
+                try:
+                    os.link(stale, lock)
+                except FileExistsError:
+                    pass
+                os.remove(stale)
+                return False
+            os.remove(stale)
+            return self.claim(sid, worker)
+        token = f"{worker} {time.time():.0f} {uuid.uuid4().hex}"
+        with os.fdopen(fd, "w") as f:
+            f.write(token + "\n")
+        self._tokens[sid] = token
+        if os.path.exists(result):   # 认领与完成之间的竞态：别人刚写完
+            self.release(sid)
+            return False
+        return True
+
+    def _owns(self, sid):
+        """锁文件里仍是本进程认领时写入的令牌"""
+        try:
+            with open(self._paths(sid)[1]) as f:
+                return sid in self._tokens and f.read().strip() == self._tokens[sid]
+        except FileNotFoundError:
+            return False
+
+    def heartbeat(self, sid):
+        if self._owns(sid):
+            try:
+                os.utime(self._paths(sid)[1])
+            except FileNotFoundError:
+                pass
+
+    def release(self, sid):
+        """只删除自己的锁；租约过期后已被他人接手的锁保持不动"""
+        if self._owns(sid):
+            try:
+                os.remove(self._paths(sid)[1])
+            except FileNotFoundError:
+                pass
+        self._tokens.pop(sid, None)
+
+    # ---------- 执行 ----------
+    @profiling.timed("queue.run_shard")
+    def run_shard(self, sid, inputs, shard):
+        path, _, result = self._paths(sid)
+        with np.load(path) as z:
+            lows, highs = z["low"], z["high"]
+        cm, table = self._cost_model(shard["cost"]), self._table(shard["table"])
+        out = simulate_metrics(inputs, lows, highs, cm, table, CHUNK_POINTS, on_chunk=lambda: self.heartbeat(sid),
+                               drift=self._drift())
+        _atomic_savez(result, low=lows, high=highs, **out)
+        profiling.count("queue.points", len(lows))
+
+    def work(self, worker=None, max_shards=None, poll=0.0, log=print):
+        """拉取并执行分片直到没有可认领的；返回本 worker 完成的分片数
+        poll>0 时，仍有他人持有的未完成分片就每 poll 秒重试一次（用于接手崩溃 worker 的分片）"""
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        inputs = load_inputs(os.path.join(self.root, "inputs.npz"))
+        shards = self.job["shards"]
+        # 各 worker 从不同位置开始扫描，减少认领冲突
+        offset = hash(worker) % max(1, len(shards))
+        order = shards[offset:] + shards[:offset]
+        done = 0
+        while True:
+            progressed = False
+            for shard in order:
+                if max_shards is not None and done >= max_shards:
+                    return done
+                sid = shard["id"]
+                if not self.claim(sid, worker):
+                    continue
+                t0 = time.time()
+                try:
+                    self.run_shard(sid, inputs, shard)
+                finally:
+                    self.release(sid)
+                done += 1
+                progressed = True
+                log(f"[{worker}] shard {sid} ({shard['points']} pts, {shard['cost']}/{shard['table']}) "
+                    f"in {time.time() - t0:.1f}s")
+            s = self.status()
+            if not s["pending"] and (poll <= 0 or not s["running"]):
+                return done
+            if not progressed:
+                if poll <= 0:
+                    return done
+                time.sleep(poll)
+
+    # ---------- 状态与合并 ----------
+    def status(self):
+        shards = self.job["shards"]
+        done = {s["id"] for s in shards if os.path.exists(self._paths(s["id"])[2])}
+        claimed = {s["id"] for s in shards if s["id"] not in done and os.path.exists(self._paths(s["id"])[1])}
+        pending = [s["id"] for s in shards if s["id"] not in done and s["id"] not in claimed]
+        points = sum(s["points"] for s in shards if s["id"] in done)
+        return {"shards": len(shards), "done": len(done), "running": len(claimed), "pending": pending,
+                "points_done": points, "total_points": self.job["total_points"]}
+
+    def merge(self, store=None):
+        """把所有结果分区拼成长表（与 sweep_runner.run_sweep 的返回同列）；可选写入 ResultStore"""
+        shards = self.job["shards"]
+        missing = [s["id"] for s in shards if not os.path.exists(self._paths(s["id"])[2])]
+        if missing:
+            raise RuntimeError(f"{len(missing)} shard(s) not finished yet, e.g. {missing[:5]}")
+        parts = []
+        for s in shards:
+            with np.load(self._paths(s["id"])[2]) as z:
+                n = len(z["low"])
+                parts.append({"cost": np.full(n, s["cost"]), "table": np.full(n, s["table"]),
+                              **{k: z[k] for k in ["low", "high"] + METRICS}})
+        merged = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+        _atomic_savez(os.path.join(self.root, "merged.npz"), **merged)
+        if store is not None:
+            for cost, table in {(s["cost"], s["table"]) for s in shards}:
+                sel = (merged["cost"] == cost) & (merged["table"] == table)
+                scope = (self.job["data_version"], self.job["cost_models"][cost]["key"], self.job["tables"][table]["key"])
+                store.write_points(scope, merged["low"][sel], merged["high"][sel], {m: merged[m][sel] for m in METRICS})
+        return merged
+
+def _work_process(root, worker, poll):
+    SweepQueue(root).work(worker, poll=poll)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Shared-directory work queue for threshold sweeps")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("submit")
+    s.add_argument("queue")
+    s.add_argument("--step", type=float, default=0.05)
+    s.add_argument("--low-range", type=float, nargs=2, default=(-3.0, -0.5))
+    s.add_argument("--high-range", type=float, nargs=2, default=(0.5, 3.0))
+    s.add_argument("--costs", default="total,commission_spread")
+    s.add_argument("--shard-points", type=int, default=SHARD_POINTS)
+    s.add_argument("--drift", choices=sorted(DRIFT_BANDS), default=None)
+    w = sub.add_parser("work")
+    w.add_argument("queue")
+    w.add_argument("--procs", type=int, default=1)
+    w.add_argument("--poll", type=float, default=0.0, help="wait for shards held by others, retrying every N seconds")
+    st = sub.add_parser("status")
+    st.add_argument("queue")
+    m = sub.add_parser("merge")
+    m.add_argument("queue")
+    m.add_argument("--store", default=None, help="also write points into this ResultStore SQLite file")
+    args = p.parse_args(argv)
+    q = SweepQueue(args.queue)
+
+    if args.cmd == "submit":
+        from mhi_weekly import build_mhi
+        from simulator import prepare_inputs
+        inputs = prepare_inputs(*build_mhi())
+        lows = threshold_axis(*args.low_range, args.step)
+        highs = threshold_axis(*args.high_range, args.step)
+        n = q.submit(inputs, lows, highs, [COST_MODELS[c] for c in args.costs.split(",")],
+                     shard_points=args.shard_points, drift=DRIFT_BANDS.get(args.drift))
+        print(f"Submitted {q.job['total_points']} points in {n} shards to {args.queue}")
+    elif args.cmd == "work":
+        t0 = time.time()
+        if args.procs > 1:
+            import multiprocessing as mp
+            procs = [mp.Process(target=_work_process, args=(args.queue, f"{socket.gethostname()}:{os.getpid()}-{i}", args.poll))
+                     for i in range(args.procs)]
+            for pr in procs:
+                pr.start()
+            for pr in procs:
+                pr.join()
+        else:
+            q.work(poll=args.poll)
+        s = q.status()
+        print(f"{s['done']}/{s['shards']} shards done ({s['points_done']}/{s['total_points']} points), "
+              f"{time.time() - t0:.1f}s")
+    elif args.cmd == "status":
+        s = q.status()
+        print(f"Shards: {s['done']} done, {s['running']} running, {len(s['pending'])} pending "
+              f"({s['points_done']}/{s['total_points']} points)")
+    elif args.cmd == "merge":
+        store = None
+        if args.store:
+            from result_store import ResultStore
+            store = ResultStore(args.store)
+        merged = q.merge(store)
+        print(f"Merged {len(merged['low'])} points into {os.path.join(args.queue, 'merged.npz')}")
+        if store is not None:
+            store.close()
+            print(f"Points written to {args.store}")
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -0,0 +1,195 @@
+# sweep_runner.py
+# 长扫参编排：阈值网格 × 成本模型 × 权重表，逐批模拟并定期落盘（检查点即 result_cache 的磁盘缓存），
+# 汇报吞吐（点/秒）与预计剩余时间；Ctrl-C 时在当前批结束后保存并退出，重跑同一命令即从断点继续。
+#
+# 用法:
+#   python sweep_runner.py                                  # 默认: 0.05 步长的阈值网格 × 两种成本模型
+#   python sweep_runner.py --step 0.01 --costs total,commission_spread,none
+#   python sweep_runner.py --drift mhi                       # 持仓漂移 + COMFORT_ZONE/MIN_CHANGE 调仓带
+#   （Ctrl-C 一次：保存后退出；再按一次：立即中止，只丢失当前这一批）
+
+import sys, time, signal, argparse, itertools
+import numpy as np
+import profiling
+from portfolio import NO_COSTS, TOTAL_COSTS, COMMISSION_SPREAD_COSTS, MHI_BANDS, FULL_REBALANCE, default_table
+from result_cache import cached_sweep, CACHE_DIR, CACHE_MAX_BYTES, METRICS
+from risk import tail_metrics, level_key
+
+COST_MODELS = {m.name: m for m in (NO_COSTS, TOTAL_COSTS, COMMISSION_SPREAD_COSTS)}
+DRIFT_BANDS = {b.name: b for b in (MHI_BANDS, FULL_REBALANCE)}
+
+class SweepInterrupted(Exception):
+    """扫参被取消；已完成的点已经落盘"""
+
+    def __init__(self, done, total):
+        super().__init__(f"sweep interrupted after {done}/{total} points")
+        self.done = done
+        self.total = total
+
+class SweepProgress:
+    """进度/吞吐/ETA；吞吐只统计实际模拟的点（缓存命中不计入速度）"""
+
+    def __init__(self, total, label="Sweep", stream=None, every=1.0):
+        self.total = total
+        self.label = label
+        self.stream = stream or sys.stderr
+        self.every = every
+        self.done = 0
+        self.computed = 0
+        self.cancelled = False
+        self.t0 = time.time()
+        self._last = 0.0
+
+    def advance(self, n, computed=True):
+        if not n:
+            return
+        self.done += n
+        if computed:
+            self.computed += n
+        now = time.time()
+        if now - self._last >= self.every or self.done >= self.total:
+            self._last = now
+            self._print()
+
+    def rate(self):
+        elapsed = time.time() - self.t0
+        return self.computed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        rate = self.rate()
+        return (self.total - self.done) / rate if rate > 0 else None
+
+    def _print(self):
+        eta = self.eta()
+        eta_s = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "--:--:--"
+        pct = self.done / self.total if self.total else 1.0
+        end = "\n" if self.done >= self.total else ""
+        print(f"\r{self.label}: {self.done}/{self.total} ({pct:.1%}) | {self.rate():,.0f} pts/s | ETA {eta_s}",
+              end=end, file=self.stream, flush=True)
+
+    def finish(self):
+        if self.done < self.total:
+            print(file=self.stream)
+        return time.time() - self.t0
+
+class graceful_interrupt:
+    """第一次 SIGINT 只置位 progress.cancelled（当前批完成后停止并保存），第二次恢复默认行为立即中断"""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self._old = None
+
+    def _handler(self, signum, frame):
+        if self.progress.cancelled:
+            signal.signal(signal.SIGINT, self._old or signal.default_int_handler)
+            raise KeyboardInterrupt
+        self.progress.cancelled = True
+        print("\nInterrupt received, finishing current batch and saving... (Ctrl-C again to abort)",
+              file=self.progress.stream, flush=True)
+
+    def __enter__(self):
+        try:
+            self._old = signal.signal(signal.SIGINT, self._handler)
+        except ValueError:   # 非主线程不能装信号处理器
+            self._old = None
+        return self.progress
+
+    def __exit__(self, *exc):
+        if self._old is not None:
+            signal.signal(signal.SIGINT, self._old)
+        return False
+
+@profiling.timed("run_sweep")
+def run_sweep(inputs, lows, highs, cost_models=(COMMISSION_SPREAD_COSTS,), tables=None,
+              cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, on_chunk=None, label="Sweep", drift=None,
+              tail_levels=None):
+    """lows × highs 的全组合，对每个 (成本模型, 权重表) 各扫一遍；返回长表（每个点一行的列数组）
+    tables: {名称: WeightTable}，默认只有 mhi_weekly 的三档权重
+    on_chunk(cost_model, table_name, res)：每批新模拟结果的回调
+    drift：DriftBands 时用漂移持仓模拟（见 simulator._drift）
+    tail_levels=(0.95, ...)：另加 var_95 / cvar_95 … 列，由缓存里的权益曲线算出（命中的点也不用重新模拟）
+    中断时抛出 SweepInterrupted（已完成的点在缓存里，重跑即续算）"""
+    tables = tables or {"default": default_table(inputs.assets)}
+    pairs = np.array(list(itertools.product(lows, highs)), dtype=float).reshape(-1, 2)
+    combos = [(cm, name, tbl) for cm in cost_models for name, tbl in tables.items()]
+    progress = SweepProgress(len(pairs) * len(combos), label)
+    parts = []
+    hits = misses = 0
+    with graceful_interrupt(progress):
+        for cm, name, tbl in combos:
+            cb = None if on_chunk is None else (lambda res, cm=cm, name=name: on_chunk(cm, name, res))
+            out = cached_sweep(inputs, pairs[:, 0], pairs[:, 1], cm, tbl, cache_dir, max_bytes,
+                               with_equity=bool(tail_levels), on_chunk=cb, progress=progress, drift=drift)
+            hits += out["cache_hits"]
+            misses += out["cache_misses"]
+            if out["cancelled"]:
+                progress.finish()
+                raise SweepInterrupted(progress.done, progress.total)
+            part = {"cost": np.full(len(pairs), cm.name), "table": np.full(len(pairs), name),
+                    "low": pairs[:, 0], "high": pairs[:, 1], **{m: out[m] for m in METRICS}}
+            if tail_levels:
+                part.update(tail_metrics(_equity_returns(out.pop("equity")), tail_levels))
+            parts.append(part)
+    elapsed = progress.finish()
+    result = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    result.update(cache_hits=hits, cache_misses=misses, elapsed=elapsed)
+    return result
+
+def _equity_returns(equity):
+    """缓存的 float32 权益曲线 (G, T) -> 周收益"""
+    eq = equity.astype(float)
+    return eq / np.concatenate([np.ones((len(eq), 1)), eq[:, :-1]], axis=1) - 1
+
+def threshold_axis(lo, hi, step):
+    return np.round(np.arange(lo, hi + step / 2, step), 6)
+
+def main(argv=None):
+    from mhi_weekly import build_mhi
+    from simulator import prepare_inputs
+    p = argparse.ArgumentParser(description="Resumable threshold sweep over cost models")
+    p.add_argument("--step", type=float, default=0.05)
+    p.add_argument("--low-range", type=float, nargs=2, default=(-3.0, -0.5))
+    p.add_argument("--high-range", type=float, nargs=2, default=(0.5, 3.0))
+    p.add_argument("--costs", default="total,commission_spread")
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--cache-mb", type=int, default=CACHE_MAX_BYTES // 2**20, help="sweep cache size cap")
+    p.add_argument("--drift", choices=sorted(DRIFT_BANDS), default=None,
+                   help="let holdings drift between trades, with these rebalance bands")
+    p.add_argument("--tail", type=float, default=None, help="also rank by weekly CVaR at this level, e.g. 0.95")
+    args = p.parse_args(argv)
+
+    lows = threshold_axis(*args.low_range, args.step)
+    highs = threshold_axis(*args.high_range, args.step)
+    cost_models = [COST_MODELS[c] for c in args.costs.split(",")]
+    inputs = prepare_inputs(*build_mhi())
+    print(f"Sweeping {len(lows)}×{len(highs)} thresholds × {len(cost_models)} cost model(s) "
+          f"= {len(lows) * len(highs) * len(cost_models)} points")
+    try:
+        res = run_sweep(inputs, lows, highs, cost_models, max_bytes=args.cache_mb * 2**20,
+                        drift=DRIFT_BANDS.get(args.drift), tail_levels=(args.tail,) if args.tail else None)
+    except SweepInterrupted as e:
+        print(f"Interrupted: {e.done}/{e.total} points saved. Re-run the same command to resume.")
+        return None
+    rate = res["cache_misses"] / res["elapsed"] if res["elapsed"] > 0 else 0.0
+    print(f"Done in {res['elapsed']:.1f}s: {res['cache_hits']} cached, {res['cache_misses']} computed ({rate:,.0f} pts/s)")
+    for cm in cost_models:
+        sel = np.flatnonzero(res["cost"] == cm.name)
+        best = sel[np.argsort(-res["sharpe"][sel], kind="stable")[:args.top]]
+        print(f"\n=== Top {args.top} by Sharpe ({cm.name} costs) ===")
+        print("Low   | High  | Sharpe | Total_Ret | Max_DD | Rebal")
+        for i in best:
+            print(f"{res['low'][i]:5.2f} | {res['high'][i]:5.2f} | {res['sharpe'][i]:6.3f} | "
+                  f"{res['total_return'][i]:8.1%} | {res['max_dd'][i]:6.1%} | {int(res['rebalance_count'][i])}")
+        if args.tail:
+            key = level_key(args.tail)
+            best = sel[np.argsort(-res["cvar_" + key][sel], kind="stable")[:args.top]]
+            print(f"\n=== Top {args.top} by {args.tail:.0%} CVaR ({cm.name} costs) ===")
+            print("Low   | High  | CVaR    | VaR     | Sharpe | Total_Ret")
+            for i in best:
+                print(f"{res['low'][i]:5.2f} | {res['high'][i]:5.2f} | {res['cvar_' + key][i]:7.2%} | "
+                      f"{res['var_' + key][i]:7.2%} | {res['sharpe'][i]:6.3f} | {res['total_return'][i]:8.1%}")
+    return res
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()
@@ -3,80 +3,17 @@
 
 import pandas as pd
 import numpy as np
-from mhi_weekly import build_mhi, apply_real_yield_tilt
+from mhi_weekly import build_mhi
+import profiling
+from simulator import prepare_inputs, simulate
 import itertools
 
-def pick_weights_custom(mhi_val, low_threshold, high_threshold):
-    """自定义阈值的权重选择函数"""
-    BASE_WEIGHTS = {"SPY":0.35, "GLD":0.45, "BTC":0.10, "CASH":0.10}
-    LOW_MHI_WEI = {"SPY":0.55, "GLD":0.25, "BTC":0.05, "CASH":0.15}  
-    HIGH_MHI_WEI = {"SPY":0.15, "GLD":0.60, "BTC":0.05, "CASH":0.20}
-    CASH_MAX = 0.35
-    
-    if mhi_val <= low_threshold:
-        bucket, target = "LOW", LOW_MHI_WEI.copy()
-    elif mhi_val >= high_threshold:
-        bucket, target = "HIGH", HIGH_MHI_WEI.copy()
-    else:
-        bucket, target = "NEUTRAL", BASE_WEIGHTS.copy()
-    
-    # 现金上限保护
-    target["CASH"] = min(target.get("CASH",0.0), CASH_MAX)
-    # 三资产权重重新归一
-    s = target["SPY"]+target["GLD"]+target["BTC"]
-    if s > 0:
-        scale = (1 - target["CASH"]) / s
-        for k in ["SPY","GLD","BTC"]:
-            target[k] = max(0.0, target[k]*scale)
-    
-    return bucket, target
-
-def simulate_strategy_with_thresholds(low_threshold, high_threshold):
-    """使用自定义阈值模拟策略"""
-    price_w, mhi, ry_w = build_mhi()
-    
-    current_weights = {"SPY": 0.35, "GLD": 0.45, "BTC": 0.10, "CASH": 0.10}
-    strategy_returns = []
-    rebalance_count = 0
-    
-    for i in range(1, len(price_w)):
-        date = price_w.index[i]
-        
-        # 计算当期资产收益
-        spy_ret = price_w["SPY"].iloc[i] / price_w["SPY"].iloc[i-1] - 1
-        gld_ret = price_w["GLD"].iloc[i] / price_w["GLD"].iloc[i-1] - 1 
-        btc_ret = price_w["BTC"].iloc[i] / price_w["BTC"].iloc[i-1] - 1
-        
-        # 计算组合收益
-        portfolio_ret = (current_weights["SPY"] * spy_ret + 
-                        current_weights["GLD"] * gld_ret + 
-                        current_weights["BTC"] * btc_ret)
-        
-        strategy_returns.append(portfolio_ret)
-        
-        # 检查是否需要调仓（每4周检查一次）
-        if i % 4 == 0 and i < len(mhi):
-            mhi_val = float(mhi.iloc[i])
-            bucket, target = pick_weights_custom(mhi_val, low_threshold, high_threshold)
-            target = apply_real_yield_tilt(target, ry_w, date)
-            
-            # 检查确认机制（3周确认）
-            if i >= 12:  # 至少3个月数据
-                recent_buckets = []
-                for j in range(1, 4):
-                    if i-j*4 >= 0 and i-j*4 < len(mhi):
-                        recent_bucket, _ = pick_weights_custom(float(mhi.iloc[i-j*4]), low_threshold, high_threshold)
-                        recent_buckets.append(recent_bucket)
-                
-                if len(set(recent_buckets)) == 1:  # 确认信号
-                    # 只在极端MHI条件下调仓
-                    need_rebalance = (bucket != "NEUTRAL")
-                    
-                    if need_rebalance:
-                        current_weights = target.copy()
-                        rebalance_count += 1
-    
-    return pd.Series(strategy_returns, index=price_w.index[1:]), rebalance_count
+def simulate_strategy_with_thresholds(low_threshold, high_threshold, inputs=None):
+    """使用自定义阈值模拟策略（inputs 可复用，避免重复下载数据）"""
+    if inputs is None:
+        inputs = prepare_inputs(*build_mhi())
+    res = simulate(inputs, low_threshold, high_threshold)
+    return res.returns_series(), int(res.rebalance_count[0])
 
 def calculate_metrics(returns):
     """计算关键指标"""
@@ -101,6 +38,9 @@ def test_threshold_combinations():
     """测试不同阈值组合"""
     print("=== MHI Threshold Optimization Test ===\n")
     
+    # 一次性获取数据
+    inputs = prepare_inputs(*build_mhi())
+
     # 测试对称阈值
     symmetric_thresholds = [1.5, 1.6, 1.7, 1.75, 1.8, 1.9, 2.0]
     symmetric_results = []
@@ -113,7 +53,7 @@ def test_threshold_combinations():
         low_thresh = -threshold
         high_thresh = threshold
         
-        strategy_returns, rebal_count = simulate_strategy_with_thresholds(low_thresh, high_thresh)
+        strategy_returns, rebal_count = simulate_strategy_with_thresholds(low_thresh, high_thresh, inputs)
         metrics = calculate_metrics(strategy_returns)
         
         result = {
@@ -146,7 +86,7 @@ def test_threshold_combinations():
     ]
     
     for low_thresh, high_thresh in asymmetric_combinations:
-        strategy_returns, rebal_count = simulate_strategy_with_thresholds(low_thresh, high_thresh)
+        strategy_returns, rebal_count = simulate_strategy_with_thresholds(low_thresh, high_thresh, inputs)
         metrics = calculate_metrics(strategy_returns)
         
         result = {
@@ -203,4 +143,5 @@ def test_threshold_combinations():
     return all_results
 
 if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
     results = test_threshold_combinations()
\ No newline at end of file
@@ -0,0 +1,104 @@
+# vol_target.py
+# 波动率目标：在 MHI 分档权重之上再加一层逐周缩放——风险资产按 k = 目标年化波动 / 预测波动 同比例放大或缩小，
+# 余下的记为现金；k 限制在现金不超过 CASH_MAX、不加杠杆（现金不为负）的范围内。
+# 预测波动 σ_t = sqrt(52 · wᵀ Σ_t w)，Σ_t 为截至上一周的 EWMA 协方差（covariance.ewma_forecast_series）；
+# 前 EWMA_SEED_WEEKS+1 周（EWMA 初值覆盖的周）没有预测，不缩放。
+# 缩放系数是一个 (网格点 G, 周 T) 的数组，一次 einsum 算完；每个网格点可以有自己的目标波动，
+# 所以“阈值 × 目标波动”的三维网格在 simulator.simulate_metrics 里一次批量跑完。
+# 交易成本按相邻两周实际权重之差计（k 恒为1时与不加这层完全相同）。
+#
+# 用法:
+#   python vol_target.py                                   # 默认阈值下各目标波动的表现 + 阈值×目标波动扫参
+#   python vol_target.py --targets 0.06,0.08,0.10,0.12 --step 0.1 --costs total
+
+import time, argparse
+import numpy as np
+import mhi_weekly as mw
+import profiling
+from covariance import EWMA_LAMBDA, ewma_forecast_series
+
+VOL_TARGETS = (0.06, 0.08, 0.10, 0.12, 0.15)
+MAX_LEVERAGE = 1.0           # 风险资产权重之和的上限（1 = 不加杠杆）
+
+def forecast_cov(returns, lam=EWMA_LAMBDA):
+    """第 t 周（t = 0..T，含最后一周之后）的风险资产预测协方差 (T+1, N-1, N-1) = 截至 t-1 周的 EWMA"""
+    return ewma_forecast_series(np.asarray(returns, dtype=float)[:, :-1], lam)
+
+def vol_scale(weights, cov, vol_target, cash_max=None, max_leverage=MAX_LEVERAGE, periods_per_year=52):
+    """缩放系数 (G, T)：weights (G, T, N)，cov (T, N-1, N-1)，vol_target 标量或 (G,)
+    没有预测（NaN）、目标为 NaN 或组合没有风险资产时为 1"""
+    cash_max = mw.CASH_MAX if cash_max is None else cash_max
+    w = np.asarray(weights, dtype=float)[..., :-1]
+    s = w.sum(axis=-1)
+    var = np.einsum("gtn,tnm,gtm->gt", w, np.nan_to_num(cov), w) * periods_per_year
+    target = np.broadcast_to(np.asarray(vol_target, dtype=float).reshape(-1, 1), s.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        k = np.clip(target / np.sqrt(var), (1 - cash_max) / s, max_leverage / s)
+    ok = (s > 0) & (var > 0) & ~np.isnan(cov[:, 0, 0])[None, :] & ~np.isnan(target)
+    return np.where(ok, k, 1.0)
+
+def scale_weights(weights, k):
+    """风险资产 × k，现金为余数；k 为1的行原样保留"""
+    w = np.asarray(weights)
+    out = w.copy()
+    out[..., :-1] *= k[..., None].astype(out.dtype, copy=False)
+    out[..., -1] = 1 - out[..., :-1].sum(axis=-1)
+    return np.where((k == 1)[..., None], w, out)
+
+@profiling.timed("vol_target.overlay")
+def overlay(returns, held, after, vol_target, cost_model, start=0, lam=EWMA_LAMBDA):
+    """对模拟器的持仓 held (G, T, N)（第 start 周起）与其后的 after (G, N) 加波动率目标层
+    返回 (新 held, 每周成本 (G, T), 新 after)；第 t 周的成本 = 周末从 held[t] 调到 held[t+1] 的换手"""
+    cov = forecast_cov(returns, lam)[start:]
+    full = np.concatenate([held, after[:, None, :]], axis=1)               # (G, T+1, N)
+    scaled = scale_weights(full, vol_scale(full, cov, vol_target))
+    costs = cost_model.cost(scaled[:, :-1], scaled[:, 1:])
+    return scaled[:, :-1], costs.astype(held.dtype, copy=False), scaled[:, -1]
+
+def vol_grid(lows, highs, vol_targets):
+    """阈值对 × 目标波动的全组合 -> 三个 (G,) 数组"""
+    L, V = np.meshgrid(np.arange(len(lows)), np.asarray(vol_targets, dtype=float), indexing="ij")
+    return np.asarray(lows, dtype=float)[L.ravel()], np.asarray(highs, dtype=float)[L.ravel()], V.ravel()
+
+def main(argv=None):
+    import itertools
+    from simulator import prepare_inputs, simulate, simulate_metrics, metrics_array
+    from sweep_runner import COST_MODELS, threshold_axis
+    p = argparse.ArgumentParser(description="Volatility targeting on top of the MHI bucket weights")
+    p.add_argument("--targets", default=",".join(str(v) for v in VOL_TARGETS))
+    p.add_argument("--costs", default="total", choices=sorted(COST_MODELS))
+    p.add_argument("--step", type=float, default=0.25, help="threshold grid step for the sweep")
+    p.add_argument("--top", type=int, default=10)
+    args = p.parse_args(argv)
+    targets = [float(v) for v in args.targets.split(",")]
+    cm = COST_MODELS[args.costs]
+
+    inputs = prepare_inputs(*mw.build_mhi())
+    print(f"=== Volatility targeting ({len(inputs)} weeks, {cm.name} costs, CASH_MAX {mw.CASH_MAX:.0%}) ===\n")
+    print("Target | Total_Ret | Annual | Vol    | Sharpe | Max_DD | Costs  | Avg Cash")
+    for v in [np.nan] + targets:
+        res = simulate(inputs, cost_model=cm, vol_target=v)
+        m = {k: float(x[0]) for k, x in metrics_array(res.period_returns).items()}
+        label = "  none" if np.isnan(v) else f"{v:6.1%}"
+        print(f"{label} | {m['total_return']:8.1%} | {m['annual_return']:6.1%} | {m['annual_vol']:6.1%} | "
+              f"{m['sharpe']:6.3f} | {m['max_dd']:6.1%} | {float(res.total_costs[0]):6.2%} | "
+              f"{float(res.held[0, :, -1].mean()):7.1%}")
+
+    pairs = np.array(list(itertools.product(threshold_axis(-3.0, -0.5, args.step), threshold_axis(0.5, 3.0, args.step))))
+    lows, highs, vols = vol_grid(pairs[:, 0], pairs[:, 1], [np.nan] + targets)
+    t0 = time.time()
+    out = simulate_metrics(inputs, lows, highs, cm, vol_target=vols)
+    elapsed = time.time() - t0
+    print(f"\nSwept {len(pairs)} threshold pairs × {len(targets) + 1} vol targets = {len(lows)} points "
+          f"in {elapsed:.2f}s ({len(lows) / max(elapsed, 1e-9):,.0f} pts/s)")
+    print(f"\n=== Top {args.top} by Sharpe ===")
+    print("Low   | High  | Target | Sharpe | Annual | Vol    | Max_DD")
+    for i in np.argsort(-out["sharpe"], kind="stable")[:args.top]:
+        label = "  none" if np.isnan(vols[i]) else f"{vols[i]:6.1%}"
+        print(f"{lows[i]:5.2f} | {highs[i]:5.2f} | {label} | {out['sharpe'][i]:6.3f} | "
+              f"{out['annual_return'][i]:6.1%} | {out['annual_vol'][i]:6.1%} | {out['max_dd'][i]:6.1%}")
+    return out
+
+if __name__ == "__main__":
+    profiling.from_argv()   # --profile out.json | out.trace.json
+    main()